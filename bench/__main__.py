@@ -0,0 +1,51 @@
+import argparse
+import json
+import sys
+
+from bench import harness
+import bench.bench_form_logic  # noqa: F401  регистрирует бенчмарки
+import bench.bench_sessions  # noqa: F401
+import bench.bench_streets  # noqa: F401
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Бенчмарки BH_bot")
+    parser.add_argument("names", nargs="*", help="подстроки имён бенчмарков (по умолчанию — все)")
+    parser.add_argument("-o", "--output", help="сохранить результаты в JSON")
+    parser.add_argument("-b", "--baseline", help="JSON с прошлым прогоном для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.10, help="допустимое замедление (0.10 = 10%%)")
+    parser.add_argument("--samples", type=int, default=30)
+    parser.add_argument("--min-sample-time", type=float, default=0.005)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--list", action="store_true", help="только показать список бенчмарков")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, (group, _) in harness.BENCHMARKS.items():
+            print(f"{group:<12} {name}")
+        for name, (group, _) in harness.SIZES.items():
+            print(f"{group:<12} {name}")
+        return 0
+
+    report = harness.run(args.names, samples=args.samples, min_sample_time=args.min_sample_time)
+
+    regressions = []
+    if args.baseline:
+        rows = harness.compare(report, harness.load_report(args.baseline), threshold=args.threshold)
+        report["comparison"] = rows
+        for row in rows:
+            mark = "REGRESSION" if row["regression"] else ""
+            print(f"  {row['name']:<45} x{row['ratio']:.2f} {mark}", file=sys.stderr)
+        regressions = [row for row in rows if row["regression"]]
+
+    if args.output:
+        harness.save_report(report, args.output)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
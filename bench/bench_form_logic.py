@@ -0,0 +1,159 @@
+import atexit
+import itertools
+import shutil
+
+from datetime import date, datetime
+
+from num2words import num2words
+
+import form_logic
+from bench.harness import benchmark
+from bench.synthetic import SAMPLE_FORM, RAW_FIO, RAW_DATES, RAW_MONEY, make_template_dir
+
+
+_TEMPLATE_PATH: str | None = None
+
+
+def template_path() -> str:
+    global _TEMPLATE_PATH
+    if _TEMPLATE_PATH is None:
+        tmp, _TEMPLATE_PATH = make_template_dir()
+        atexit.register(shutil.rmtree, tmp, ignore_errors=True)
+    return _TEMPLATE_PATH
+
+
+def cycling(fn, inputs):
+    it = itertools.cycle(inputs)
+    return lambda: fn(next(it))
+
+
+@benchmark("form_logic.format_fio", group="formatters")
+def bench_format_fio():
+    return cycling(form_logic.format_fio, RAW_FIO)
+
+
+@benchmark("form_logic.parse_date", group="formatters")
+def bench_parse_date():
+    return cycling(form_logic.parse_date, RAW_DATES)
+
+
+def strptime_parse_date(raw: str) -> date | None:
+    # прежняя реализация parse_date — для сравнения
+    if not raw:
+        return None
+    raw = raw.strip()
+    for fmt in ("%d.%m.%Y", "%d.%m.%y"):
+        try:
+            dt = datetime.strptime(raw, fmt).date()
+            if fmt == "%d.%m.%y" and dt.year < 2000:
+                dt = date(dt.year + 2000, dt.month, dt.day)
+            return dt
+        except ValueError:
+            continue
+    return None
+
+
+@benchmark("form_logic.parse_date[regex]", group="formatters")
+def bench_parse_date_regex():
+    # без LRU-кэша
+    pivot = (date.today().year + form_logic.TWO_DIGIT_YEAR_AHEAD) % 100
+    return cycling(lambda raw: form_logic._parse_date.__wrapped__(raw, pivot), RAW_DATES)
+
+
+@benchmark("form_logic.parse_date[strptime]", group="formatters")
+def bench_parse_date_strptime():
+    return cycling(strptime_parse_date, RAW_DATES)
+
+
+@benchmark("form_logic.check_dates", group="formatters")
+def bench_check_dates():
+    values = {key: SAMPLE_FORM[key] for key in form_logic.DATE_RULE_KEYS}
+    return lambda: form_logic.check_dates(values)
+
+
+@benchmark("form_logic.format_date", group="formatters")
+def bench_format_date():
+    return cycling(form_logic.format_date, RAW_DATES)
+
+
+@benchmark("form_logic.format_money", group="formatters")
+def bench_format_money():
+    return cycling(form_logic.format_money, RAW_MONEY)
+
+
+@benchmark("form_logic.money_words_only", group="formatters")
+def bench_money_words_only():
+    return cycling(form_logic.money_words_only, RAW_MONEY)
+
+
+# типичные суммы аренды и депозита: от тысяч до десятков миллионов
+AMOUNTS = [7, 1_000, 21_500, 30_000, 45_000, 45_500, 101_000, 1_250_000, 21_000_000, 99_999_999]
+
+
+@benchmark("form_logic.amount_words[table]", group="formatters")
+def bench_amount_words_table():
+    # без LRU-кэша: сама табличная сборка
+    return cycling(form_logic.amount_words.__wrapped__, AMOUNTS)
+
+
+@benchmark("form_logic.amount_words[cached]", group="formatters")
+def bench_amount_words_cached():
+    return cycling(form_logic.amount_words, AMOUNTS)
+
+
+@benchmark("num2words[ru]", group="formatters")
+def bench_num2words():
+    return cycling(lambda amount: num2words(amount, lang="ru"), AMOUNTS)
+
+
+@benchmark("fields.validators", group="formatters")
+def bench_field_validators():
+    # все декларативные проверки FIELDS на верных и неверных ответах
+    from bench.synthetic import RAW_ANSWERS, RAW_INVALID
+    from fields import FIELDS
+    checks = [
+        (field["formatter"], answers[field["key"]])
+        for field in FIELDS if "validate" in field
+        for answers in (RAW_ANSWERS, RAW_INVALID) if field["key"] in answers
+    ]
+    return lambda: [check(raw) for check, raw in checks]
+
+
+@benchmark("form_logic.wrap_conditions_to_rows", group="layout")
+def bench_wrap_conditions_to_rows():
+    items = [
+        "Не менять замки без письменного согласия наймодателя",
+        "Уборка подъезда по графику, утверждённому ТСЖ, с заменой дежурных в случае отсутствия",
+        "Проведение ремонта только после согласования сметы",
+        "Оченьдлинноеслововкотороенетпробеловипереносовсовсемпростодлянагрузки" * 2,
+    ]
+    return lambda: form_logic.wrap_conditions_to_rows(items, rows=10, budget_chars=80, with_numbers=True)
+
+
+@benchmark("form_logic.wrap_to_lines", group="layout")
+def bench_wrap_to_lines():
+    text = SAMPLE_FORM["act_condition"] * 3
+    return lambda: form_logic.wrap_to_lines(text, max_len=75, lines=5)
+
+
+@benchmark("form_logic.build_contract_context", group="render")
+def bench_build_contract_context():
+    return lambda: form_logic.build_contract_context(SAMPLE_FORM)
+
+
+@benchmark("form_logic.fill_template[cold]", group="render")
+def bench_fill_template_cold():
+    path = template_path()
+    ctx = form_logic.build_contract_context(SAMPLE_FORM)
+
+    def run():
+        form_logic.clear_template_cache()
+        return form_logic.fill_template_to_buffer(ctx, path)
+    return run
+
+
+@benchmark("form_logic.fill_template[warm]", group="render")
+def bench_fill_template_warm():
+    path = template_path()
+    ctx = form_logic.build_contract_context(SAMPLE_FORM)
+    return lambda: form_logic.fill_template_to_buffer(ctx, path)
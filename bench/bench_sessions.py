@@ -0,0 +1,112 @@
+import atexit
+import gc
+import itertools
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+from bench.harness import benchmark, size_metric
+from bench.synthetic import SAMPLE_FORM
+from session_db import SessionDB, PersistentSessions
+from sessions import SessionStore
+
+
+SIZE_SAMPLE = 2000
+
+
+def temp_db() -> SessionDB:
+    tmp = tempfile.mkdtemp(prefix="bhbot_bench_db_")
+    db = SessionDB(os.path.join(tmp, "sessions.db"))
+    atexit.register(shutil.rmtree, tmp, ignore_errors=True)
+    atexit.register(db.close)
+    return db
+
+
+@benchmark("session_db.flush[one field]", group="sessions")
+def bench_flush_one_field():
+    # типичный шаг анкеты: одно поле формы и номер шага в context.user_data
+    store = SessionStore(track_changes=True)
+    persistence = PersistentSessions(store, temp_db())
+    user_data = {"step": 0, "skip_inline_sent": False}
+    keys = itertools.cycle(SAMPLE_FORM.items())
+
+    def run():
+        key, value = next(keys)
+        store.set(1, key, value)
+        user_data["step"] += 1
+        persistence.flush(1, user_data)
+    return run
+
+
+@benchmark("session_db.restore", group="sessions")
+def bench_restore():
+    db = temp_db()
+    store = SessionStore(track_changes=True)
+    persistence = PersistentSessions(store, db)
+    store.update(1, SAMPLE_FORM)
+    persistence.flush(1, {"step": 40, "skip_inline_sent": False})
+
+    def run():
+        store.drop(1)
+        store.take_changes(1)
+        persistence.restore(1, {})
+    return run
+
+
+def distinct_form() -> dict:
+    # у каждого пользователя свои строки, как после ввода в чате
+    def copy(value):
+        if isinstance(value, list):
+            return [copy(item) for item in value]
+        return (value + " ")[:-1]
+    return {key: copy(value) for key, value in SAMPLE_FORM.items()}
+
+
+def per_session_bytes(fill) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for uid in range(SIZE_SAMPLE):
+            fill(uid, distinct_form())
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return (after - before) // SIZE_SAMPLE
+
+
+def production_store() -> SessionStore:
+    # как в main.py: build_session_store() с contexts, track_changes включает PersistentSessions (SESSION_DB)
+    return SessionStore(max_sessions=SIZE_SAMPLE, track_changes=True, contexts=True)
+
+
+@size_metric("sessions.SessionStore[per session]", group="sessions")
+def size_session_store():
+    return per_session_bytes(production_store().update)
+
+
+@size_metric("sessions.SessionStore[context per session]", group="sessions")
+def size_session_context():
+    # сверх анкеты: производные ключи шаблона, которые сессия держит с момента создания
+    bare = SessionStore(max_sessions=SIZE_SAMPLE, track_changes=True)
+    return size_session_store() - per_session_bytes(bare.update)
+
+
+@size_metric("sessions.plain_dict[per session]", group="sessions")
+def size_plain_dict():
+    # прежнее представление: dict[int, dict] с ключами-строками
+    data: dict[int, dict] = {}
+
+    def fill(uid, form):
+        ud = data.setdefault(uid, {})
+        for key, value in form.items():
+            ud[key] = value
+    return per_session_bytes(fill)
+
+
+@benchmark("sessions.snapshot", group="sessions")
+def bench_snapshot():
+    store = SessionStore()
+    store.update(1, SAMPLE_FORM)
+    return lambda: store.snapshot(1)
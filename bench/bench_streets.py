@@ -0,0 +1,46 @@
+import gc
+import itertools
+import tracemalloc
+
+from bench.harness import benchmark, size_metric
+from bench.synthetic import make_street_names
+from streets import StreetIndex
+
+
+_INDEX: StreetIndex | None = None
+QUERIES = ["ба", "бар", "барочн", "барачная", "тв", "невс", "ки ул", "зз"]
+
+
+def street_index() -> StreetIndex:
+    global _INDEX
+    if _INDEX is None:
+        _INDEX = StreetIndex(make_street_names())
+    return _INDEX
+
+
+@benchmark("streets.lookup", group="streets")
+def bench_lookup():
+    index = street_index()
+    queries = itertools.cycle(QUERIES)
+    return lambda: index.lookup(next(queries))
+
+
+@benchmark("streets.exact", group="streets")
+def bench_exact():
+    index = street_index()
+    return lambda: index.exact("барочная")
+
+
+@size_metric("streets.StreetIndex[3000 streets]", group="streets")
+def size_street_index():
+    names = make_street_names()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        index = StreetIndex(names)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del index
+    return after - before
@@ -0,0 +1,174 @@
+import asyncio
+import itertools
+import json
+import math
+import time
+from collections import Counter
+
+from telegram.request import BaseRequest, RequestData
+
+
+BOT_USER = {
+    "id": 100000001,
+    "is_bot": True,
+    "first_name": "BHBot",
+    "username": "bhbot_fake_bot",
+    "can_join_groups": False,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+
+# локальная замена Bot API: отвечает на вызовы бота без сети и считает их
+class FakeBotRequest(BaseRequest):
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self.sent_documents = 0
+        self.documents_by_chat: Counter[int] = Counter()
+        self._message_ids = itertools.count(1)
+        # апдейты для getUpdates (режим polling) и ожидание ответа бота в чате
+        self.pending_updates: asyncio.Queue | None = None
+        self._reply_waiters: dict[int, asyncio.Future] = {}
+        # лимиты как у Telegram (0 — выключены): сверх них отвечаем 429 с retry_after
+        self.flood_chat_rate = 0.0
+        self.flood_chat_burst = 1.0
+        self.flood_global_rate = 0.0
+        self.flood_errors = 0
+        self._flood_allowance: dict[int | None, tuple[float, float]] = {}
+
+    @property
+    def read_timeout(self) -> float | None:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _message(self, params: dict, **extra) -> dict:
+        chat_id = params.get("chat_id") or 0
+        message = {
+            "message_id": params.get("message_id") or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "from": BOT_USER,
+        }
+        if "text" in params:
+            message["text"] = params["text"]
+        message.update(extra)
+        return message
+
+    def _document(self, chat_id: int, index: int = 0) -> dict:
+        self.sent_documents += 1
+        self.documents_by_chat[chat_id] += 1
+        return {"file_id": f"doc{index}", "file_unique_id": f"udoc{index}", "file_name": "document.docx"}
+
+    def limit_flood(self, chat_rate: float, chat_burst: float = 1.0, global_rate: float = 0.0) -> None:
+        self.flood_chat_rate = chat_rate
+        self.flood_chat_burst = chat_burst
+        self.flood_global_rate = global_rate
+
+    def _allowance(self, key: int | None, rate: float, burst: float, now: float) -> float:
+        allowance, stamp = self._flood_allowance.get(key, (burst, now))
+        return min(burst, allowance + (now - stamp) * rate)
+
+    def _flood_retry_after(self, endpoint: str, params: dict) -> int:
+        if not (endpoint.startswith("send") or endpoint.startswith("edit")) or "chat_id" not in params:
+            return 0
+        now = time.monotonic()
+        limits = []
+        if self.flood_global_rate:
+            limits.append((None, self.flood_global_rate, max(self.flood_global_rate, 1)))
+        if self.flood_chat_rate:
+            limits.append((int(params["chat_id"]), self.flood_chat_rate, self.flood_chat_burst))
+        allowances = [self._allowance(key, rate, burst, now) for key, rate, burst in limits]
+        wait = max(((1 - a) / rate for a, (_, rate, _) in zip(allowances, limits) if a < 1), default=0.0)
+        if wait:
+            return math.ceil(wait)
+        for allowance, (key, _, _) in zip(allowances, limits):
+            self._flood_allowance[key] = (allowance - 1, now)
+        return 0
+
+    def push_update(self, update: dict) -> None:
+        if self.pending_updates is None:
+            self.pending_updates = asyncio.Queue()
+        self.pending_updates.put_nowait(update)
+
+    def wait_reply(self, chat_id: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._reply_waiters[chat_id] = future
+        return future
+
+    def _notify_reply(self, chat_id: int) -> None:
+        future = self._reply_waiters.pop(chat_id, None)
+        if future is not None and not future.done():
+            future.set_result(time.perf_counter())
+
+    async def _get_updates(self, params: dict) -> list:
+        # long polling: ждём первый апдейт не дольше timeout, затем забираем всё накопившееся
+        if self.pending_updates is None:
+            self.pending_updates = asyncio.Queue()
+        try:
+            first = await asyncio.wait_for(self.pending_updates.get(), float(params.get("timeout") or 0) or 0.01)
+        except asyncio.TimeoutError:
+            return []
+        updates = [first]
+        while not self.pending_updates.empty():
+            updates.append(self.pending_updates.get_nowait())
+        return updates
+
+    def handle(self, endpoint: str, params: dict) -> object:
+        if endpoint == "getMe":
+            return BOT_USER
+        if endpoint in ("answerCallbackQuery", "deleteWebhook", "setWebhook", "setMyCommands"):
+            return True
+        if endpoint == "getUpdates":
+            return []
+        chat_id = int(params.get("chat_id") or 0)
+        if endpoint == "sendDocument":
+            return self._message(params, document=self._document(chat_id))
+        if endpoint == "sendMediaGroup":
+            media = params.get("media") or []
+            return [self._message(params, document=self._document(chat_id, i)) for i in range(len(media))]
+        if endpoint.startswith("send") or endpoint.startswith("edit"):
+            self._notify_reply(chat_id)
+            return self._message(params)
+        return True
+
+    async def do_request(
+            self,
+            url: str,
+            method: str,
+            request_data: RequestData | None = None,
+            read_timeout=None,
+            write_timeout=None,
+            connect_timeout=None,
+            pool_timeout=None,
+    ) -> tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] += 1
+        # задержка сети: половина до сервера, половина на обратном пути
+        half = self.latency / 2
+        if half:
+            await asyncio.sleep(half)
+        params = request_data.parameters if request_data else {}
+        retry_after = self._flood_retry_after(endpoint, params) if self.flood_chat_rate or self.flood_global_rate else 0
+        if retry_after:
+            self.flood_errors += 1
+            if half:
+                await asyncio.sleep(half)
+            return 429, json.dumps({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }).encode("utf-8")
+        if endpoint == "getUpdates" and self.pending_updates is not None:
+            result = await self._get_updates(params)
+        else:
+            result = self.handle(endpoint, params)
+        if half:
+            await asyncio.sleep(half)
+        return 200, json.dumps({"ok": True, "result": result}).encode("utf-8")
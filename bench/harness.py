@@ -0,0 +1,137 @@
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Callable
+
+
+# имя -> (группа, фабрика). Фабрика готовит данные и возвращает функцию без аргументов,
+# время которой и измеряется
+BENCHMARKS: dict[str, tuple[str, Callable[[], Callable[[], object]]]] = {}
+# имя -> (группа, функция, возвращающая размер в байтах)
+SIZES: dict[str, tuple[str, Callable[[], int]]] = {}
+
+
+def benchmark(name: str, group: str = "misc"):
+    def decorator(factory: Callable[[], Callable[[], object]]):
+        if name in BENCHMARKS:
+            raise ValueError(f"Бенчмарк {name} уже зарегистрирован")
+        BENCHMARKS[name] = (group, factory)
+        return factory
+    return decorator
+
+
+def size_metric(name: str, group: str = "memory"):
+    def decorator(fn: Callable[[], int]):
+        if name in SIZES:
+            raise ValueError(f"Метрика {name} уже зарегистрирована")
+        SIZES[name] = (group, fn)
+        return fn
+    return decorator
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def measure(fn: Callable[[], object], samples: int = 30, min_sample_time: float = 0.005) -> dict:
+    fn()
+
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_sample_time or loops >= 1_000_000:
+            break
+        loops *= 10 if elapsed < min_sample_time / 10 else 2
+
+    per_call: list[float] = []
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        per_call.append((time.perf_counter() - t0) / loops)
+
+    mean = statistics.fmean(per_call)
+    return {
+        "loops": loops,
+        "samples": samples,
+        "mean_us": mean * 1e6,
+        "p50_us": percentile(per_call, 0.50) * 1e6,
+        "p95_us": percentile(per_call, 0.95) * 1e6,
+        "min_us": min(per_call) * 1e6,
+        "stdev_us": (statistics.stdev(per_call) if len(per_call) > 1 else 0.0) * 1e6,
+        "ops_per_sec": (1.0 / mean) if mean > 0 else 0.0,
+    }
+
+
+def run(names: list[str] | None = None, samples: int = 30, min_sample_time: float = 0.005) -> dict:
+    results = {}
+    for name, (group, factory) in BENCHMARKS.items():
+        if names and not any(n in name for n in names):
+            continue
+        fn = factory()
+        stats = measure(fn, samples=samples, min_sample_time=min_sample_time)
+        stats["group"] = group
+        results[name] = stats
+        print(f"  {name:<45} {stats['mean_us']:>12.2f} us  {stats['ops_per_sec']:>12.0f} op/s", file=sys.stderr)
+    sizes = {}
+    for name, (group, fn) in SIZES.items():
+        if names and not any(n in name for n in names):
+            continue
+        sizes[name] = {"group": group, "bytes": fn()}
+        print(f"  {name:<45} {sizes[name]['bytes']:>12} B", file=sys.stderr)
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+        "sizes": sizes,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.10) -> list[dict]:
+    rows = []
+    base_results = baseline.get("results", {})
+    for name, stats in current.get("results", {}).items():
+        base = base_results.get(name)
+        if not base or not base.get("mean_us"):
+            continue
+        ratio = stats["mean_us"] / base["mean_us"]
+        rows.append({
+            "name": name,
+            "baseline_us": base["mean_us"],
+            "current_us": stats["mean_us"],
+            "ratio": ratio,
+            "regression": ratio > 1 + threshold,
+        })
+    base_sizes = baseline.get("sizes", {})
+    for name, size in current.get("sizes", {}).items():
+        base = base_sizes.get(name)
+        if not base or not base.get("bytes"):
+            continue
+        ratio = size["bytes"] / base["bytes"]
+        rows.append({
+            "name": name,
+            "baseline_bytes": base["bytes"],
+            "current_bytes": size["bytes"],
+            "ratio": ratio,
+            "regression": ratio > 1 + threshold,
+        })
+    return rows
+
+
+def load_report(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def save_report(report: dict, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, ensure_ascii=False, indent=2)
@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import shutil
+import statistics
+import sys
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes
+
+import main as bot
+from fields import FIELDS
+from render_pool import RenderPool, RenderCache
+from update_processor import PerUserUpdateProcessor
+from streets import StreetIndex
+from outbound import OutboundScheduler, DEFAULT_CHAT_RATE, DEFAULT_CHAT_BURST, DEFAULT_GLOBAL_RATE
+from bench.fake_bot_api import FakeBotRequest, BOT_USER
+from bench.harness import percentile
+from bench.synthetic import (
+    RAW_ANSWERS,
+    RAW_INVALID,
+    ADDRESS_ANSWERS,
+    OBJ_ADDRESS_ANSWERS,
+    STREET_QUERIES,
+    TENANT_NAMES,
+    CONDITIONS,
+    make_template_dir,
+    make_street_names,
+)
+
+
+_update_ids = itertools.count(1)
+
+
+class SyntheticAgent:
+    def __init__(
+            self,
+            app: Application,
+            api: FakeBotRequest,
+            uid: int,
+            rnd: random.Random,
+            back_prob: float = 0.05,
+            invalid_prob: float = 0.05,
+            max_updates: int = 400,
+            via_processor: bool = False,
+    ):
+        self.app = app
+        self.api = api
+        self.uid = uid
+        self.rnd = rnd
+        self.back_prob = back_prob
+        self.invalid_prob = invalid_prob
+        self.max_updates = max_updates
+        self.via_processor = via_processor
+        self.latencies: list[tuple[str, float]] = []
+        self.tenants = rnd.randint(0, 2)
+        self.conditions = rnd.randint(0, 3)
+
+    def _user(self) -> dict:
+        return {"id": self.uid, "is_bot": False, "first_name": f"Agent{self.uid}"}
+
+    def _chat(self) -> dict:
+        return {"id": self.uid, "type": "private"}
+
+    def state(self) -> dict:
+        return self.app.user_data.get(self.uid, {})
+
+    async def _process(self, payload: dict, kind: str) -> None:
+        update = Update.de_json(payload, self.app.bot)
+        docs_before = self.api.documents_by_chat[self.uid]
+        t0 = time.perf_counter()
+        if self.via_processor:
+            # как в Application: общий лимит и очередь по пользователю
+            await self.app.update_processor.process_update(update, self.app.process_update(update))
+        else:
+            await self.app.process_update(update)
+        elapsed = time.perf_counter() - t0
+        if self.api.documents_by_chat[self.uid] > docs_before:
+            kind = "document"
+        self.latencies.append((kind, elapsed))
+
+    async def send_text(self, text: str, kind: str = "text") -> None:
+        message = {
+            "message_id": next(_update_ids),
+            "date": int(time.time()),
+            "chat": self._chat(),
+            "from": self._user(),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        await self._process({"update_id": next(_update_ids), "message": message}, kind)
+
+    async def press(self, data: str) -> None:
+        query = {
+            "id": str(next(_update_ids)),
+            "from": self._user(),
+            "chat_instance": str(self.uid),
+            "data": data,
+            "message": {
+                "message_id": next(_update_ids),
+                "date": int(time.time()),
+                "chat": self._chat(),
+                "from": BOT_USER,
+                "text": "…",
+            },
+        }
+        await self._process({"update_id": next(_update_ids), "callback_query": query}, "callback")
+
+    async def answer(self, field: dict, st: dict) -> None:
+        key = field["key"]
+        formatter = field.get("formatter")
+        rnd = self.rnd
+
+        if formatter == "inline_buttons":
+            await self.press(rnd.choice([bot.CB_PAYER_TENANT, bot.CB_PAYER_LANDLORD]))
+        elif formatter == "inline_yes_no":
+            await self.press(rnd.choice([bot.CB_YES, bot.CB_NO]))
+        elif formatter == "inline_default_condition":
+            if rnd.random() < 0.7:
+                await self.press(bot.CB_DEFAULT_CONDITION)
+            else:
+                await self.send_text("Незначительные потёртости на ламинате в коридоре и кухне.")
+        elif formatter == "inline_doc_choice":
+            await self.press(rnd.choice([bot.CB_DOC_EGRN, bot.CB_DOC_CERT, bot.CB_SKIP_DOC]))
+        elif formatter == "inline_make_act":
+            await self.press(bot.CB_YES if rnd.random() < 0.8 else bot.CB_NO)
+        elif formatter in ("multi_address_naim", "multi_address_ar"):
+            if st.get(f"{key}_phase") is None and rnd.random() < 0.1:
+                await self.press(bot.CB_SKIP_ADDR)
+            else:
+                await self.send_text(ADDRESS_ANSWERS[st.get(f"{key}_phase") or "city"])
+        elif formatter == "multi_address_obj":
+            phase = st.get(f"{key}_phase") or "street"
+            if phase == "street" and bot.streets is not None:
+                # начало названия, затем первая подсказка
+                typed = (st.get(f"{key}_temp") or {}).get("street_typed")
+                if typed:
+                    await self.press(f"{bot.CB_STREET}{bot.streets.lookup(typed)[0][0]}")
+                else:
+                    await self.send_text(self.rnd.choice(STREET_QUERIES))
+            else:
+                await self.send_text(OBJ_ADDRESS_ANSWERS[phase])
+        elif formatter == "multi_tenants":
+            buf = st.get(f"{key}_buf") or []
+            await self.send_text(TENANT_NAMES[len(buf) % len(TENANT_NAMES)] if len(buf) < self.tenants else "-")
+        elif formatter == "multi_conditions":
+            buf = st.get(f"{key}_buf") or []
+            await self.send_text(CONDITIONS[len(buf) % len(CONDITIONS)] if len(buf) < self.conditions else "-")
+        elif key in RAW_INVALID and rnd.random() < self.invalid_prob:
+            await self.send_text(RAW_INVALID[key], kind="invalid")
+        else:
+            await self.send_text(RAW_ANSWERS.get(key, "-"))
+
+    async def run(self) -> bool:
+        await self.send_text("/start", kind="command")
+        await self.press(bot.CB_START_RENT)
+
+        for _ in range(self.max_updates):
+            st = self.state()
+            step = st.get(bot.CTX_STEP)
+            if step is None:
+                return True
+            if step >= len(FIELDS):
+                await self.press(self.rnd.choice([bot.CB_DOC_COMM_TENANT, bot.CB_DOC_COMM_SOB, bot.CB_SKIP_COMM]))
+                continue
+            if step > 0 and self.rnd.random() < self.back_prob:
+                await self.send_text("↩️ Назад", kind="back")
+                continue
+            await self.answer(FIELDS[step], st)
+        return False
+
+
+def _latency_stats(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": statistics.fmean(values) * 1e3,
+        "p50_ms": percentile(values, 0.50) * 1e3,
+        "p95_ms": percentile(values, 0.95) * 1e3,
+        "p99_ms": percentile(values, 0.99) * 1e3,
+        "max_ms": max(values) * 1e3,
+    }
+
+
+def _peak_rss_mb(who: int) -> float | None:
+    if resource is None:
+        return None
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+async def run_load(
+        users: int = 1000,
+        concurrency: int = 1000,
+        workers: int | None = None,
+        back_prob: float = 0.05,
+        invalid_prob: float = 0.05,
+        api_latency: float = 0.0,
+        render_cache_mb: int = 0,
+        pages: int = 30,
+        seed: int = 1,
+        update_concurrency: int = 0,
+        flood: tuple[float, float, float] | None = None,
+        outbound: bool = False,
+        streets: bool = False,
+) -> dict:
+    tmp, template = make_template_dir(pages=pages)
+    bot.TEMPLATE_PATH = bot.TEMPLATE_OKAZ_PATH = bot.TEMPLATE_SOB_PATH = template
+    cache = RenderCache(max_bytes=render_cache_mb * 1024 * 1024) if render_cache_mb > 0 else None
+    bot.render_pool = RenderPool(workers=workers, max_queue=users * 3, cache=cache)
+    bot.sessions.clear()
+    bot.streets = StreetIndex(make_street_names()) if streets else None
+
+    api = FakeBotRequest(latency=api_latency)
+    if flood is not None:
+        api.limit_flood(*flood)
+    builder = Application.builder().token("123456:LOADTEST").request(api).get_updates_request(FakeBotRequest())
+    scheduler = None
+    if outbound:
+        # планировщик с теми же лимитами, что у заглушки
+        chat_rate, chat_burst, global_rate = flood or (DEFAULT_CHAT_RATE, DEFAULT_CHAT_BURST, DEFAULT_GLOBAL_RATE)
+        scheduler = OutboundScheduler(chat_rate=chat_rate, chat_burst=chat_burst, global_rate=global_rate)
+        builder = builder.rate_limiter(scheduler)
+    processor = PerUserUpdateProcessor(update_concurrency) if update_concurrency > 0 else None
+    if processor is not None:
+        builder = builder.concurrent_updates(processor)
+    app = builder.build()
+    bot.register_handlers(app)
+
+    errors: list[str] = []
+
+    async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+        errors.append(repr(context.error))
+
+    app.add_error_handler(on_error)
+
+    rnd = random.Random(seed)
+    agents = [
+        SyntheticAgent(app, api, uid=10_000 + i, rnd=random.Random(rnd.random()),
+                       back_prob=back_prob, invalid_prob=invalid_prob, via_processor=processor is not None)
+        for i in range(users)
+    ]
+    sem = asyncio.Semaphore(concurrency)
+
+    async def drive(agent: SyntheticAgent) -> bool:
+        async with sem:
+            return await agent.run()
+
+    await app.initialize()
+    try:
+        t0 = time.perf_counter()
+        finished = await asyncio.gather(*(drive(a) for a in agents))
+        elapsed = time.perf_counter() - t0
+    finally:
+        await app.shutdown()
+        bot.render_pool.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    samples = [item for agent in agents for item in agent.latencies]
+    by_kind: dict[str, list[float]] = {}
+    for kind, value in samples:
+        by_kind.setdefault(kind, []).append(value)
+
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "users": users,
+        "concurrency": concurrency,
+        "render_workers": bot.render_pool.workers,
+        "completed": sum(1 for ok in finished if ok),
+        "updates": len(samples),
+        "elapsed_s": elapsed,
+        "throughput_ups": len(samples) / elapsed if elapsed else 0.0,
+        "latency": {
+            "all": _latency_stats([v for _, v in samples]),
+            **{kind: _latency_stats(values) for kind, values in sorted(by_kind.items())},
+        },
+        "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        "peak_rss_children_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        "documents_sent": api.sent_documents,
+        "api_calls": dict(api.calls),
+        "errors": len(errors),
+        "first_errors": errors[:5],
+        "render_cache": cache.stats() if cache else None,
+        "sessions": bot.sessions.stats(),
+        "update_processor": processor.stats() if processor else None,
+        "flood_errors": api.flood_errors,
+        "outbound": scheduler.stats() if scheduler else None,
+        "streets": bot.streets.stats() if bot.streets else None,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.loadtest", description="Нагрузочный тест диалога BH_bot")
+    parser.add_argument("-u", "--users", type=int, default=1000)
+    parser.add_argument("-c", "--concurrency", type=int, default=1000, help="одновременно активных агентов")
+    parser.add_argument("-w", "--workers", type=int, default=0, help="процессов рендеринга (0 — число ядер)")
+    parser.add_argument("--back-prob", type=float, default=0.05, help="вероятность шага «Назад»")
+    parser.add_argument("--invalid-prob", type=float, default=0.05, help="вероятность неверного ввода")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="задержка ответа фейкового Bot API")
+    parser.add_argument("--render-cache-mb", type=int, default=0)
+    parser.add_argument("--pages", type=int, default=30, help="размер синтетического шаблона")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--update-concurrency", type=int, default=0,
+                        help="пропускать апдейты через PerUserUpdateProcessor с этим лимитом (0 — напрямую)")
+    parser.add_argument("--flood", type=float, nargs=3, metavar=("CHAT_RATE", "CHAT_BURST", "GLOBAL_RATE"),
+                        help="лимиты фейкового Bot API (сообщений/с в чат, всплеск, сообщений/с всего); сверх — 429")
+    parser.add_argument("--outbound", action="store_true", help="отправлять через OutboundScheduler")
+    parser.add_argument("--streets", action="store_true",
+                        help="подсказки улиц по синтетическому справочнику: агент вводит начало названия и жмёт кнопку")
+    parser.add_argument("-o", "--output", help="сохранить отчёт в JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run_load(
+        users=args.users,
+        concurrency=args.concurrency,
+        workers=args.workers or None,
+        back_prob=args.back_prob,
+        invalid_prob=args.invalid_prob,
+        api_latency=args.api_latency_ms / 1000,
+        render_cache_mb=args.render_cache_mb,
+        pages=args.pages,
+        seed=args.seed,
+        update_concurrency=args.update_concurrency,
+        flood=tuple(args.flood) if args.flood else None,
+        outbound=args.outbound,
+        streets=args.streets,
+    ))
+
+    lat = report["latency"]["all"]
+    print(
+        f"{report['completed']}/{report['users']} агентов, {report['updates']} апдейтов за {report['elapsed_s']:.1f} с "
+        f"({report['throughput_ups']:.0f} upd/s); p50={lat.get('p50_ms', 0):.2f} мс "
+        f"p95={lat.get('p95_ms', 0):.2f} мс p99={lat.get('p99_ms', 0):.2f} мс; RSS {report['peak_rss_mb']} МБ",
+        file=sys.stderr,
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    return 0 if report["completed"] == report["users"] and not report["errors"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
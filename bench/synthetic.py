@@ -0,0 +1,176 @@
+import os
+import random
+import tempfile
+
+from docx import Document
+
+from fields import FIELDS
+
+
+DERIVED_KEYS = [
+    "mcnum", "deposum", "obj_tenants1", "obj_tenants2", "name_of_document", "document_value",
+    *[f"act{i}" for i in range(1, 6)],
+    *[f"stroka{i}" for i in range(1, 11)],
+]
+
+SAMPLE_FORM = {
+    "connum": "А123",
+    "date": "«20» марта 2025 г.",
+    "naim_name": "Иванов Иван Иванович",
+    "naim_address": "г. Москва, ул. Тверская, д. 10, кв. 5,",
+    "nps": "4010",
+    "npn": "123456",
+    "naim_passport_issued_by": "ГУ МВД РОССИИ ПО Г. МОСКВЕ",
+    "naim_passport_issued_date": "«30» января 2020 г.",
+    "ar_name": "Петров Пётр Петрович",
+    "ar_address": "г. Санкт-Петербург, ул. Барочная, д. 4, кв. 12,",
+    "aps": "4011",
+    "apn": "654321",
+    "ar_passport_issued_by": "ГУ МВД РОССИИ ПО Г. САНКТ-ПЕТЕРБУРГУ",
+    "ar_passport_issued_date": "«01» февраля 2015 г.",
+    "obj_address": "г. Санкт-Петербург, ул. Барочная, д. 6, к. 2, кв. 77,",
+    "obj_street": "Барочная",
+    "obj_house": "6",
+    "obj_building": "2",
+    "obj_flat": "77",
+    "obr": "2",
+    "oba": "54,3",
+    "doc_choice": "egrn",
+    "obj_kadastr": "78:07:0003141:1592",
+    "cert_series": "",
+    "cert_number": "",
+    "obj_tenants_list": ["Иванова Мария Сергеевна", "Иванов Пётр Иванович"],
+    "obj_animals": "Разрешено",
+    "obj_smoking": "Запрещено",
+    "rent_start": "«01» сентября 2025 г.",
+    "rent_end": "«01» сентября 2026 г.",
+    "monthly_payment": "45 000",
+    "deposit_date": "«01» сентября 2025 г.",
+    "deposit_amount": "45 000",
+    "monthly_due_day": "15",
+    "payment_utilities": "Наниматель",
+    "payment_internet": "Наниматель",
+    "payment_electricity": "Наниматель",
+    "payment_water": "Наймодатель",
+    "payment_repair": "Наймодатель",
+    "additional_conditions": "1. Не менять замки без согласия наймодателя\n2. Уборка подъезда по графику",
+    "act_make": "Да",
+    "act_date": "«01» сентября 2025 г.",
+    "act_condition": "Оборудование, мебель, техника и инженерные системы проверены, дефектов не выявлено.",
+    "act_keys": "2",
+    "act_electricity": "001234",
+    "act_hot_water": "00123,5",
+    "act_cold_water": "00234,1",
+}
+
+# сырые ответы агента на текстовые вопросы FIELDS
+RAW_ANSWERS = {
+    "connum": "А123",
+    "date": "20.03.25",
+    "naim_name": "иванов иван иванович",
+    "nps": "4010",
+    "npn": "123456",
+    "naim_passport_issued_by": "гу мвд россии по г. москве",
+    "naim_passport_issued_date": "30.01.2020",
+    "ar_name": "петров пётр петрович",
+    "aps": "4011",
+    "apn": "654321",
+    "ar_passport_issued_by": "гу мвд россии по спб",
+    "ar_passport_issued_date": "01.02.2015",
+    "obr": "2",
+    "oba": "54,3",
+    "obj_kadastr": "78:07:0003141:1592",
+    "cert_series": "78-АЖ",
+    "cert_number": "123456",
+    "rent_start": "01.09.2025",
+    "rent_end": "01.09.2026",
+    "monthly_payment": "45 000",
+    "deposit_date": "01.09.2025",
+    "deposit_amount": "45000",
+    "monthly_due_day": "15",
+    "act_date": "01.09.2025",
+    "act_keys": "2",
+    "act_electricity": "001234",
+    "act_hot_water": "00123,5",
+    "act_cold_water": "00234,1",
+}
+RAW_INVALID = {
+    "date": "32.13.25",
+    "nps": "40",
+    "npn": "12ab56",
+    "obj_kadastr": "78:07",
+    "monthly_payment": "сорок",
+    "monthly_due_day": "45",
+}
+ADDRESS_ANSWERS = {
+    "city": "москва",
+    "street": "тверская",
+    "house": "10к2",
+    "building": "-",
+    "flat": "5",
+}
+# что агент вводит в фазе улицы при подсказках (--streets): начало названия
+STREET_QUERIES = ["бароч", "невск", "фонта"]
+OBJ_ADDRESS_ANSWERS = {
+    "street": "барочная",
+    "house": "6",
+    "building": "2",
+    "flat": "77",
+}
+TENANT_NAMES = ["иванова мария сергеевна", "иванов пётр иванович", "сидорова анна"]
+CONDITIONS = [
+    "Не менять замки без согласия наймодателя",
+    "Уборка подъезда по графику",
+    "Ремонт только после согласования сметы",
+]
+
+RAW_FIO = ["иванов иван иванович", "  ПЕТРОВ-водкин кузьма  сергеевич ", "анна-мария д'арк", "ли"]
+RAW_DATES = ["20.03.25", "01.09.2025", "31.12.99", "5.6.2024", "32.01.2025", "abc"]
+RAW_MONEY = ["30000", "30 000", "1250000", "7", "45 500", "x1"]
+
+
+def words(rnd: random.Random, count: int) -> str:
+    pool = ["помещение", "наниматель", "наймодатель", "оплата", "договор", "срок", "ключи",
+            "квартира", "мебель", "ремонт", "счётчик", "вода", "электроэнергия", "условия"]
+    return " ".join(rnd.choice(pool) for _ in range(count))
+
+
+def make_template(path: str, pages: int = 30, seed: int = 1) -> str:
+    # синтетический шаблон: все ключи FIELDS и производные переменные,
+    # условные блоки, таблица, колонтитулы; ~15 абзацев на страницу
+    rnd = random.Random(seed)
+    keys = [f["key"] for f in FIELDS] + DERIVED_KEYS
+    doc = Document()
+    doc.sections[0].header.paragraphs[0].text = "Договор № {{ connum }} от {{ date }}"
+    doc.sections[0].footer.paragraphs[0].text = "{{ ar_name }} / {{ naim_name }}"
+    doc.add_heading("ДОГОВОР НАЙМА ЖИЛОГО ПОМЕЩЕНИЯ № {{ connum }}", level=1)
+    for i in range(pages * 15):
+        key = keys[i % len(keys)]
+        text = f"{i + 1}. {words(rnd, 12)} {{{{ {key} }}}} {words(rnd, 8)}."
+        if i % 10 == 0:
+            text += " {% if obj_animals %}Животные: {{ obj_animals }}.{% endif %}"
+        doc.add_paragraph(text)
+    table = doc.add_table(rows=len(keys) // 4 + 1, cols=4)
+    for i, key in enumerate(keys):
+        table.cell(i // 4, i % 4).text = f"{{{{ {key} }}}}"
+    doc.save(path)
+    return path
+
+
+def make_template_dir(pages: int = 30) -> tuple[str, str]:
+    tmp = tempfile.mkdtemp(prefix="bhbot_bench_")
+    return tmp, make_template(os.path.join(tmp, "template.docx"), pages=pages)
+
+
+def make_street_names(count: int = 3000, seed: int = 1) -> list[str]:
+    # синтетический справочник размером с петербургский: корни из слогов плюс тип улицы
+    rnd = random.Random(seed)
+    syllables = ["ба", "ро", "чна", "не", "вс", "ки", "са", "до", "ва", "ли", "тей", "ный", "мо", "ско",
+                 "пу", "ш", "кин", "гра", "жда", "нс", "ма", "ра", "та", "ле", "ни", "на", "зо", "ло"]
+    kinds = ["ул.", "пр.", "пер.", "наб.", "бул.", "ш."]
+    # с типом в названии — проверка, что «ул.» не дописывается второй раз
+    names = {"Барочная", "Тверская", "Невский проспект", "наб. реки Фонтанки"}
+    while len(names) < count:
+        root = "".join(rnd.choice(syllables) for _ in range(rnd.randint(2, 4))).capitalize()
+        names.add(f"{root}{rnd.choice(['ая', 'ий', 'ов'])} {rnd.choice(kinds)}" if rnd.random() < 0.7 else root)
+    return sorted(names)
@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+
+import httpx
+from telegram.ext import Application
+
+import main as bot
+from webhook import WebhookConfig, WebhookServer, SECRET_HEADER
+from bench.fake_bot_api import FakeBotRequest
+from bench.harness import percentile
+
+
+SECRET = "bench-secret"
+PATH = "/telegram"
+
+_update_ids = itertools.count(1)
+
+
+def _help_update(uid: int) -> dict:
+    return {
+        "update_id": next(_update_ids),
+        "message": {
+            "message_id": next(_update_ids),
+            "date": int(time.time()),
+            "chat": {"id": uid, "type": "private"},
+            "from": {"id": uid, "is_bot": False, "first_name": f"Agent{uid}"},
+            "text": "/help",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+        },
+    }
+
+
+def _stats(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 0.50) * 1e3,
+        "p95_ms": percentile(values, 0.95) * 1e3,
+        "p99_ms": percentile(values, 0.99) * 1e3,
+        "max_ms": max(values) * 1e3,
+    }
+
+
+def _build_app(api_latency: float) -> tuple[Application, FakeBotRequest, FakeBotRequest]:
+    api = FakeBotRequest(latency=api_latency)
+    updates_api = FakeBotRequest(latency=api_latency)
+    app = Application.builder().token("123456:WEBHOOK").request(api).get_updates_request(updates_api).build()
+    bot.register_handlers(app)
+    return app, api, updates_api
+
+
+async def measure_webhook(n: int, api_latency: float) -> dict:
+    # от отправки апдейта «Telegram'ом» до прихода ответа бота в фейковый Bot API
+    app, api, _ = _build_app(api_latency)
+    config = WebhookConfig(url=f"https://bench.invalid{PATH}", listen="127.0.0.1", port=0, secret=SECRET)
+    server = WebhookServer(app, config, bot.readiness)
+    await server.start()
+    await app.initialize()
+    await app.start()
+    server.webhook_set = True
+    latencies = []
+    base = f"http://127.0.0.1:{server.port}"
+    try:
+        async with httpx.AsyncClient(base_url=base) as client:
+            health = (await client.get("/healthz")).status_code
+            ready = (await client.get("/readyz")).status_code
+            forbidden = (await client.post(PATH, json=_help_update(1))).status_code
+            for i in range(n):
+                uid = 20_000 + i
+                replied = api.wait_reply(uid)
+                t0 = time.perf_counter()
+                response = await client.post(PATH, json=_help_update(uid), headers={SECRET_HEADER: SECRET})
+                response.raise_for_status()
+                latencies.append(await replied - t0)
+                # даём обработчику дождаться ответа API, чтобы следующий апдейт не стоял за ним в очереди
+                await asyncio.sleep(api_latency)
+    finally:
+        server.webhook_set = False
+        await server.stop()
+        await app.stop()
+        await app.shutdown()
+    return {
+        **_stats(latencies),
+        "healthz": health,
+        "readyz": ready,
+        "wrong_secret": forbidden,
+        "accepted": server.accepted,
+        "rejected": server.rejected,
+    }
+
+
+async def measure_polling(n: int, api_latency: float, poll_timeout: int = 10) -> dict:
+    app, api, updates_api = _build_app(api_latency)
+    updates_api.pending_updates = asyncio.Queue()
+    await app.initialize()
+    await app.start()
+    await app.updater.start_polling(poll_interval=0, timeout=poll_timeout)
+    latencies = []
+    try:
+        for i in range(n):
+            uid = 30_000 + i
+            replied = api.wait_reply(uid)
+            t0 = time.perf_counter()
+            updates_api.push_update(_help_update(uid))
+            latencies.append(await replied - t0)
+            await asyncio.sleep(api_latency)
+    finally:
+        await app.updater.stop()
+        await app.stop()
+        await app.shutdown()
+    return {**_stats(latencies), "getUpdates": updates_api.calls["getUpdates"]}
+
+
+async def run(n: int, api_latency: float) -> dict:
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "updates": n,
+        "api_latency_ms": api_latency * 1e3,
+        "webhook": await measure_webhook(n, api_latency),
+        "polling": await measure_polling(n, api_latency),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m bench.webhook_latency",
+        description="Задержка от апдейта до ответа: вебхук против long polling",
+    )
+    parser.add_argument("-n", "--updates", type=int, default=200)
+    parser.add_argument("--api-latency-ms", type=float, default=20.0, help="RTT до фейкового Bot API")
+    parser.add_argument("-o", "--output", help="сохранить отчёт в JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run(args.updates, args.api_latency_ms / 1000))
+
+    for mode in ("webhook", "polling"):
+        lat = report[mode]
+        print(
+            f"{mode:<8} p50={lat['p50_ms']:.2f} мс p95={lat['p95_ms']:.2f} мс p99={lat['p99_ms']:.2f} мс",
+            file=sys.stderr,
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
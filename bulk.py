@@ -0,0 +1,178 @@
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import sys
+import time
+import zipfile
+from typing import Iterator
+
+from fields import FIELDS, BRANCHES
+from form_logic import (
+    build_contract_context,
+    contract_filename,
+    validate_form,
+    form_value,
+)
+from render_pool import RenderPool
+
+
+# пакетная генерация договоров без Telegram: строка таблицы = одна анкета,
+# колонки называются ключами FIELDS (адреса можно давать частями, см. form_logic.ADDRESS_PARTS)
+DEFAULT_TEMPLATE = "template 3.docx"
+
+
+def _read_csv(path: str) -> Iterator[dict[str, str]]:
+    with open(path, encoding="utf-8-sig", newline="") as fh:
+        sample = fh.read(8192)
+        fh.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        for row in csv.DictReader(fh, dialect=dialect):
+            yield {(name or "").strip(): form_value(value) for name, value in row.items()}
+
+
+def _read_xlsx(path: str) -> Iterator[dict[str, str]]:
+    try:
+        import openpyxl
+    except ImportError:
+        raise SystemExit("Для чтения XLSX установите openpyxl: pip install openpyxl")
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [form_value(name) for name in next(rows, ())]
+        for values in rows:
+            yield {name: form_value(value) for name, value in zip(header, values) if name}
+    finally:
+        wb.close()
+
+
+def read_rows(path: str) -> Iterator[tuple[int, dict[str, str]]]:
+    # номер строки как в таблице: заголовок — строка 1
+    reader = _read_xlsx if path.lower().endswith((".xlsx", ".xlsm")) else _read_csv
+    for i, row in enumerate(reader(path)):
+        if any(row.values()):
+            yield i + 2, row
+
+
+class _DirectorySink:
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+    def write(self, name: str, payload: bytes) -> None:
+        with open(os.path.join(self.path, name), "wb") as fh:
+            fh.write(payload)
+
+    def close(self) -> None:
+        pass
+
+
+class _ZipSink:
+    def __init__(self, path: str):
+        self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+
+    def write(self, name: str, payload: bytes) -> None:
+        self._zip.writestr(name, payload)
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+async def generate(
+        rows: Iterator[tuple[int, dict[str, str]]],
+        template: str,
+        output: str,
+        pool: RenderPool,
+) -> tuple[int, int, list[tuple[int, str, str, str]]]:
+    sink = _ZipSink(output) if output.lower().endswith(".zip") else _DirectorySink(output)
+    # не больше задач, чем помещается в пул с очередью
+    slots = asyncio.Semaphore(pool.workers + pool.max_queue)
+    report: list[tuple[int, str, str, str]] = []
+    done = 0
+
+    async def render(row_no: int, data: dict) -> None:
+        nonlocal done
+        try:
+            payload = await pool.render(build_contract_context(data), template)
+        except Exception as e:
+            logging.error(f"Row {row_no}: render failed", exc_info=True)
+            report.append((row_no, "", "", f"ошибка генерации: {e}"))
+            return
+        finally:
+            slots.release()
+        try:
+            sink.write(f"{row_no:04d}_{contract_filename(data)}", payload)
+        except Exception as e:
+            # одна неудачная запись (имя файла, диск) не должна обрывать остальную пачку
+            logging.error(f"Row {row_no}: write failed", exc_info=True)
+            report.append((row_no, "", "", f"ошибка записи: {e}"))
+            return
+        done += 1
+
+    total = 0
+    tasks = []
+    try:
+        for row_no, row in rows:
+            total += 1
+            data, errors = validate_form(row, FIELDS, BRANCHES)
+            if errors:
+                report.extend((row_no, key, row.get(key, ""), message) for key, message in errors)
+                continue
+            await slots.acquire()
+            tasks.append(asyncio.create_task(render(row_no, data)))
+        await asyncio.gather(*tasks)
+    finally:
+        sink.close()
+    report.sort()
+    return total, done, report
+
+
+def write_report(path: str, report: list[tuple[int, str, str, str]]) -> None:
+    # «;» и BOM — чтобы отчёт открывался в Excel с русской локалью
+    with open(path, "w", encoding="utf-8-sig", newline="") as fh:
+        writer = csv.writer(fh, delimiter=";")
+        writer.writerow(["строка", "поле", "значение", "ошибка"])
+        writer.writerows(report)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python bulk.py", description="Пакетная генерация договоров из CSV/XLSX")
+    parser.add_argument("input", help="CSV или XLSX, колонки — ключи из fields.py")
+    parser.add_argument("-o", "--output", required=True, help="папка для договоров или файл .zip")
+    parser.add_argument("-t", "--template", default=DEFAULT_TEMPLATE)
+    parser.add_argument("-e", "--errors", help="CSV-отчёт об ошибках (по умолчанию <output>_errors.csv)")
+    parser.add_argument("-w", "--workers", type=int, default=int(os.getenv("RENDER_WORKERS", "0") or 0),
+                        help="процессов рендеринга (0 — число ядер)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if not os.path.exists(args.template):
+        print(f"Шаблон не найден: {args.template}", file=sys.stderr)
+        return 2
+
+    pool = RenderPool(workers=args.workers or None)
+    t0 = time.perf_counter()
+    try:
+        total, done, report = asyncio.run(generate(read_rows(args.input), args.template, args.output, pool))
+    finally:
+        pool.shutdown()
+    elapsed = time.perf_counter() - t0
+
+    errors_path = args.errors or os.path.splitext(args.output.rstrip("/\\"))[0] + "_errors.csv"
+    failed_rows = len({row_no for row_no, *_ in report})
+    if report:
+        write_report(errors_path, report)
+    print(
+        f"{done}/{total} договоров за {elapsed:.1f} с ({done / elapsed if elapsed else 0:.1f} шт/с) → {args.output}"
+        + (f"; строк с ошибками: {failed_rows}, отчёт: {errors_path}" if report else ""),
+        file=sys.stderr,
+    )
+    return 1 if report else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
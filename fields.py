@@ -1,4 +1,3 @@
-import re
 from form_logic import (
     format_date,
     format_fio,
@@ -8,6 +7,7 @@ from form_logic import (
     preserve_numeric_string,
     format_keys_count,
 )
+from validators import compile_validator
 
 FIELDS = [
     {"key": "connum", "question": "Введите номер договора (пример: А123):", "formatter": (lambda s: s.strip() if s and s.strip() else None)},
@@ -15,25 +15,25 @@ FIELDS = [
 
     {"key": "naim_name", "question": "Введите ФИО нанимателя:", "formatter": format_fio},
     {"key": "naim_address", "question": "📬 Город регистрации нанимателя:", "formatter": "multi_address_naim"},
-    {"key": "nps", "question": "📄 Серия паспорта нанимателя (4 цифры):", "formatter": (lambda x: x if x.isdigit() and len(x) == 4 else None)},
-    {"key": "npn", "question": "📄 Номер паспорта нанимателя (6 цифр):", "formatter": (lambda x: x if x.isdigit() and len(x) == 6 else None)},
+    {"key": "nps", "question": "📄 Серия паспорта нанимателя (4 цифры):", "validate": {"digits": 4, "message": "Серия паспорта — 4 цифры."}},
+    {"key": "npn", "question": "📄 Номер паспорта нанимателя (6 цифр):", "validate": {"digits": 6, "message": "Номер паспорта — 6 цифр."}},
     {"key": "naim_passport_issued_by", "question": "📄 Кем выдан паспорт? (пример: ГУ МВД России)", "formatter": to_upper},
     {"key": "naim_passport_issued_date", "question": "📅 Когда выдан паспорт? (пример: 30.01.2020)", "formatter": format_date},
 
     {"key": "ar_name", "question": "👤 ФИО наймодателя:", "formatter": format_fio},
     {"key": "ar_address", "question": "📬 Город регистрации наймодателя:", "formatter": "multi_address_ar"},
-    {"key": "aps", "question": "📄 Серия паспорта наймодателя (4 цифры):", "formatter": (lambda x: x if x.isdigit() and len(x) == 4 else None)},
-    {"key": "apn", "question": "📄 Номер паспорта наймодателя (6 цифр):", "formatter": (lambda x: x if x.isdigit() and len(x) == 6 else None)},
+    {"key": "aps", "question": "📄 Серия паспорта наймодателя (4 цифры):", "validate": {"digits": 4, "message": "Серия паспорта — 4 цифры."}},
+    {"key": "apn", "question": "📄 Номер паспорта наймодателя (6 цифр):", "validate": {"digits": 6, "message": "Номер паспорта — 6 цифр."}},
     {"key": "ar_passport_issued_by", "question": "📄 Кем выдан паспорт наймодателя?", "formatter": to_upper},
     {"key": "ar_passport_issued_date", "question": "📅 Когда выдан паспорт наймодателя?", "formatter": format_date},
 
     {"key": "obj_address", "question": "📍 Адрес объекта (Санкт-Петербург): укажите улицу (пример: Барочная)", "formatter": "multi_address_obj"},
-    {"key": "obr", "question": "🚪 Количество комнат:", "formatter": (lambda x: x if x.isdigit() else None)},
-    {"key": "oba", "question": "📐 Общая площадь (кв.м):", "formatter": (lambda x: x if re.fullmatch(r"\d+(?:[.,]\d+)?", x) else None)},
+    {"key": "obr", "question": "🚪 Количество комнат:", "validate": {"digits": None, "message": "Количество комнат — целое число."}},
+    {"key": "oba", "question": "📐 Общая площадь (кв.м):", "validate": {"regex": r"[0-9]+(?:[.,][0-9]+)?", "message": "Площадь — число, например 54 или 54,3."}},
 
     {"key": "doc_choice", "question": "📄 Подтверждение права: выберите документ", "formatter": "inline_doc_choice"},
 
-    {"key": "obj_kadastr", "question": "📄 Кадастровый номер (пример: 00:00:0000000:0000):", "formatter": (lambda x: x if re.fullmatch(r"\d{2}:\d{2}:\d{7}:\d{4}", x) else None)},
+    {"key": "obj_kadastr", "question": "📄 Кадастровый номер (пример: 00:00:0000000:0000):", "validate": {"regex": r"[0-9]{2}:[0-9]{2}:[0-9]{7}:[0-9]{4}", "message": "Кадастровый номер в формате 00:00:0000000:0000."}},
     {"key": "cert_series", "question": "📄 Серия свидетельства:", "formatter": (lambda s: s.strip() if s and s.strip() != "-" else "-")},
     {"key": "cert_number", "question": "📄 Номер свидетельства:", "formatter": (lambda s: s.strip() if s and s.strip() != "-" else "-")},
 
@@ -49,7 +49,7 @@ FIELDS = [
     {"key": "monthly_payment", "question": "💸 Ежемесячная плата (в рублях, пример: 30000/30 000):", "formatter": format_money},
     {"key": "deposit_date", "question": "📆 Дата внесения обеспечительного платежа:", "formatter": format_date},
     {"key": "deposit_amount", "question": "💰 Сумма обеспечительного платежа (в рублях, пример: 30000/30 000):", "formatter": format_money},
-    {"key": "monthly_due_day", "question": "📅 До какого числа каждого месяца должна быть произведена оплата? (пример: 15)", "formatter": (lambda x: x if x.isdigit() and 1 <= int(x) <= 31 else None)},
+    {"key": "monthly_due_day", "question": "📅 До какого числа каждого месяца должна быть произведена оплата? (пример: 15)", "validate": {"int_range": (1, 31), "message": "Число месяца — от 1 до 31."}},
     {"key": "payment_utilities", "question": "🏠 Коммунальные услуги оплачивает:", "formatter": "inline_buttons"},
     {"key": "payment_internet", "question": "🌐 Интернет оплачивает:", "formatter": "inline_buttons"},
     {"key": "payment_electricity", "question": "⚡️ Электроэнергию оплачивает:", "formatter": "inline_buttons"},
@@ -65,4 +65,25 @@ FIELDS = [
     {"key": "act_electricity", "question": "⚡️ Показания электросчётчика:", "formatter": preserve_numeric_string},
     {"key": "act_hot_water", "question": "🌡️ Показания счётчика горячей воды:", "formatter": preserve_numeric_string},
     {"key": "act_cold_water", "question": "❄️ Показания счётчика холодной воды:", "formatter": preserve_numeric_string},
-]
\ No newline at end of file
+]
+# декларативные проверки ("validate") собираются один раз при импорте и становятся форматтером поля:
+# их же используют чат, пакетная генерация и проверка анкеты целиком
+for _field in FIELDS:
+    if "validate" in _field:
+        if _field.get("formatter") is not None:
+            raise ValueError(f"У поля {_field['key']} заданы и formatter, и validate")
+        _field["formatter"] = compile_validator(_field["validate"], name=_field["key"])
+del _field
+
+# ветвления анкеты: поле-переключатель -> его значение -> поля, которые тогда не спрашиваются
+# (пропущенные поля сохраняются пустыми)
+BRANCHES = {
+    "doc_choice": {
+        "skip": ("obj_kadastr", "cert_series", "cert_number"),
+        "egrn": ("cert_series", "cert_number"),
+        "cert": ("obj_kadastr",),
+    },
+    "act_make": {
+        "Нет": ("act_date", "act_condition", "act_keys", "act_electricity", "act_hot_water", "act_cold_water"),
+    },
+}
@@ -0,0 +1,68 @@
+from itertools import product
+
+
+class FormFlow:
+    # переходы анкеты, заранее посчитанные для каждой комбинации значений полей-переключателей:
+    # landing[вариант][шаг] — первый непропускаемый шаг >= шага, prev[вариант][шаг] — предыдущий
+    def __init__(self, fields: list[dict], branches: dict[str, dict[str, tuple[str, ...]]]):
+        self.keys = [f["key"] for f in fields]
+        self.size = len(self.keys)
+        index = {key: i for i, key in enumerate(self.keys)}
+
+        for switch, variants in branches.items():
+            if switch not in index:
+                raise ValueError(f"Переключатель {switch} отсутствует в FIELDS")
+            for value, skipped in variants.items():
+                for key in skipped:
+                    if index.get(key, -1) <= index[switch]:
+                        raise ValueError(f"Поле {key} ветки {switch}={value} должно идти после {switch}")
+
+        self.switches = tuple(branches)
+        self.branches = branches
+        self.landing: dict[tuple, list[int]] = {}
+        self.prev: dict[tuple, list[int]] = {}
+        self.skipped: dict[tuple, list[tuple[str, ...]]] = {}
+
+        for variant in product(*[(None, *branches[s]) for s in self.switches]):
+            skip = set()
+            for switch, value in zip(self.switches, variant):
+                if value is not None:
+                    skip.update(index[key] for key in branches[switch][value])
+
+            landing = [0] * (self.size + 1)
+            skipped: list[tuple[str, ...]] = [()] * (self.size + 1)
+            landing[self.size] = self.size
+            for step in range(self.size - 1, -1, -1):
+                if step in skip:
+                    landing[step] = landing[step + 1]
+                    skipped[step] = (self.keys[step], *skipped[step + 1])
+                else:
+                    landing[step] = step
+
+            prev = [0] * (self.size + 1)
+            last = 0
+            for step in range(self.size + 1):
+                prev[step] = last
+                if step < self.size and step not in skip:
+                    last = step
+
+            self.landing[variant] = landing
+            self.prev[variant] = prev
+            self.skipped[variant] = skipped
+
+    def variant(self, get_value) -> tuple:
+        # значения, для которых нет ветки, ничего не пропускают
+        return tuple(
+            value if value in self.branches[switch] else None
+            for switch in self.switches
+            for value in (get_value(switch),)
+        )
+
+    def resolve(self, variant: tuple, step: int) -> tuple[int, tuple[str, ...]]:
+        # шаг, на котором остановится анкета, и поля, пропущенные по дороге
+        if step >= self.size:
+            return step, ()
+        return self.landing[variant][step], self.skipped[variant][step]
+
+    def prev_step(self, variant: tuple, step: int) -> int:
+        return self.prev[variant][min(step, self.size)]
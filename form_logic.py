@@ -1,11 +1,20 @@
 import re
 from datetime import datetime, date
-from typing import List
+from typing import Callable, Iterable, List
 import os, subprocess, shlex, platform
-from shutil import which
+import copy
+import functools
+import io
+import threading
+import zipfile
 from babel.dates import format_date as babel_format_date
 from num2words import num2words
+from docx import Document
 from docxtpl import DocxTemplate
+from jinja2 import Environment, meta
+
+from streets import STREET_TYPES, normalize_street
+from validators import EnumValidator
 
 
 
@@ -13,6 +22,10 @@ from docxtpl import DocxTemplate
 DEFAULT_ACT_CONDITION = (
     "Оборудование, мебель, техника и инженерные системы проверены, дефектов не выявлено."
 )
+# текст кнопки «Всё исправно…» в вопросе о состоянии помещения
+ACT_CONDITION_ALL_OK = (
+    "Всё оборудование, мебель, техника и системы исправны и находятся в хорошем и рабочем состоянии."
+)
 
 
 KADASTR_RE = re.compile(r"^\d{2}:\d{2}:\d{7}:\d{4}$")
@@ -24,6 +37,76 @@ MONTHS_GEN = [
 ]
 
 
+# числа прописью без num2words для сумм до миллиарда: слова для 0..999 считаются один раз,
+# сумма собирается из трёх групп (миллионы, тысячи, единицы)
+_UNITS = (
+    "", "один", "два", "три", "четыре", "пять", "шесть", "семь", "восемь", "девять", "десять",
+    "одиннадцать", "двенадцать", "тринадцать", "четырнадцать", "пятнадцать", "шестнадцать",
+    "семнадцать", "восемнадцать", "девятнадцать",
+)
+_TENS = ("", "", "двадцать", "тридцать", "сорок", "пятьдесят", "шестьдесят", "семьдесят", "восемьдесят", "девяносто")
+_HUNDREDS = ("", "сто", "двести", "триста", "четыреста", "пятьсот", "шестьсот", "семьсот", "восемьсот", "девятьсот")
+_THOUSANDS = ("тысяча", "тысячи", "тысяч")
+_MILLIONS = ("миллион", "миллиона", "миллионов")
+RUBLES = ("рубль", "рубля", "рублей")
+WORDS_FAST_LIMIT = 10 ** 9
+
+
+def _triplet(n: int, feminine: bool = False) -> str:
+    hundreds, rest = divmod(n, 100)
+    words = [_HUNDREDS[hundreds]]
+    if rest < 20:
+        unit = rest
+    else:
+        tens, unit = divmod(rest, 10)
+        words.append(_TENS[tens])
+    if feminine and unit in (1, 2):
+        words.append(("одна", "две")[unit - 1])
+    else:
+        words.append(_UNITS[unit])
+    return " ".join(w for w in words if w)
+
+
+_TRIPLETS = tuple(_triplet(n) for n in range(1000))
+_TRIPLETS_FEM = tuple(_triplet(n, feminine=True) for n in range(1000))
+
+
+def plural_form(n: int, forms: tuple[str, str, str]) -> str:
+    # 1 рубль, 2 рубля, 5 рублей; 11–14 — всегда третья форма
+    n = abs(n) % 100
+    if 11 <= n <= 14:
+        return forms[2]
+    n %= 10
+    if n == 1:
+        return forms[0]
+    if 2 <= n <= 4:
+        return forms[1]
+    return forms[2]
+
+
+def ruble_form(amount: int) -> str:
+    return plural_form(amount, RUBLES)
+
+
+@functools.lru_cache(maxsize=4096)
+def amount_words(amount: int) -> str:
+    # суммы аренды повторяются, поэтому результат кэшируется
+    if amount == 0:
+        return "ноль"
+    if not 0 < amount < WORDS_FAST_LIMIT:
+        return num2words(amount, lang="ru")
+    millions, rest = divmod(amount, 1_000_000)
+    thousands, units = divmod(rest, 1000)
+    words = []
+    if millions:
+        words += [_TRIPLETS[millions], plural_form(millions, _MILLIONS)]
+    if thousands:
+        words += [_TRIPLETS_FEM[thousands], plural_form(thousands, _THOUSANDS)]
+    if units:
+        words.append(_TRIPLETS[units])
+    return " ".join(words)
+
+
 def _to_int_amount(s: str) -> int | None:
     if s is None:
         return None
@@ -44,7 +127,13 @@ def money_words_only(raw: str) -> str:
     amount = _to_int_amount(raw)
     if amount is None:
         return ""
-    return num2words(amount, lang="ru")
+    return amount_words(amount)
+
+def money_rubles_word(raw: str) -> str:
+    # «рубль/рубля/рублей» в согласовании с суммой: {{mcnum}} ({{monthly_payment}}) {{mcrub}}
+    amount = _to_int_amount(raw)
+    return ruble_form(amount) if amount is not None else ""
+
 
 def split_money_parts(raw: str) -> tuple[str, str]:
     num = format_money(raw)
@@ -53,37 +142,98 @@ def split_money_parts(raw: str) -> tuple[str, str]:
 
 
 
+# дд.мм.гг / дд.мм.гггг с разделителями «.», «/», «-» или пробелом — одним проходом;
+# цифры только ASCII: \d пропустил бы «١٢» и другие юникодные цифры
+DATE_RE = re.compile(r"\s*([0-9]{1,2})\s*[./\-\s]\s*([0-9]{1,2})\s*[./\-\s]\s*([0-9]{4}|[0-9]{2})\s*")
+# дата, уже отформатированная format_date: «01» сентября 2025 г.
+FORMATTED_DATE_RE = re.compile(r"«([0-9]{2})» (\S+) ([0-9]{4}) г\.")
+MONTH_BY_GEN = {name: i + 1 for i, name in enumerate(MONTHS_GEN)}
+
+
+# двузначный год: до текущего плюс столько лет вперёд — 20гг (сроки найма), дальше — 19гг (старые паспорта)
+TWO_DIGIT_YEAR_AHEAD = 10
+
+
+def _two_digit_pivot() -> int:
+    # входит в ключ кэшей разбора: после Нового года граница века сдвигается
+    return (date.today().year + TWO_DIGIT_YEAR_AHEAD) % 100
+
+
 def parse_date(raw: str) -> date | None:
+    return _parse_date(raw, _two_digit_pivot())
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_date(raw: str, pivot: int) -> date | None:
     if not raw:
         return None
-    raw = raw.strip()
-    for fmt in ("%d.%m.%Y", "%d.%m.%y"):
-        try:
-            dt = datetime.strptime(raw, fmt).date()
-            if fmt == "%d.%m.%y" and dt.year < 2000:
-                dt = date(dt.year + 2000, dt.month, dt.day)
-            return dt
-        except ValueError:
-            continue
-    return None
+    m = DATE_RE.fullmatch(raw)
+    if m is None:
+        return None
+    day, month, year = int(m[1]), int(m[2]), int(m[3])
+    if len(m[3]) == 2:
+        year += 2000 if year <= pivot else 1900
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
 
 
+def date_value(value: str | None) -> date | None:
+    # дата из сырого ввода или из уже сохранённого значения анкеты
+    return _date_value(value, _two_digit_pivot())
 
 
+@functools.lru_cache(maxsize=1024)
+def _date_value(value: str | None, pivot: int) -> date | None:
+    if not value:
+        return None
+    m = FORMATTED_DATE_RE.fullmatch(value)
+    if m is None:
+        return _parse_date(value, pivot)
+    month = MONTH_BY_GEN.get(m[2])
+    if month is None:
+        return None
+    try:
+        return date(int(m[3]), month, int(m[1]))
+    except ValueError:
+        return None
+
+
+# проверки между полями-датами: (поле, правило, другое поле, сообщение)
+DATE_AFTER = "after"
+DATE_NOT_FUTURE = "not_future"
+DATE_RULES = (
+    ("rent_end", DATE_AFTER, "rent_start", "Дата окончания найма должна быть позже даты начала."),
+    ("naim_passport_issued_date", DATE_NOT_FUTURE, None, "Дата выдачи паспорта не может быть в будущем."),
+    ("ar_passport_issued_date", DATE_NOT_FUTURE, None, "Дата выдачи паспорта не может быть в будущем."),
+)
+DATE_RULE_KEYS = frozenset(
+    key for field, _, other, _ in DATE_RULES for key in (field, other) if key is not None
+)
+
+
+def check_dates(values, only: str | None = None, today: date | None = None) -> list[tuple[str, str]]:
+    # values — любое отображение ключ -> дата (сырой ввод или format_date); пустые поля не проверяются;
+    # only — проверить лишь правила, в которых участвует это поле (ответ на один вопрос в чате)
+    today = today or date.today()
+    errors = []
+    for field, rule, other, message in DATE_RULES:
+        if only is not None and only not in (field, other):
+            continue
+        value = date_value(values.get(field))
+        if value is None:
+            continue
+        if rule == DATE_NOT_FUTURE:
+            ok = value <= today
+        else:
+            other_value = date_value(values.get(other))
+            ok = other_value is None or value > other_value
+        if not ok:
+            errors.append((field, message))
+    return errors
+
 
-def _find_soffice_com() -> str | None:
-    # 1) если в PATH
-    p = which("soffice.com")
-    if p:
-        return p
-    candidates = [
-        r"C:\Program Files\LibreOffice\program\soffice.com",
-        r"C:\Program Files (x86)\LibreOffice\program\soffice.com",
-    ]
-    for c in candidates:
-        if os.path.exists(c):
-            return c
-    return None
 
 
 
@@ -206,6 +356,13 @@ def format_keys_count(raw: str) -> str | None:
     return None
 
 
+def street_with_type(street: str) -> str:
+    # «ул.» только если тип улицы не указан в названии («Невский проспект», «наб. Фонтанки»)
+    if any(word in STREET_TYPES for word in normalize_street(street).split()):
+        return street
+    return f"ул. {street}"
+
+
 def compose_full_address(city: str | None,
                          street: str | None,
                          house: str | None,
@@ -216,7 +373,7 @@ def compose_full_address(city: str | None,
         return None
     parts = [
         f"г. {format_location(city)}",
-        f"ул. {format_location(street)}",
+        street_with_type(format_location(street)),
         f"д. {house}",
     ]
     if building and building.strip() != "-":
@@ -226,6 +383,35 @@ def compose_full_address(city: str | None,
     return " ".join(parts)
 
 
+def compose_registration_address(city: str, street: str, house: str,
+                                 building: str | None = None, flat: str | None = None) -> str:
+    parts = [f"г. {city}", street_with_type(street), f"д. {house}"]
+    if building and building != "-":
+        parts.append(f"к. {building}")
+    if flat and flat != "-":
+        parts.append(f"кв. {flat}")
+    return ", ".join(parts) + ","
+
+
+def compose_object_address(street: str, house: str | None = None,
+                           building: str | None = None, flat: str | None = None) -> dict[str, str]:
+    # адрес объекта всегда в Санкт-Петербурге; части нужны шаблонам отдельно
+    parts = ["г. Санкт-Петербург", street_with_type(street)]
+    if house and house != "-":
+        parts.append(f"д. {house}")
+    if building and building != "-":
+        parts.append(f"к. {building}")
+    if flat and flat != "-":
+        parts.append(f"кв. {flat}")
+    return {
+        "obj_address": ", ".join(parts) + ",",
+        "obj_street": street or "",
+        "obj_house": house or "",
+        "obj_building": building if building != "-" else "",
+        "obj_flat": flat if flat != "-" else "",
+    }
+
+
 def ensure_not_empty(value: str | None) -> str:
     if value is None:
         return "-"
@@ -237,23 +423,112 @@ def normalize_money_no_rubles(raw: str) -> str | None:
     return format_money(raw)
 
 
-def fill_template(context: dict, template_path: str, output_path: str) -> str:
-    doc = DocxTemplate(template_path)
+class _CachingEnvironment(Environment):
+    # docxtpl компилирует XML каждой части документа через from_string —
+    # у одной версии шаблона исходники не меняются, поэтому храним результат
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._compiled: dict[str, object] = {}
+        self._compiled_lock = threading.Lock()
+
+    def from_string(self, source, globals=None, template_class=None):
+        if globals is not None or template_class is not None or not isinstance(source, str):
+            return super().from_string(source, globals, template_class)
+        tpl = self._compiled.get(source)
+        if tpl is None:
+            tpl = super().from_string(source)
+            with self._compiled_lock:
+                self._compiled[source] = tpl
+        return tpl
+
+
+class _CompiledTemplate:
+    def __init__(self, path: str, mtime_ns: int):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.docx = Document(path)
+        self.jinja_env = _CachingEnvironment()
+        probe = DocxTemplate(path)
+        probe.docx = self.docx
+        self.body_xml = probe.patch_xml(probe.get_xml())
+        self.variables = self._find_variables(probe)
+
+    def _find_variables(self, probe: DocxTemplate) -> frozenset[str]:
+        xml = self.body_xml
+        for uri in (DocxTemplate.HEADER_URI, DocxTemplate.FOOTER_URI):
+            for _, part in probe.get_headers_footers(uri):
+                xml += probe.patch_xml(probe.get_part_xml(part))
+        try:
+            return frozenset(meta.find_undeclared_variables(self.jinja_env.parse(xml)))
+        except Exception:
+            return frozenset()
+
+
+class _CachedDocxTemplate(DocxTemplate):
+    def __init__(self, compiled: _CompiledTemplate):
+        super().__init__(compiled.path)
+        self._compiled = compiled
+        self.docx = copy.deepcopy(compiled.docx)
+
+    def build_xml(self, context, jinja_env=None):
+        return self.render_xml_part(self._compiled.body_xml, self.docx._part, context, jinja_env)
+
+    def render(self, context, jinja_env=None, autoescape=False):
+        super().render(context, jinja_env or self._compiled.jinja_env, autoescape)
+
+
+_TEMPLATE_CACHE: dict[str, _CompiledTemplate] = {}
+_TEMPLATE_CACHE_LOCK = threading.Lock()
+
+
+def get_compiled_template(template_path: str) -> _CompiledTemplate:
+    path = os.path.abspath(template_path)
+    mtime_ns = os.stat(path).st_mtime_ns
+    compiled = _TEMPLATE_CACHE.get(path)
+    if compiled is not None and compiled.mtime_ns == mtime_ns:
+        return compiled
+    with _TEMPLATE_CACHE_LOCK:
+        compiled = _TEMPLATE_CACHE.get(path)
+        if compiled is None or compiled.mtime_ns != mtime_ns:
+            compiled = _CompiledTemplate(path, mtime_ns)
+            _TEMPLATE_CACHE[path] = compiled
+    return compiled
+
+
+def get_template_variables(template_path: str) -> frozenset[str]:
+    return get_compiled_template(template_path).variables
+
+
+def clear_template_cache() -> None:
+    with _TEMPLATE_CACHE_LOCK:
+        _TEMPLATE_CACHE.clear()
 
-    try:
-        expected = set(doc.get_undeclared_template_variables())
-    except Exception:
-        expected = set()
+
+def _render_template(context: dict, template_path: str) -> DocxTemplate:
+    compiled = get_compiled_template(template_path)
+    doc = _CachedDocxTemplate(compiled)
 
     ctx = dict(context) if context else {}
-    if expected:
-        for k in expected:
-            if k not in ctx:
-                ctx[k] = ""
+    for k in compiled.variables:
+        if k not in ctx:
+            ctx[k] = ""
     doc.render(ctx)
+    return doc
+
+
+def fill_template(context: dict, template_path: str, output_path: str) -> str:
+    doc = _render_template(context, template_path)
     doc.save(output_path)
     return output_path
 
+
+def fill_template_to_buffer(context: dict, template_path: str) -> io.BytesIO:
+    doc = _render_template(context, template_path)
+    buf = io.BytesIO()
+    doc.save(buf)
+    buf.seek(0)
+    return buf
+
 def wrap_conditions_to_rows(
     items: List[str],
     rows: int = 10,
@@ -311,3 +586,420 @@ def wrap_conditions_to_rows(
         out.append("")
 
     return out[:rows]
+
+
+def wrap_to_lines(text: str, max_len: int, lines: int) -> list[str]:
+    words = re.findall(r'\S+', (text or "").strip())
+    out = [''] * lines
+    if not words:
+        return out
+
+    li = 0
+    cur = []
+    cur_len = 0
+
+    for w in words:
+        add = (1 if cur else 0) + len(w)
+        if cur_len + add <= max_len:
+            cur.append(w)
+            cur_len += add
+        else:
+            out[li] = ' '.join(cur)
+            li += 1
+            if li >= lines:
+                return out
+            cur = [w]
+            cur_len = len(w)
+
+    if li < lines:
+        out[li] = ' '.join(cur)
+
+    return out
+
+
+DOC_NAME_EGRN = "Выписка из ЕГРН,"
+DOC_NAME_CERT = "Свидетельство о государственной регистрации права,"
+
+
+def title_document_fields(data: dict) -> dict[str, str]:
+    doc_choice = data.get("doc_choice")
+    if doc_choice == "egrn":
+        return {"name_of_document": DOC_NAME_EGRN, "document_value": data.get("obj_kadastr", "")}
+    if doc_choice == "cert":
+        series = data.get("cert_series", "")
+        number = data.get("cert_number", "")
+        return {"name_of_document": DOC_NAME_CERT, "document_value": f"серия {series} № {number}".strip()}
+    return {"name_of_document": "", "document_value": ""}
+
+
+def pack_two_lines(names: list[str], max1: int = 80, max2: int = 80) -> tuple[str, str]:
+    if not names:
+        return "", ""
+    first, used = [], 0
+    cutoff = 0
+    for i, name in enumerate(names):
+        token = (", " if first else "") + name
+        if used + len(token) <= max1:
+            first.append(name);
+            used += len(token)
+        else:
+            cutoff = i;
+            break
+    else:
+        cutoff = len(names)
+    rest = names[cutoff:]
+    line1 = ", ".join(first)
+    if not rest:
+        return line1, ""
+    second, used2 = [], 0
+    for name in rest:
+        token = (", " if second else "") + name
+        if used2 + len(token) <= max2:
+            second.append(name);
+            used2 += len(token)
+        else:
+            if second and (used2 + len(", и др.") <= max2):
+                second.append("и др.")
+            elif not second:
+                second = [name[:max2 - 1] + "…"]
+            break
+    return line1, ", ".join(second)
+
+
+def _context_value(value):
+    return "" if value in (None, "", "-") else value
+
+
+def _monthly_payment_context(data: dict) -> dict:
+    num, words = split_money_parts(data.get("monthly_payment"))
+    return {"mcnum": num or "", "monthly_payment": words or "", "mcrub": money_rubles_word(data.get("monthly_payment"))}
+
+
+def _deposit_context(data: dict) -> dict:
+    num, words = split_money_parts(data.get("deposit_amount"))
+    return {"deposum": num or "", "deposit_amount": words or "", "deporub": money_rubles_word(data.get("deposit_amount"))}
+
+
+def _act_context(data: dict) -> dict:
+    act_text = (data.get("act_condition") or "").strip()
+    if act_text:
+        act_lines = wrap_to_lines(act_text, max_len=75, lines=5)
+    else:
+        act_lines = [""] * 5
+    return {f"act{i}": line for i, line in enumerate(act_lines, start=1)}
+
+
+def _conditions_context(data: dict) -> dict:
+    raw_add = (data.get("additional_conditions") or "").strip()
+    items: list[str] = []
+    if raw_add and raw_add != "-":
+        for line in raw_add.splitlines():
+            s = re.sub(r"^\s*\d+\.\s*", "", line.strip())
+            if s and s != "-":
+                items.append(s)
+    rows = wrap_conditions_to_rows(items, rows=10, budget_chars=80, with_numbers=True)
+    return {f"stroka{i + 1}": rows[i] for i in range(10)}
+
+
+def _tenants_context(data: dict) -> dict:
+    names = data.get("obj_tenants_list", []) or []
+    line1, line2 = pack_two_lines(names, max1=80, max2=80)
+    return {"obj_tenants1": line1, "obj_tenants2": line2}
+
+
+def _title_document_context(data: dict) -> dict:
+    return title_document_fields({key: _context_value(data.get(key)) for key in TITLE_DOCUMENT_KEYS})
+
+
+TITLE_DOCUMENT_KEYS = ("doc_choice", "obj_kadastr", "cert_series", "cert_number")
+
+# производные ключи шаблона: от каких полей анкеты зависят и как считаются
+CONTEXT_DERIVATIONS = (
+    (("monthly_payment",), _monthly_payment_context),
+    (("deposit_amount",), _deposit_context),
+    (("act_condition",), _act_context),
+    (("additional_conditions",), _conditions_context),
+    (("obj_tenants_list",), _tenants_context),
+    (TITLE_DOCUMENT_KEYS, _title_document_context),
+)
+_DERIVATIONS_BY_KEY: dict[str, tuple] = {}
+for _keys, _derive in CONTEXT_DERIVATIONS:
+    for _key in _keys:
+        _DERIVATIONS_BY_KEY[_key] = _DERIVATIONS_BY_KEY.get(_key, ()) + (_derive,)
+
+# ключи, которые шаблон ждёт всегда, даже если поле не заполнено
+CONTEXT_DEFAULTS = {
+    "act_date": "", "act_keys": "", "act_electricity": "", "act_hot_water": "", "act_cold_water": "",
+    **{f"act{i}": "" for i in range(1, 6)},
+    "obj_tenants1": "", "obj_tenants2": "",
+    "name_of_document": "", "document_value": "",
+    "mcnum": "", "monthly_payment": "", "deposum": "", "deposit_amount": "", "mcrub": "", "deporub": "",
+    **{f"stroka{i}": "" for i in range(1, 11)},
+}
+
+
+def derive_contract_context(data, keys=None) -> dict:
+    # производные ключи шаблона; keys — пересчитать только те, что зависят от изменённых полей.
+    # data — любое отображение с .get (словарь анкеты или представление над слотами сессии)
+    if keys is None:
+        derivations = [derive for _, derive in CONTEXT_DERIVATIONS]
+    else:
+        derivations = []
+        for key in keys:
+            for derive in _DERIVATIONS_BY_KEY.get(key, ()):
+                if derive not in derivations:
+                    derivations.append(derive)
+    derived = {}
+    for derive in derivations:
+        derived.update(derive(data))
+    return derived
+
+
+def assemble_contract_context(data: dict, derived: dict) -> dict:
+    ctx = dict(CONTEXT_DEFAULTS)
+    for k, v in data.items():
+        ctx[k] = _context_value(v)
+    ctx.update(derived)
+    return ctx
+
+
+def build_contract_context(data: dict) -> dict:
+    return assemble_contract_context(data, derive_contract_context(data))
+
+
+def build_commission_context(data: dict) -> dict:
+    ctx = {k: (v if v not in (None, "") else "") for k, v in data.items()}
+    ctx.update(title_document_fields(data))
+    return ctx
+
+
+# в имени файла только буквы, цифры, «_», «.» и «-»: без разделителей пути и скрытых «.файлов»
+_FILENAME_UNSAFE_RE = re.compile(r"[^\w.-]+")
+
+
+def contract_filename(data: dict) -> str:
+    def surname(fullname: str | None) -> str:
+        if not fullname or fullname.strip() in ("", "-"):
+            return "unknown"
+        return _FILENAME_UNSAFE_RE.sub("_", fullname.split()[0]).strip("._") or "unknown"
+
+    return f"договор_{surname(data.get('ar_name'))}_{surname(data.get('naim_name'))}.docx"
+
+
+def pack_documents_zip(files: dict[str, bytes]) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, payload in files.items():
+            zf.writestr(name, payload)
+    return buf.getvalue()
+
+
+# проверка готовой анкеты целиком — без диалога (пакетная генерация, импорт)
+ADDRESS_PARTS = ("city", "street", "house", "building", "flat")
+OBJ_ADDRESS_COLUMNS = ("obj_street", "obj_house", "obj_building", "obj_flat")
+
+DOC_CHOICE = EnumValidator({
+    "egrn": "egrn", "егрн": "egrn", "выписка": "egrn",
+    "cert": "cert", "свидетельство": "cert",
+    "skip": "skip", "нет": "skip", "-": "skip",
+}, "ожидается egrn, cert или skip")
+MAKE_ACT = EnumValidator({
+    "да": "Да", "yes": "Да", "1": "Да", "true": "Да",
+    "нет": "Нет", "no": "Нет", "0": "Нет", "false": "Нет", "-": "Нет",
+}, "ожидается «Да» или «Нет»")
+ACT_DEFAULT_WORDS = ("+", "по умолчанию", "всё исправно", "все исправно", "default")
+
+
+class FieldError(ValueError):
+    pass
+
+
+def form_value(value) -> str:
+    # сырое значение из таблицы или JSON -> строка ответа: None -> "", даты -> дд.мм.гггг, 30000.0 -> "30000"
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.strftime("%d.%m.%Y")
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _split_list(raw: str, separators: str) -> list[str]:
+    # элементы списка одним ответом: каждый с новой строки (и для ФИО — через «;»)
+    for sep in separators[1:]:
+        raw = raw.replace(sep, separators[0])
+    return [item.strip() for item in raw.split(separators[0]) if item.strip() and item.strip() != "-"]
+
+
+def _text(key: str, formatter, form: dict) -> dict:
+    raw = form.get(key, "")
+    if raw in ("", "-"):
+        return {key: ""}
+    if formatter is None:
+        return {key: raw}
+    try:
+        value = formatter(raw)
+    except Exception:
+        value = None
+    if value is None:
+        raise FieldError(getattr(formatter, "message", "неверный формат"))
+    return {key: value}
+
+
+def _mapped(parse: Callable[[str], str | None], message: str) -> Callable[[str, object, dict], dict]:
+    def accept(key: str, formatter, form: dict) -> dict:
+        raw = form.get(key, "")
+        if raw in ("", "-"):
+            return {key: ""}
+        value = parse(raw)
+        if value is None:
+            raise FieldError(message)
+        return {key: value}
+    return accept
+
+
+def _enum(validator: EnumValidator) -> Callable[[str, object, dict], dict]:
+    # пустая ячейка — как «-»: документ права пропущен, акт не делается
+    def accept(key: str, formatter, form: dict) -> dict:
+        value = validator(form.get(key, "") or "-")
+        if value is None:
+            raise FieldError(validator.message)
+        return {key: value}
+    return accept
+
+
+def _act_condition(key: str, formatter, form: dict) -> dict:
+    raw = form.get(key, "")
+    return {key: ACT_CONDITION_ALL_OK if raw.lower() in ACT_DEFAULT_WORDS else raw}
+
+
+def _street_house(street: str, house: str) -> tuple[str, str]:
+    street = format_location(street)
+    if street is None:
+        raise FieldError("неверная улица")
+    if house in ("", "-"):
+        return street, "-"
+    ok = validate_street_and_house(street, house)
+    if not ok:
+        raise FieldError("неверный дом")
+    return street, ok[1]
+
+
+def _registration_address(key: str, formatter, form: dict) -> dict:
+    parts = {part: form.get(f"{key}_{part}", "") for part in ADDRESS_PARTS}
+    if not any(parts.values()):
+        # готовый адрес одной строкой — как есть
+        raw = form.get(key, "")
+        return {key: "" if raw == "-" else raw}
+    city = format_location(parts["city"])
+    if city is None:
+        raise FieldError("неверный город")
+    street, house = _street_house(parts["street"], parts["house"])
+    return {key: compose_registration_address(city, street, house, parts["building"], parts["flat"])}
+
+
+def _object_address(key: str, formatter, form: dict) -> dict:
+    street_raw, house_raw, building, flat = (form.get(column, "") for column in OBJ_ADDRESS_COLUMNS)
+    if not street_raw:
+        raw = form.get(key, "")
+        return {key: "" if raw == "-" else raw, **dict.fromkeys(OBJ_ADDRESS_COLUMNS, "")}
+    street, house = _street_house(street_raw, house_raw)
+    return compose_object_address(street, house, building, flat)
+
+
+def _tenants(key: str, formatter, form: dict) -> dict:
+    names = []
+    for raw in _split_list(form.get(key, ""), "\n;"):
+        fio = format_fio(raw)
+        if fio is None:
+            raise FieldError(f"неверное ФИО «{raw}»")
+        names.append(fio)
+    return {"obj_tenants_list": names}
+
+
+def _conditions(key: str, formatter, form: dict) -> dict:
+    items = _split_list(form.get(key, ""), "\n")
+    return {key: "\n".join(f"{i + 1}. {line}" for i, line in enumerate(items))}
+
+
+# те же типы полей, что в FIELD_KINDS чата, но для готового ответа целиком
+FORM_KINDS: dict[str, Callable[[str, object, dict], dict]] = {
+    "inline_buttons": _mapped(format_payer_choice, "ожидается «Наниматель» или «Наймодатель»"),
+    "inline_yes_no": _mapped(format_yes_no, "ожидается «Да» или «Нет»"),
+    "inline_default_condition": _act_condition,
+    "inline_doc_choice": _enum(DOC_CHOICE),
+    "inline_make_act": _enum(MAKE_ACT),
+    "multi_address_naim": _registration_address,
+    "multi_address_ar": _registration_address,
+    "multi_address_obj": _object_address,
+    "multi_conditions": _conditions,
+    "multi_tenants": _tenants,
+}
+
+
+def _accept_plan(fields: list[dict]) -> list[tuple[str, object, Callable[[str, object, dict], dict]]]:
+    plan = []
+    for field in fields:
+        formatter = field.get("formatter")
+        accept = _text if formatter is None or callable(formatter) else FORM_KINDS[formatter]
+        plan.append((field["key"], formatter, accept))
+    return plan
+
+
+def _validate(form: dict, plan, branches: dict, today: date) -> tuple[dict, list[tuple[str, str]]]:
+    form = {key: form_value(value) for key, value in form.items()}
+    data: dict = {}
+    errors: list[tuple[str, str]] = []
+    for key, formatter, accept in plan:
+        try:
+            data.update(accept(key, formatter, form))
+        except FieldError as e:
+            errors.append((key, str(e)))
+
+    failed = {key for key, _ in errors}
+    errors += [(key, message) for key, message in check_dates(data, today=today) if key not in failed]
+
+    # ветки: поля, которые чат не спросил бы, пустые и не проверяются
+    for switch, variants in branches.items():
+        skipped = variants.get(data.get(switch), ())
+        if skipped:
+            data.update(dict.fromkeys(skipped, ""))
+            errors = [(key, message) for key, message in errors if key not in skipped]
+    return data, errors
+
+
+def _form_spec(fields: list[dict] | None, branches: dict | None) -> tuple[list[dict], dict]:
+    # fields.py сам импортирует form_logic, поэтому анкету по умолчанию берём лениво
+    if fields is None or branches is None:
+        from fields import FIELDS, BRANCHES
+        fields = FIELDS if fields is None else fields
+        branches = BRANCHES if branches is None else branches
+    return fields, branches
+
+
+def validate_form(
+        form: dict[str, str],
+        fields: list[dict] | None = None,
+        branches: dict | None = None,
+        today: date | None = None,
+) -> tuple[dict, list[tuple[str, str]]]:
+    # готовая анкета целиком (ключи FIELDS) -> нормализованные ответы и ошибки по полям [(ключ, сообщение)];
+    # проверки те же, что в чате: форматтеры полей, doc_choice/make_act, даты и пропуск веток
+    fields, branches = _form_spec(fields, branches)
+    return _validate(form, _accept_plan(fields), branches, today or date.today())
+
+
+def validate_forms(
+        forms: Iterable[dict[str, str]],
+        fields: list[dict] | None = None,
+        branches: dict | None = None,
+        today: date | None = None,
+) -> list[tuple[dict, list[tuple[str, str]]]]:
+    # то же для пачки анкет: план проверки по полям собирается один раз
+    fields, branches = _form_spec(fields, branches)
+    plan = _accept_plan(fields)
+    today = today or date.today()
+    return [_validate(form, plan, branches, today) for form in forms]
@@ -1,13 +1,18 @@
 import os
+import abc
+import asyncio
+import enum
 import logging
-import re
+import time
 from datetime import datetime
+from types import MappingProxyType
+from typing import NamedTuple
 
-from docxtpl import DocxTemplate
 from telegram import (
     Update,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
+    InputMediaDocument,
     ReplyKeyboardMarkup,
 )
 from telegram.ext import (
@@ -17,6 +22,7 @@ from telegram.ext import (
     CallbackQueryHandler,
     ConversationHandler,
     ContextTypes,
+    TypeHandler,
     filters,
 )
 from telegram import Message
@@ -29,16 +35,45 @@ from form_logic import (
     format_location,
     to_upper,
     validate_street_and_house,
-    fill_template,
-    wrap_conditions_to_rows,
-    split_money_parts,
+    get_template_variables,
+    build_commission_context,
+    compose_registration_address,
+    compose_object_address,
+    check_dates,
+    ACT_CONDITION_ALL_OK,
+    DATE_RULE_KEYS,
+    contract_filename,
+    pack_documents_zip,
 )
 
-from fields import FIELDS
+from fields import FIELDS, BRANCHES
+from form_flow import FormFlow
+from render_pool import RenderPool, RenderCache, RenderQueueFull, DEFAULT_QUEUE_SIZE, DEFAULT_CACHE_MB
+from pdf_service import PdfService, PdfConversionError, DEFAULT_TIMEOUT as PDF_DEFAULT_TIMEOUT, DEFAULT_MAX_JOBS
+from sessions import SessionStore, DEFAULT_TTL_HOURS, DEFAULT_MAX_SESSIONS, PHASE_KEYS, TEMP_KEYS, BUF_KEYS
+from session_db import SessionDB, PersistentSessions
+from validators import validator_stats
+from webhook import WebhookConfig, run_webhook, DEFAULT_LISTEN, DEFAULT_PORT
+from update_processor import PerUserUpdateProcessor, DEFAULT_CONCURRENT_UPDATES
+from streets import StreetIndex, DEFAULT_STREETS_FILE
+from outbound import (
+    OutboundScheduler,
+    DEFAULT_CHAT_RATE,
+    DEFAULT_CHAT_BURST,
+    DEFAULT_GLOBAL_RATE,
+    DEFAULT_MAX_RETRIES,
+)
 
 
 ASK_FIELD = 1
-user_data: dict[int, dict] = {}
+FORM_FLOW = FormFlow(FIELDS, BRANCHES)
+sessions = SessionStore(contexts=True)
+persistence: PersistentSessions | None = None
+render_pool = RenderPool()
+pdf_service: PdfService | None = None
+update_processor: PerUserUpdateProcessor | None = None
+outbound: OutboundScheduler | None = None
+streets: StreetIndex | None = None
 
 DEFAULT_KEYBOARD = ReplyKeyboardMarkup(
     [["↩️ Назад", "-"], ["Скачать файл", "/start"]],
@@ -67,44 +102,170 @@ CB_SKIP_DOC = "skip_doc"
 CB_SKIP_ADDR = "skip_addr"
 CB_SKIP_COMM = "skip_comm"
 CB_GO_BACK = "go_back"
+# подсказка улицы: префикс + номер улицы в StreetIndex
+CB_STREET = "street_"
+CB_STREET_KEEP = "street_keep"
+CB_BUNDLE_OFF = "bundle_off"
+CB_BUNDLE_GROUP = "bundle_group"
+CB_BUNDLE_ZIP = "bundle_zip"
 
 CTX_STEP = "step"
 CTX_SKIP_INLINE_SENT = "skip_inline_sent"
 CTX_SHOW_KEYBOARD_ONCE = "show_keyboard_once"
 CTX_MAIN_SENT = "main_contract_sent"
+CTX_BUNDLE_MODE = "bundle_mode"
+CTX_WANT_PDF = "want_pdf"
+
+BUNDLE_GROUP = "group"
+BUNDLE_ZIP = "zip"
 
 TEMPLATE_PATH = "template 3.docx"
 TEMPLATE_OKAZ_PATH = "template_okaz.docx"
 TEMPLATE_SOB_PATH = "template_sob.docx"
-OUTPUT_DIR = "out"
-
-def wrap_to_lines(text: str, max_len: int, lines: int) -> list[str]:
-    words = re.findall(r'\S+', (text or "").strip())
-    out = [''] * lines
-    if not words:
-        return out
-
-    li = 0
-    cur = []
-    cur_len = 0
-
-    for w in words:
-        add = (1 if cur else 0) + len(w)
-        if cur_len + add <= max_len:
-            cur.append(w)
-            cur_len += add
-        else:
-            out[li] = ' '.join(cur)
-            li += 1
-            if li >= lines:
-                return out
-            cur = [w]
-            cur_len = len(w)
+COMM_TENANT_FILENAME = "договор_комиссия_наниматель.docx"
+COMM_SOB_FILENAME = "договор_комиссия_собственник.docx"
+
+BUSY_TEXT = "⚠️ Сейчас формируется слишком много документов. Повторите через минуту."
+EXPIRED_TEXT = "⌛ Сессия истекла, данные анкеты удалены. Начните заново."
 
-    if li < lines:
-        out[li] = ' '.join(cur)
 
-    return out
+class DownloadResult(enum.Enum):
+    # что делать с анкетой после «Скачать файл»
+    SESSION_DONE = "done"  # все документы отправлены, анкету можно сбрасывать
+    SESSION_KEEP = "keep"  # ошибка или дальше выбор комиссий — анкета ещё нужна
+
+
+class Screen(NamedTuple):
+    text: str
+    reply_markup: InlineKeyboardMarkup | None = None
+    parse_mode: str | None = None
+
+
+MENU_TEXT = (
+    "🤖 **BHBot | Автозаполнение договоров аренды**\n\n"
+    "Привет! Я помогу составить договор найма жилья.\n\n"
+    "✨ **Что умею:**\n"
+    "• Автоматическое форматирование данных\n"
+    "• Проверка корректности ввода\n"
+    "• Генерация договора, актов, комиссий"
+)
+HELP_TEXT = (
+    "📘 **Помощь и инструкция**\n\n"
+    "**Основные команды:**\n"
+    "/start — вернуться в главное меню\n"
+    "/help — показать эту справку\n"
+    "/bundle — получать все документы сразу\n"
+    "/pdf — присылать копию в PDF\n\n"
+    "**Как пользоваться ботом:**\n"
+    "1️⃣ Отвечайте на вопросы последовательно\n"
+    "2️⃣ Используйте «-» для пропуска любого поля\n"
+    "3️⃣ Кнопка «↩️ Назад» вернёт на предыдущий шаг\n"
+    "4️⃣ «Скачать файл» — досрочная генерация договора\n\n"
+    "✨ **Что умеет бот:**\n"
+    "• Автоматическое форматирование данных (ФИО, даты, суммы, адреса)\n"
+    "• Проверка корректности ввода\n"
+    "• Генерация договора аренды + акты + комиссии\n\n"
+    "💡 **Нашли баг или есть предложения?**\n"
+    "Пишите в канал: t.me/theeliseykamina"
+)
+ABOUT_TEXT = (
+    "👨‍💻 **О проекте**\n\n"
+    "Привет! Меня зовут **Елисей**, я Python-разработчик.\n\n"
+    "Этот бот — часть моего портфолио. Я создаю автоматизированные решения для бизнеса: "
+    "боты, веб-приложения, интеграции.\n\n"
+    "📢 **Мой Telegram-канал:**\n"
+    "t.me/theeliseykamina\n\n"
+    "Там я делюсь обновлениями проектов, кейсами и полезными инструментами для автоматизации бизнеса.\n\n"
+    "💼 **По вопросам сотрудничества пишите в канал!**"
+)
+INSTRUCTION_TEXT = (
+    "📘 **Как пользоваться ботом:**\n"
+    "1️⃣ Отвечайте на вопросы последовательно — бот сам соберёт договор.\n"
+    "2️⃣ Для пропуска любого пункта введите «-» или нажмите кнопку «Пропустить».\n"
+    "3️⃣ В любой момент можно написать «Скачать файл» — чтобы получить договор.\n"
+    "4️⃣ Всё сохраняется до конца, можно вернуться и продолжить.\n\n"
+    "✨ **Почему это удобно:**\n"
+    "• Бот автоматически форматирует все данные (ФИО, даты, суммы, адреса).\n"
+    "• Подставляет подчёркивания, если что-то пропущено.\n"
+    "• Проверяет корректность ввода — чтобы документ выглядел идеально.\n"
+    "• После заполнения можно сразу получить доп. договоры (комиссии и акт).\n\n"
+    "Начните с кнопки ниже 👇"
+)
+
+MENU_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton(text="помощь", callback_data=CB_HELP),
+        InlineKeyboardButton(text="о проекте", callback_data=CB_ABOUT),
+    ],
+    [
+        InlineKeyboardButton(text="новый договор аренды", callback_data=CB_START_RENT),
+    ]
+])
+BACK_TO_MENU_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("◀️ назад", callback_data=CB_BACK_TO_MENU)]
+])
+INSTRUCTION_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📘 Инструкция", callback_data=CB_INSTRUCTION),
+        InlineKeyboardButton("📄 Договор аренды", callback_data=CB_START_RENT),
+    ]
+])
+RESUME_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("🔁 Начать заново", callback_data=CB_CONFIRM_RESTART),
+        InlineKeyboardButton("➡️ Продолжить", callback_data=CB_CONTINUE),
+    ]
+])
+COMMISSION_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("Комиссия наниматель", callback_data=CB_DOC_COMM_TENANT),
+        InlineKeyboardButton("Комиссия соб", callback_data=CB_DOC_COMM_SOB),
+    ],
+    [InlineKeyboardButton("Пропустить", callback_data=CB_SKIP_COMM)]
+])
+
+
+def _bundle_keyboard(mode: str | None) -> InlineKeyboardMarkup:
+    def mark(value: str | None, title: str) -> str:
+        return f"✅ {title}" if mode == value else title
+
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(mark(None, "Только договор"), callback_data=CB_BUNDLE_OFF)],
+        [InlineKeyboardButton(mark(BUNDLE_GROUP, "Все документы"), callback_data=CB_BUNDLE_GROUP)],
+        [InlineKeyboardButton(mark(BUNDLE_ZIP, "Все документы (ZIP)"), callback_data=CB_BUNDLE_ZIP)],
+    ])
+
+
+BUNDLE_KEYBOARDS = MappingProxyType({mode: _bundle_keyboard(mode) for mode in (None, BUNDLE_GROUP, BUNDLE_ZIP)})
+
+# статические экраны собираются один раз; клавиатуры PTB неизменяемы, поэтому их можно переиспользовать
+SCREENS = MappingProxyType({
+    "menu": Screen(MENU_TEXT, MENU_KEYBOARD, "Markdown"),
+    "help": Screen(HELP_TEXT, BACK_TO_MENU_KEYBOARD, "Markdown"),
+    "about": Screen(ABOUT_TEXT, BACK_TO_MENU_KEYBOARD, "Markdown"),
+    "instruction": Screen(INSTRUCTION_TEXT, INSTRUCTION_KEYBOARD),
+    "resume": Screen("Обнаружена незавершённая сессия. Что делаем?", RESUME_KEYBOARD),
+    "commissions": Screen("Заполнить ли данные в дополнительных договорах?", COMMISSION_KEYBOARD),
+})
+
+# кнопки меню, которые просто показывают экран вместо текущего сообщения
+CALLBACK_SCREENS = MappingProxyType({
+    CB_HELP: "help",
+    CB_ABOUT: "about",
+    CB_BACK_TO_MENU: "menu",
+    CB_INSTRUCTION: "instruction",
+})
+
+
+async def reply_screen(target: Message, name: str) -> None:
+    screen = SCREENS[name]
+    await target.reply_text(screen.text, reply_markup=screen.reply_markup, parse_mode=screen.parse_mode)
+
+
+async def edit_screen(query, name: str) -> None:
+    screen = SCREENS[name]
+    await query.edit_message_text(screen.text, reply_markup=screen.reply_markup, parse_mode=screen.parse_mode)
+
 
 def get_token() -> str:
     load_dotenv()
@@ -114,9 +275,110 @@ def get_token() -> str:
     return token
 
 
-def ensure_outdir() -> None:
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
+def build_render_pool() -> RenderPool:
+    workers = int(os.getenv("RENDER_WORKERS", "0") or 0)
+    max_queue = int(os.getenv("RENDER_QUEUE_SIZE", str(DEFAULT_QUEUE_SIZE)) or DEFAULT_QUEUE_SIZE)
+    cache_mb = int(os.getenv("RENDER_CACHE_MB", str(DEFAULT_CACHE_MB)) or 0)
+    cache = RenderCache(max_bytes=cache_mb * 1024 * 1024) if cache_mb > 0 else None
+    return RenderPool(workers=workers or None, max_queue=max_queue, cache=cache)
+
+
+def build_session_store() -> SessionStore:
+    ttl_hours = float(os.getenv("SESSION_TTL_HOURS", str(DEFAULT_TTL_HOURS)) or 0)
+    max_sessions = int(os.getenv("SESSION_MAX", str(DEFAULT_MAX_SESSIONS)) or DEFAULT_MAX_SESSIONS)
+    # изменения отслеживаются, только если подключено сохранение в SQLite (build_persistence)
+    return SessionStore(ttl=ttl_hours * 3600, max_sessions=max_sessions, contexts=True)
+
+
+def build_persistence(store: SessionStore) -> PersistentSessions | None:
+    path = os.getenv("SESSION_DB", "sessions.db").strip()
+    if not path:
+        return None
+    return PersistentSessions(store, SessionDB(path, ttl=store.ttl))
+
+
+def build_pdf_service() -> PdfService | None:
+    workers = int(os.getenv("PDF_WORKERS", "0") or 0)
+    if workers <= 0:
+        return None
+    try:
+        return PdfService(
+            workers=workers,
+            timeout=float(os.getenv("PDF_TIMEOUT", str(PDF_DEFAULT_TIMEOUT)) or PDF_DEFAULT_TIMEOUT),
+            max_jobs_per_worker=int(os.getenv("PDF_MAX_JOBS", str(DEFAULT_MAX_JOBS)) or DEFAULT_MAX_JOBS),
+        )
+    except PdfConversionError as e:
+        logging.warning(f"PDF output disabled: {e}")
+        return None
+
+
+def build_update_processor() -> PerUserUpdateProcessor:
+    limit = int(os.getenv("UPDATE_CONCURRENCY", str(DEFAULT_CONCURRENT_UPDATES)) or DEFAULT_CONCURRENT_UPDATES)
+    return PerUserUpdateProcessor(max_concurrent_updates=max(limit, 1))
+
+
+def build_outbound_scheduler() -> OutboundScheduler:
+    return OutboundScheduler(
+        chat_rate=float(os.getenv("OUTBOUND_CHAT_RATE", str(DEFAULT_CHAT_RATE)) or DEFAULT_CHAT_RATE),
+        chat_burst=float(os.getenv("OUTBOUND_CHAT_BURST", str(DEFAULT_CHAT_BURST)) or DEFAULT_CHAT_BURST),
+        global_rate=float(os.getenv("OUTBOUND_GLOBAL_RATE", str(DEFAULT_GLOBAL_RATE)) or DEFAULT_GLOBAL_RATE),
+        max_retries=int(os.getenv("OUTBOUND_MAX_RETRIES", str(DEFAULT_MAX_RETRIES)) or 0),
+    )
+
+
+def build_street_index() -> StreetIndex | None:
+    path = os.getenv("STREETS_FILE", DEFAULT_STREETS_FILE).strip()
+    if not path or not os.path.exists(path):
+        return None
+    index = StreetIndex.load(path)
+    logging.info(f"Loaded {len(index)} streets for autocomplete from {path}")
+    return index
+
+
+def build_webhook_config() -> WebhookConfig | None:
+    url = os.getenv("WEBHOOK_URL", "").strip()
+    if not url:
+        return None
+    return WebhookConfig(
+        url=url,
+        listen=os.getenv("WEBHOOK_LISTEN", DEFAULT_LISTEN).strip() or DEFAULT_LISTEN,
+        port=int(os.getenv("WEBHOOK_PORT", str(DEFAULT_PORT)) or DEFAULT_PORT),
+        path=os.getenv("WEBHOOK_PATH", "").strip() or None,
+        secret=os.getenv("WEBHOOK_SECRET", "").strip() or None,
+        cert=os.getenv("WEBHOOK_CERT", "").strip() or None,
+        key=os.getenv("WEBHOOK_KEY", "").strip() or None,
+    )
+
+
+def readiness() -> tuple[bool, dict]:
+    # не готовы принимать апдейты, если очередь рендеринга заполнена
+    saturated = render_pool.in_flight >= render_pool.workers + render_pool.max_queue
+    details = {"render_in_flight": render_pool.in_flight, "sessions": len(sessions)}
+    if update_processor is not None:
+        details["updates_in_flight"] = update_processor.current_concurrent_updates
+    return not saturated, details
+
+
+def pdf_filename(filename: str) -> str:
+    return os.path.splitext(filename)[0] + ".pdf"
+
+
+async def send_pdf_copy(message: Message, context: ContextTypes.DEFAULT_TYPE, doc_bytes: bytes, filename: str) -> None:
+    if pdf_service is None or not context.user_data.get(CTX_WANT_PDF):
+        return
+    try:
+        pdf_bytes = await pdf_service.convert(doc_bytes)
+        await message.chat.send_document(document=pdf_bytes, filename=pdf_filename(filename))
+    except PdfConversionError as e:
+        logging.warning(f"PDF conversion of {filename} failed: {e}")
+        await message.chat.send_message("⚠️ Не удалось сделать PDF, отправлен только DOCX.")
+
+
+async def render_document(message: Message, ctx: dict, template_path: str) -> bytes:
+    async def queued(position: int) -> None:
+        await message.reply_text(f"⏳ Документ в очереди, позиция {position}. Подождите немного...")
+
+    return await render_pool.render(ctx, template_path, on_queued=queued)
 
 
 def check_templates_on_startup() -> None:
@@ -131,6 +393,7 @@ def check_templates_on_startup() -> None:
     print("=" * 50)
 
     all_ok = True
+    field_keys = [f["key"] for f in FIELDS]
 
     for name, path in templates:
         if not os.path.exists(path):
@@ -140,9 +403,12 @@ def check_templates_on_startup() -> None:
             continue
 
         try:
-            doc = DocxTemplate(path)
-            vars_in_template = doc.get_undeclared_template_variables()
-            print(f"✅ {name}: {len(vars_in_template)} переменных")
+            vars_in_template = get_template_variables(path)
+            used = [k for k in field_keys if k in vars_in_template]
+            missing = [k for k in field_keys if k not in vars_in_template]
+            print(f"✅ {name}: {len(vars_in_template)} переменных, полей из FIELDS: {len(used)}/{len(field_keys)}")
+            if missing:
+                print(f"   Не используются: {', '.join(missing)}")
         except Exception as e:
             print(f"❌ ERROR: Не удалось прочитать {name}")
             print(f"   Ошибка: {e}")
@@ -168,69 +434,52 @@ def reset_to_start(context: ContextTypes.DEFAULT_TYPE, uid: int) -> None:
     context.user_data[CTX_STEP] = None
     context.user_data[CTX_SKIP_INLINE_SENT] = False
     context.user_data.pop(CTX_MAIN_SENT, None)
-    user_data.pop(uid, None)
+    sessions.drop(uid)
 
 async def send_start_menu(target: Message) -> None:
-    text = (
-        "🤖 **BHBot | Автозаполнение договоров аренды**\n\n"
-        "Привет! Я помогу составить договор найма жилья.\n\n"
-        "✨ **Что умею:**\n"
-        "• Автоматическое форматирование данных\n"
-        "• Проверка корректности ввода\n"
-        "• Генерация договора, актов, комиссий"
-    )
-    keyboard = InlineKeyboardMarkup([
-        [
-            InlineKeyboardButton(text="помощь", callback_data=CB_HELP),
-            InlineKeyboardButton(text="о проекте", callback_data=CB_ABOUT),
-        ],
-        [
-            InlineKeyboardButton(text="новый договор аренды", callback_data=CB_START_RENT),
-        ]
-    ])
-    await target.reply_text(text, reply_markup=keyboard, parse_mode="Markdown")
-
+    await reply_screen(target, "menu")
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     step = context.user_data.get(CTX_STEP)
     if step is not None:
-        keyboard = InlineKeyboardMarkup([
-            [
-                InlineKeyboardButton("🔁 Начать заново", callback_data=CB_CONFIRM_RESTART),
-                InlineKeyboardButton("➡️ Продолжить", callback_data=CB_CONTINUE),
-            ]
-        ])
-        await update.effective_message.reply_text(
-            "Обнаружена незавершённая сессия. Что делаем?",
-            reply_markup=keyboard
-        )
+        await reply_screen(update.effective_message, "resume")
         return
 
     await send_start_menu(update.effective_message)
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    text = (
-        "📘 **Помощь и инструкция**\n\n"
-        "**Основные команды:**\n"
-        "/start — вернуться в главное меню\n"
-        "/help — показать эту справку\n\n"
-        "**Как пользоваться ботом:**\n"
-        "1️⃣ Отвечайте на вопросы последовательно\n"
-        "2️⃣ Используйте «-» для пропуска любого поля\n"
-        "3️⃣ Кнопка «↩️ Назад» вернёт на предыдущий шаг\n"
-        "4️⃣ «Скачать файл» — досрочная генерация договора\n\n"
-        "✨ **Что умеет бот:**\n"
-        "• Автоматическое форматирование данных (ФИО, даты, суммы, адреса)\n"
-        "• Проверка корректности ввода\n"
-        "• Генерация договора аренды + акты + комиссии\n\n"
-        "💡 **Нашли баг или есть предложения?**\n"
-        "Пишите в канал: t.me/theeliseykamina"
+    await reply_screen(update.message, "help")
+
+
+async def bundle_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text(
+        "📦 Какие документы формировать после заполнения?\n"
+        "«Все документы» — договор и обе комиссии одним сообщением.",
+        reply_markup=BUNDLE_KEYBOARDS[context.user_data.get(CTX_BUNDLE_MODE)]
     )
-    keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton("◀️ Назад в меню", callback_data=CB_BACK_TO_MENU)]
-    ])
-    await update.message.reply_text(text, reply_markup=keyboard, parse_mode="Markdown")
+
+
+async def bundle_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    modes = {CB_BUNDLE_OFF: None, CB_BUNDLE_GROUP: BUNDLE_GROUP, CB_BUNDLE_ZIP: BUNDLE_ZIP}
+    mode = modes.get(query.data)
+    context.user_data[CTX_BUNDLE_MODE] = mode
+    await query.edit_message_reply_markup(reply_markup=BUNDLE_KEYBOARDS[mode])
+
+
+async def pdf_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if pdf_service is None:
+        await update.message.reply_text("PDF недоступен на этом сервере.")
+        return
+    want = not context.user_data.get(CTX_WANT_PDF)
+    context.user_data[CTX_WANT_PDF] = want
+    if want:
+        await update.message.reply_text("📄 Вместе с DOCX буду присылать PDF. Повторите /pdf, чтобы выключить.")
+    else:
+        await update.message.reply_text("📄 PDF выключен, присылаю только DOCX.")
+
 
 async def go_back(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     uid = uid_from(update)
@@ -250,124 +499,7 @@ async def go_back(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         )
         return ASK_FIELD
 
-    current_field = FIELDS[step]
-    key = current_field["key"]
-    formatter = current_field.get("formatter")
-
-    if formatter in ("multi_address_naim", "multi_address_ar"):
-        phase_key = f"{key}_phase"
-        temp_key = f"{key}_temp"
-        phase = context.user_data.get(phase_key)
-
-        if phase is None:
-            await go_back_to_previous_field(update, context, uid, step, key)
-            return ASK_FIELD
-
-        phases = ["city", "street", "house", "building", "flat"]
-        current_idx = phases.index(phase) if phase in phases else 0
-
-        if current_idx == 0:
-            context.user_data.pop(phase_key, None)
-            context.user_data.pop(temp_key, None)
-            user_data.get(uid, {}).pop(key, None)
-            await go_back_to_previous_field(update, context, uid, step, key)
-            return ASK_FIELD
-        else:
-            prev_phase = phases[current_idx - 1]
-            context.user_data[phase_key] = prev_phase
-            temp = context.user_data.get(temp_key, {})
-            temp.pop(phase, None)
-
-            prompts = {
-                "city": "Город регистрации (пример: Москва):",
-                "street": "Улица регистрации (пример: Барочная):",
-                "house": "Дом (например: 10, 10А, 10/2):",
-                "building": "Корпус (если нет — напишите «-»):",
-                "flat": "Квартира (Пример: 777):"
-            }
-            await update.effective_message.reply_text(
-                prompts.get(prev_phase, "Введите данные:"),
-                reply_markup=DEFAULT_KEYBOARD
-            )
-            return ASK_FIELD
-
-    if formatter == "multi_address_obj":
-        phase_key = f"{key}_phase"
-        temp_key = f"{key}_temp"
-        phase = context.user_data.get(phase_key)
-
-        if phase is None:
-            await go_back_to_previous_field(update, context, uid, step, key)
-            return ASK_FIELD
-
-        phases = ["street", "house", "building", "flat"]
-        current_idx = phases.index(phase) if phase in phases else 0
-
-        if current_idx == 0:
-            context.user_data.pop(phase_key, None)
-            context.user_data.pop(temp_key, None)
-            ud = user_data.get(uid, {})
-            for k in ["obj_address", "obj_street", "obj_house", "obj_building", "obj_flat"]:
-                ud.pop(k, None)
-            await go_back_to_previous_field(update, context, uid, step, key)
-            return ASK_FIELD
-        else:
-            prev_phase = phases[current_idx - 1]
-            context.user_data[phase_key] = prev_phase
-            temp = context.user_data.get(temp_key, {})
-            temp.pop(phase, None)
-
-            prompts = {
-                "street": "Улица (пример: Тверская):",
-                "house": "Дом (например: 10, 10к2, 10/2):",
-                "building": "Корпус (если нет — напишите «-»):",
-                "flat": "Квартира (число или «-»):"
-            }
-            await update.effective_message.reply_text(
-                prompts.get(prev_phase, "Введите данные:"),
-                reply_markup=DEFAULT_KEYBOARD
-            )
-            return ASK_FIELD
-
-    if formatter == "multi_tenants":
-        buf_key = f"{key}_buf"
-        buf = context.user_data.get(buf_key, [])
-
-        if not buf:
-            user_data.get(uid, {}).pop("obj_tenants_list", None)
-            context.user_data.pop(buf_key, None)
-            await go_back_to_previous_field(update, context, uid, step, key)
-            return ASK_FIELD
-        else:
-            buf.pop()
-            context.user_data[buf_key] = buf
-            await update.effective_message.reply_text(
-                f"↩️ Последнее ФИО удалено. Осталось: {len(buf)}\n"
-                "Введите следующее ФИО или «-» для завершения.",
-                reply_markup=DEFAULT_KEYBOARD
-            )
-            return ASK_FIELD
-
-    if formatter == "multi_conditions":
-        buf_key = f"{key}_buf"
-        buf = context.user_data.get(buf_key, [])
-
-        if not buf:
-            user_data.get(uid, {}).pop(key, None)
-            context.user_data.pop(buf_key, None)
-            await go_back_to_previous_field(update, context, uid, step, key)
-            return ASK_FIELD
-        else:
-            buf.pop()
-            context.user_data[buf_key] = buf
-            await update.effective_message.reply_text(
-                f"↩️ Последний пункт удалён. Осталось: {len(buf)}\n"
-                "Введите следующий пункт или «-» для завершения.",
-                reply_markup=DEFAULT_KEYBOARD
-            )
-            return ASK_FIELD
-
-    await go_back_to_previous_field(update, context, uid, step, key)
+    await FIELD_HANDLERS[step].back(update, context, uid, step, FIELDS[step])
     return ASK_FIELD
 
 
@@ -378,30 +510,12 @@ async def go_back_to_previous_field(
         current_step: int,
         current_key: str
 ) -> None:
-    user_data.get(uid, {}).pop(current_key, None)
-    prev_step = current_step - 1
-
-    choice = user_data.get(uid, {}).get("doc_choice")
-    skip_fields = set()
-
-    if choice == "skip":
-        skip_fields.update(["obj_kadastr", "cert_series", "cert_number"])
-    elif choice == "egrn":
-        skip_fields.update(["cert_series", "cert_number"])
-    elif choice == "cert":
-        skip_fields.add("obj_kadastr")
-
-    while prev_step >= 0:
-        prev_key = FIELDS[prev_step]["key"]
-        if prev_key not in skip_fields:
-            break
-        prev_step -= 1
-
-    if prev_step < 0:
-        prev_step = 0
+    sessions.discard(uid, current_key)
+    variant = FORM_FLOW.variant(lambda switch: sessions.get(uid, switch))
+    prev_step = FORM_FLOW.prev_step(variant, current_step)
 
     prev_key = FIELDS[prev_step]["key"]
-    user_data.get(uid, {}).pop(prev_key, None)
+    sessions.discard(uid, prev_key)
 
     context.user_data[CTX_SKIP_INLINE_SENT] = False
     context.user_data[CTX_STEP] = prev_step
@@ -415,105 +529,13 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     data = query.data
     await query.answer()
 
-    if data == CB_HELP:
-        text = (
-            "📘 **Помощь и инструкция**\n\n"
-            "**Основные команды:**\n"
-            "/start — вернуться в главное меню\n"
-            "/help — показать эту справку\n\n"
-            "**Как пользоваться ботом:**\n"
-            "1️⃣ Отвечайте на вопросы последовательно\n"
-            "2️⃣ Используйте «-» для пропуска любого поля\n"
-            "3️⃣ Кнопка «↩️ Назад» вернёт на предыдущий шаг\n"
-            "4️⃣ «Скачать файл» — досрочная генерация договора\n\n"
-            "✨ **Что умеет бот:**\n"
-            "• Автоматическое форматирование данных (ФИО, даты, суммы, адреса)\n"
-            "• Проверка корректности ввода\n"
-            "• Генерация договора аренды + акты + комиссии\n\n"
-            "💡 **Нашли баг или есть предложения?**\n"
-            "Пишите в канал: t.me/theeliseykamina"
-        )
-        await query.edit_message_text(
-            text,
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("◀️ назад", callback_data=CB_BACK_TO_MENU)]
-            ]),
-            parse_mode="Markdown"
-        )
-        return
-
-    if data == CB_ABOUT:
-        text = (
-            "👨‍💻 **О проекте**\n\n"
-            "Привет! Меня зовут **Елисей**, я Python-разработчик.\n\n"
-            "Этот бот — часть моего портфолио. Я создаю автоматизированные решения для бизнеса: "
-            "боты, веб-приложения, интеграции.\n\n"
-            "📢 **Мой Telegram-канал:**\n"
-            "t.me/theeliseykamina\n\n"
-            "Там я делюсь обновлениями проектов, кейсами и полезными инструментами для автоматизации бизнеса.\n\n"
-            "💼 **По вопросам сотрудничества пишите в канал!**"
-        )
-        await query.edit_message_text(
-            text,
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("◀️ назад", callback_data=CB_BACK_TO_MENU)]
-            ]),
-            parse_mode="Markdown"
-        )
-        return
-
-    if data == CB_BACK_TO_MENU:
-        text = (
-            "🤖 **BHBot | Автозаполнение договоров аренды**\n\n"
-            "Привет! Я помогу составить договор найма жилья.\n\n"
-            "✨ **Что умею:**\n"
-            "• Автоматическое форматирование данных\n"
-            "• Проверка корректности ввода\n"
-            "• Генерация договора, актов, комиссий"
-        )
-        await query.edit_message_text(
-            text,
-            reply_markup=InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton(text="помощь", callback_data=CB_HELP),
-                    InlineKeyboardButton(text="о проекте", callback_data=CB_ABOUT),
-                ],
-                [
-                    InlineKeyboardButton(text="новый договор аренды", callback_data=CB_START_RENT),
-                ]
-            ]),
-            parse_mode="Markdown"
-        )
-        return
-
-    if data == CB_INSTRUCTION:
-        text = (
-            "📘 **Как пользоваться ботом:**\n"
-            "1️⃣ Отвечайте на вопросы последовательно — бот сам соберёт договор.\n"
-            "2️⃣ Для пропуска любого пункта введите «-» или нажмите кнопку «Пропустить».\n"
-            "3️⃣ В любой момент можно написать «Скачать файл» — чтобы получить договор.\n"
-            "4️⃣ Всё сохраняется до конца, можно вернуться и продолжить.\n\n"
-            "✨ **Почему это удобно:**\n"
-            "• Бот автоматически форматирует все данные (ФИО, даты, суммы, адреса).\n"
-            "• Подставляет подчёркивания, если что-то пропущено.\n"
-            "• Проверяет корректность ввода — чтобы документ выглядел идеально.\n"
-            "• После заполнения можно сразу получить доп. договоры (комиссии и акт).\n\n"
-            "Начните с кнопки ниже 👇"
-        )
-        await query.edit_message_text(
-            text,
-            reply_markup=InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("📘 Инструкция", callback_data=CB_INSTRUCTION),
-                    InlineKeyboardButton("📄 Договор аренды", callback_data=CB_START_RENT),
-                ]
-            ])
-        )
+    if data in CALLBACK_SCREENS:
+        await edit_screen(query, CALLBACK_SCREENS[data])
         return
 
     uid = uid_from(update)
     if data == CB_START_RENT:
-        user_data[uid] = {}
+        sessions.reset(uid)
         context.user_data[CTX_STEP] = 0
         context.user_data[CTX_SKIP_INLINE_SENT] = False
         context.user_data[CTX_SHOW_KEYBOARD_ONCE] = True
@@ -522,7 +544,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return ASK_FIELD
 
     if data == CB_CONFIRM_RESTART:
-        user_data[uid] = {}
+        sessions.reset(uid)
         context.user_data[CTX_STEP] = 0
         context.user_data[CTX_SKIP_INLINE_SENT] = False
         context.user_data[CTX_SHOW_KEYBOARD_ONCE] = True
@@ -538,41 +560,23 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     if data == CB_DOC_COMM_TENANT:
         uid = uid_from(update)
-        data_map = user_data.get(uid, {})
-        ctx = {k: (v if v not in (None, "") else "") for k, v in data_map.items()}
-
-        doc_choice = data_map.get("doc_choice")
-        if doc_choice == "egrn":
-            ctx["name_of_document"] = "Выписка из ЕГРН,"
-            ctx["document_value"] = data_map.get("obj_kadastr", "")
-        elif doc_choice == "cert":
-            ctx["name_of_document"] = "Свидетельство о государственной регистрации права,"
-            series = data_map.get("cert_series", "")
-            number = data_map.get("cert_number", "")
-            ctx["document_value"] = f"серия {series} № {number}".strip()
-        else:
-            ctx["name_of_document"] = ""
-            ctx["document_value"] = ""
+        ctx = build_commission_context(sessions.snapshot(uid))
 
-        ensure_outdir()
-        filename = "договор_комиссия_наниматель.docx"
-        out_path = os.path.join(OUTPUT_DIR, filename)
+        filename = COMM_TENANT_FILENAME
 
         try:
-            fill_template(ctx, TEMPLATE_OKAZ_PATH, out_path)
-            with open(out_path, "rb") as fh:
-                await query.message.chat.send_document(document=fh, filename=filename)
+            doc_bytes = await render_document(query.message, ctx, TEMPLATE_OKAZ_PATH)
+            await query.message.chat.send_document(document=doc_bytes, filename=filename)
+            await send_pdf_copy(query.message, context, doc_bytes, filename)
             await query.edit_message_text("✅ Отправлен договор: комиссия от нанимателя.")
-        except Exception as e:
+        except RenderQueueFull:
+            logging.warning(f"Render queue full, commission tenant doc for user {uid} rejected")
+            await query.message.reply_text(BUSY_TEXT)
+            return
+        except Exception:
             logging.error(f"Failed to generate commission tenant doc for user {uid}", exc_info=True)
             await query.edit_message_text("⚠️ Ошибка при формировании документа. Сообщите разработчику.")
             return ConversationHandler.END
-        finally:
-            try:
-                if os.path.exists(out_path):
-                    os.remove(out_path)
-            except OSError:
-                pass
 
         reset_to_start(context, uid)
         await send_start_menu(query.message)
@@ -580,41 +584,23 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     if data == CB_DOC_COMM_SOB:
         uid = uid_from(update)
-        data_map = user_data.get(uid, {})
-        ctx = {k: (v if v not in (None, "") else "") for k, v in data_map.items()}
-
-        doc_choice = data_map.get("doc_choice")
-        if doc_choice == "egrn":
-            ctx["name_of_document"] = "Выписка из ЕГРН,"
-            ctx["document_value"] = data_map.get("obj_kadastr", "")
-        elif doc_choice == "cert":
-            ctx["name_of_document"] = "Свидетельство о государственной регистрации права,"
-            series = data_map.get("cert_series", "")
-            number = data_map.get("cert_number", "")
-            ctx["document_value"] = f"серия {series} № {number}".strip()
-        else:
-            ctx["name_of_document"] = ""
-            ctx["document_value"] = ""
+        ctx = build_commission_context(sessions.snapshot(uid))
 
-        ensure_outdir()
-        filename = "договор_комиссия_собственник.docx"
-        out_path = os.path.join(OUTPUT_DIR, filename)
+        filename = COMM_SOB_FILENAME
 
         try:
-            fill_template(ctx, TEMPLATE_SOB_PATH, out_path)
-            with open(out_path, "rb") as fh:
-                await query.message.chat.send_document(document=fh, filename=filename)
+            doc_bytes = await render_document(query.message, ctx, TEMPLATE_SOB_PATH)
+            await query.message.chat.send_document(document=doc_bytes, filename=filename)
+            await send_pdf_copy(query.message, context, doc_bytes, filename)
             await query.edit_message_text("✅ Отправлен договор: комиссия от наймодателя.")
-        except Exception as e:
+        except RenderQueueFull:
+            logging.warning(f"Render queue full, commission landlord doc for user {uid} rejected")
+            await query.message.reply_text(BUSY_TEXT)
+            return
+        except Exception:
             logging.error(f"Failed to generate commission landlord doc for user {uid}", exc_info=True)
             await query.edit_message_text("⚠️ Ошибка при формировании документа. Сообщите разработчику.")
             return ConversationHandler.END
-        finally:
-            try:
-                if os.path.exists(out_path):
-                    os.remove(out_path)
-            except OSError:
-                pass
 
         reset_to_start(context, uid)
         await send_start_menu(query.message)
@@ -627,514 +613,454 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await send_start_menu(query.message)
         return ConversationHandler.END
 
-async def ask_next_field(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    step = context.user_data.get(CTX_STEP, 0)
-    if step >= len(FIELDS):
-        if context.user_data.get(CTX_MAIN_SENT):
-            return
-        context.user_data[CTX_MAIN_SENT] = True
-        await send_preview(update, context)
-        return
-
-    uid = uid_from(update)
-    current = FIELDS[step]
-    key = current["key"]
-    choice = user_data.get(uid, {}).get("doc_choice")
-
-    if choice == "skip":
-        skip_fields = ("obj_kadastr", "cert_series", "cert_number")
-        if key in skip_fields:
-            user_data.setdefault(uid, {})[key] = ""
-            context.user_data[CTX_STEP] = step + 1
-            await ask_next_field(update, context)
-            return
+async def advance(update: Update, context: ContextTypes.DEFAULT_TYPE, step: int) -> None:
+    context.user_data[CTX_STEP] = step + 1
+    context.user_data[CTX_SKIP_INLINE_SENT] = False
+    await ask_next_field(update, context)
 
-    if choice == "egrn" and key in ("cert_series", "cert_number"):
-        user_data.setdefault(uid, {})[key] = ""
-        context.user_data[CTX_STEP] = step + 1
-        await ask_next_field(update, context)
-        return
 
-    if choice == "cert" and key == "obj_kadastr":
-        user_data.setdefault(uid, {})[key] = ""
-        context.user_data[CTX_STEP] = step + 1
-        await ask_next_field(update, context)
-        return
+class FieldHandler:
+    # поведение одного типа поля: задать вопрос, принять ответ, шаг «Назад»
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
 
-    field = FIELDS[step]
-    question = field["question"]
-    formatter = field.get("formatter")
-    show_reply = context.user_data.pop(CTX_SHOW_KEYBOARD_ONCE, False)
-    reply_kwargs = {"reply_markup": DEFAULT_KEYBOARD} if show_reply else {}
+    def record(self, elapsed: float) -> None:
+        self.calls += 1
+        self.seconds += elapsed
 
-    if formatter == "inline_buttons":
-        if not context.user_data.get(CTX_SKIP_INLINE_SENT):
-            kb = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("Наниматель", callback_data=CB_PAYER_TENANT),
-                    InlineKeyboardButton("Наймодатель", callback_data=CB_PAYER_LANDLORD),
-                ],
-                [InlineKeyboardButton("↩️ Назад", callback_data=CB_GO_BACK)]
-            ])
-            context.user_data[CTX_SKIP_INLINE_SENT] = True
-            await update.effective_message.reply_text(question, reply_markup=kb)
-        return
+    def stats(self) -> dict:
+        return {"calls": self.calls, "mean_ms": (self.seconds / self.calls * 1e3) if self.calls else 0.0}
 
-    if formatter == "inline_yes_no":
-        if not context.user_data.get(CTX_SKIP_INLINE_SENT):
-            kb = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("Разрешено", callback_data=CB_YES),
-                    InlineKeyboardButton("Запрещено", callback_data=CB_NO),
-                ],
-                [InlineKeyboardButton("↩️ Назад", callback_data=CB_GO_BACK)]
-            ])
-            context.user_data[CTX_SKIP_INLINE_SENT] = True
-            await update.effective_message.reply_text(question, reply_markup=kb)
-        return
+    async def ask(self, update: Update, context: ContextTypes.DEFAULT_TYPE, field: dict, reply_kwargs: dict) -> None:
+        await update.effective_message.reply_text(field["question"], **reply_kwargs)
 
-    if formatter == "inline_default_condition":
-        if not context.user_data.get(CTX_SKIP_INLINE_SENT):
-            kb = InlineKeyboardMarkup([
-                [InlineKeyboardButton("🟢 Всё исправно…", callback_data=CB_DEFAULT_CONDITION)],
-                [InlineKeyboardButton("↩️ Назад", callback_data=CB_GO_BACK)]
-            ])
-            context.user_data[CTX_SKIP_INLINE_SENT] = True
-            await update.effective_message.reply_text(
-                question + "\nМожно ввести текст вручную или нажать кнопку.",
-                reply_markup=kb
-            )
-            return
-        return
+    async def accept(
+            self,
+            update: Update,
+            context: ContextTypes.DEFAULT_TYPE,
+            uid: int,
+            step: int,
+            field: dict,
+            cb_data: str | None,
+            text: str | None,
+    ) -> None:
+        pass
 
-    if formatter in ("multi_address_naim", "multi_address_ar"):
-        if not context.user_data.get(CTX_SKIP_INLINE_SENT):
-            kb = InlineKeyboardMarkup([
-                [InlineKeyboardButton("Пропустить адрес", callback_data=CB_SKIP_ADDR)],
-                [InlineKeyboardButton("↩️ Назад", callback_data=CB_GO_BACK)]
-            ])
-            context.user_data[CTX_SKIP_INLINE_SENT] = True
-            await update.effective_message.reply_text(
-                question + " (пример: Москва)",
-                reply_markup=kb
-            )
-        return
+    async def back(self, update: Update, context: ContextTypes.DEFAULT_TYPE, uid: int, step: int, field: dict) -> None:
+        await go_back_to_previous_field(update, context, uid, step, field["key"])
 
-    if formatter == "multi_address_obj":
-        if not context.user_data.get(CTX_SKIP_INLINE_SENT):
-            kb = InlineKeyboardMarkup([
-                [InlineKeyboardButton("Пропустить адрес", callback_data=CB_SKIP_ADDR)],
-                [InlineKeyboardButton("↩️ Назад", callback_data=CB_GO_BACK)]
-            ])
-            context.user_data[CTX_SKIP_INLINE_SENT] = True
-            await update.effective_message.reply_text(question, reply_markup=kb)
-        return
 
-    if formatter == "inline_doc_choice":
-        if not context.user_data.get(CTX_SKIP_INLINE_SENT):
-            kb = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("ЕГРН", callback_data=CB_DOC_EGRN),
-                    InlineKeyboardButton("Свидетельство", callback_data=CB_DOC_CERT),
-                ],
-                [InlineKeyboardButton("Пропустить", callback_data=CB_SKIP_DOC)],
-                [InlineKeyboardButton("↩️ Назад", callback_data=CB_GO_BACK)]
-            ])
-            context.user_data[CTX_SKIP_INLINE_SENT] = True
-            await update.effective_message.reply_text(question, reply_markup=kb)
-        return
+class TextField(FieldHandler):
+    notes = {
+        "naim_name": "📍 Теперь регистрация нанимателя.",
+        "ar_name": "📍 Теперь регистрация наймодателя.",
+    }
 
-    if formatter == "inline_make_act":
-        if not context.user_data.get(CTX_SKIP_INLINE_SENT):
-            kb = InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("Да", callback_data=CB_YES),
-                    InlineKeyboardButton("Нет", callback_data=CB_NO),
-                ],
-                [InlineKeyboardButton("↩️ Назад", callback_data=CB_GO_BACK)]
-            ])
-            context.user_data[CTX_SKIP_INLINE_SENT] = True
-            await update.effective_message.reply_text(question, reply_markup=kb)
+    async def accept(self, update, context, uid, step, field, cb_data, text) -> None:
+        if cb_data is not None:
             return
-        return
+        msg = update.effective_message
+        key = field["key"]
+        formatter = field.get("formatter")
 
-    await update.effective_message.reply_text(question, **reply_kwargs)
+        if text == "-":
+            sessions.set(uid, key, "")
+        else:
+            value = None
+            if callable(formatter):
+                try:
+                    value = formatter(text)
+                except Exception:
+                    value = None
+            elif formatter is None:
+                value = text
 
+            if value is None:
+                hint = getattr(formatter, "message", "Неверный формат.")
+                await msg.reply_text(f"❌ {hint} Попробуйте снова.", reply_markup=DEFAULT_KEYBOARD)
+                return
 
+            if key in DATE_RULE_KEYS:
+                dates = {k: sessions.get(uid, k) for k in DATE_RULE_KEYS}
+                dates[key] = value
+                problems = check_dates(dates, only=key)
+                if problems:
+                    await msg.reply_text(f"❌ {problems[0][1]} Попробуйте снова.", reply_markup=DEFAULT_KEYBOARD)
+                    return
 
-async def on_user_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    msg = update.effective_message
-    uid = uid_from(update)
-    step = context.user_data.get(CTX_STEP, 0)
+            sessions.set(uid, key, value)
 
-    if step is None:
-        await send_start_menu(msg)
-        return ASK_FIELD
+        if key in self.notes:
+            await msg.reply_text(self.notes[key])
+        await advance(update, context, step)
 
-    is_cb = update.callback_query is not None
 
-    if is_cb and update.callback_query.data == CB_GO_BACK:
-        await update.callback_query.answer()
-        await go_back(update, context)
-        return ASK_FIELD
+class InlineField(FieldHandler):
+    def __init__(self, name: str, rows: list[list[InlineKeyboardButton]], suffix: str = ""):
+        super().__init__(name)
+        self.keyboard = InlineKeyboardMarkup([*rows, [InlineKeyboardButton("↩️ Назад", callback_data=CB_GO_BACK)]])
+        self.suffix = suffix
 
-    if msg and msg.text and msg.text.strip() == "↩️ Назад":
-        await go_back(update, context)
-        return ASK_FIELD
+    async def ask(self, update, context, field, reply_kwargs) -> None:
+        if context.user_data.get(CTX_SKIP_INLINE_SENT):
+            return
+        context.user_data[CTX_SKIP_INLINE_SENT] = True
+        await update.effective_message.reply_text(field["question"] + self.suffix, reply_markup=self.keyboard)
 
-    if msg and msg.text and msg.text.strip().lower() == "скачать файл":
-        await msg.reply_text("⏳ Формирую документ...")
-        await download_file(update, context)
-        reset_to_start(context, uid)
-        await send_start_menu(msg)
-        return ConversationHandler.END
 
-    if step >= len(FIELDS):
-        return ASK_FIELD
+class ChoiceField(InlineField):
+    def __init__(self, name: str, choices: dict[str, str]):
+        super().__init__(name, [[InlineKeyboardButton(value, callback_data=cb) for cb, value in choices.items()]])
+        self.choices = choices
 
-    field = FIELDS[step]
-    key = field["key"]
-    formatter = field.get("formatter")
+    async def accept(self, update, context, uid, step, field, cb_data, text) -> None:
+        if cb_data is None:
+            if text == "-":
+                sessions.set(uid, field["key"], "")
+                await update.effective_message.reply_text("Пропущено.")
+                await advance(update, context, step)
+            return
+        value = self.choices.get(cb_data)
+        if value is None:
+            return
+        sessions.set(uid, field["key"], value)
+        await update.callback_query.edit_message_text(f"✅ Вы выбрали: {value}")
+        await advance(update, context, step)
 
-    cb_data = update.callback_query.data if is_cb else None
-    text = None if is_cb else (msg.text or "").strip()
 
-    if formatter == "inline_buttons":
-        if not is_cb and text == "-":
-            user_data.setdefault(uid, {})[key] = ""
-            context.user_data[CTX_STEP] = step + 1
-            context.user_data[CTX_SKIP_INLINE_SENT] = False
-            await msg.reply_text("Пропущено.")
-            await ask_next_field(update, context)
-            return ASK_FIELD
-
-        if not is_cb:
-            return ASK_FIELD
-        if cb_data == CB_PAYER_TENANT:
-            value = "Наниматель"
-        elif cb_data == CB_PAYER_LANDLORD:
-            value = "Наймодатель"
-        else:
-            return ASK_FIELD
-        user_data.setdefault(uid, {})[key] = value
-        context.user_data[CTX_STEP] = step + 1
-        context.user_data[CTX_SKIP_INLINE_SENT] = False
-        await update.callback_query.edit_message_text(f"✅ Вы выбрали: {value}")
-        await ask_next_field(update, context)
-        return ASK_FIELD
+class DefaultConditionField(InlineField):
+    default_text = ACT_CONDITION_ALL_OK
 
-    if formatter == "inline_yes_no":
-        if not is_cb and text == "-":
-            user_data.setdefault(uid, {})[key] = ""
-            context.user_data[CTX_STEP] = step + 1
-            context.user_data[CTX_SKIP_INLINE_SENT] = False
-            await msg.reply_text("Пропущено.")
-            await ask_next_field(update, context)
-            return ASK_FIELD
-
-        if not is_cb:
-            return ASK_FIELD
-        if cb_data == CB_YES:
-            value = "Разрешено"
-        elif cb_data == CB_NO:
-            value = "Запрещено"
-        else:
-            return ASK_FIELD
-        user_data.setdefault(uid, {})[key] = value
-        context.user_data[CTX_STEP] = step + 1
-        context.user_data[CTX_SKIP_INLINE_SENT] = False
-        await update.callback_query.edit_message_text(f"✅ Вы выбрали: {value}")
-        await ask_next_field(update, context)
-        return ASK_FIELD
+    def __init__(self, name: str):
+        super().__init__(
+            name,
+            [[InlineKeyboardButton("🟢 Всё исправно…", callback_data=CB_DEFAULT_CONDITION)]],
+            suffix="\nМожно ввести текст вручную или нажать кнопку.",
+        )
 
-    if formatter == "inline_default_condition":
-        if is_cb and cb_data == CB_DEFAULT_CONDITION:
-            user_data.setdefault(uid, {})[key] = (
-                "Всё оборудование, мебель, техника и системы исправны и находятся в хорошем и рабочем состоянии."
-            )
-            context.user_data[CTX_STEP] = step + 1
-            context.user_data[CTX_SKIP_INLINE_SENT] = False
+    async def accept(self, update, context, uid, step, field, cb_data, text) -> None:
+        if cb_data == CB_DEFAULT_CONDITION:
+            sessions.set(uid, field["key"], self.default_text)
             await update.callback_query.edit_message_text("✅ Состояние заполнено по шаблону.")
-            await ask_next_field(update, context)
-            return ASK_FIELD
-
-        if not is_cb and text:
-            user_data.setdefault(uid, {})[key] = text
-            context.user_data[CTX_STEP] = step + 1
-            context.user_data[CTX_SKIP_INLINE_SENT] = False
-            await ask_next_field(update, context)
-            return ASK_FIELD
-        return ASK_FIELD
+            await advance(update, context, step)
+            return
+        if cb_data is None and text:
+            sessions.set(uid, field["key"], text)
+            await advance(update, context, step)
 
-    if formatter == "inline_doc_choice":
-        if not is_cb and text == "-":
-            user_data.setdefault(uid, {})["doc_choice"] = "skip"
-            context.user_data[CTX_STEP] = step + 1
-            context.user_data[CTX_SKIP_INLINE_SENT] = False
-            await msg.reply_text("Пропущено.")
-            await ask_next_field(update, context)
-            return ASK_FIELD
-
-        if not is_cb:
-            return ASK_FIELD
-
-        if cb_data == CB_DOC_EGRN:
-            user_data.setdefault(uid, {})["doc_choice"] = "egrn"
-            picked = "ЕГРН"
-        elif cb_data == CB_DOC_CERT:
-            user_data.setdefault(uid, {})["doc_choice"] = "cert"
-            picked = "Свидетельство"
-        elif cb_data == CB_SKIP_DOC:
-            user_data.setdefault(uid, {})["doc_choice"] = "skip"
-            context.user_data[CTX_STEP] = step + 1
-            context.user_data[CTX_SKIP_INLINE_SENT] = False
-            await update.callback_query.edit_message_text("Документ права пропущен.")
-            await ask_next_field(update, context)
-            return ASK_FIELD
-        else:
-            return ASK_FIELD
 
-        context.user_data[CTX_STEP] = step + 1
-        context.user_data[CTX_SKIP_INLINE_SENT] = False
-        await update.callback_query.edit_message_text(f"✅ Документ: {picked}")
-        await ask_next_field(update, context)
-        return ASK_FIELD
+class DocChoiceField(InlineField):
+    # callback -> (значение doc_choice, ответ)
+    choices = {
+        CB_DOC_EGRN: ("egrn", "✅ Документ: ЕГРН"),
+        CB_DOC_CERT: ("cert", "✅ Документ: Свидетельство"),
+        CB_SKIP_DOC: ("skip", "Документ права пропущен."),
+    }
 
-    if formatter == "inline_make_act":
-        if not is_cb:
-            return ASK_FIELD
+    def __init__(self, name: str):
+        super().__init__(name, [
+            [
+                InlineKeyboardButton("ЕГРН", callback_data=CB_DOC_EGRN),
+                InlineKeyboardButton("Свидетельство", callback_data=CB_DOC_CERT),
+            ],
+            [InlineKeyboardButton("Пропустить", callback_data=CB_SKIP_DOC)],
+        ])
+
+    async def accept(self, update, context, uid, step, field, cb_data, text) -> None:
+        if cb_data is None:
+            if text == "-":
+                sessions.set(uid, "doc_choice", "skip")
+                await update.effective_message.reply_text("Пропущено.")
+                await advance(update, context, step)
+            return
+        if cb_data not in self.choices:
+            return
+        value, reply = self.choices[cb_data]
+        sessions.set(uid, "doc_choice", value)
+        await update.callback_query.edit_message_text(reply)
+        await advance(update, context, step)
 
+
+class MakeActField(InlineField):
+    def __init__(self, name: str):
+        super().__init__(name, [[
+            InlineKeyboardButton("Да", callback_data=CB_YES),
+            InlineKeyboardButton("Нет", callback_data=CB_NO),
+        ]])
+
+    async def accept(self, update, context, uid, step, field, cb_data, text) -> None:
         if cb_data == CB_YES:
-            user_data.setdefault(uid, {})[key] = "Да"
-            context.user_data[CTX_STEP] = step + 1
-            context.user_data[CTX_SKIP_INLINE_SENT] = False
+            sessions.set(uid, field["key"], "Да")
             await update.callback_query.edit_message_text("✅ Акт приёма-передачи будет оформлен.")
-            await ask_next_field(update, context)
-            return ASK_FIELD
+            await advance(update, context, step)
+            return
 
         if cb_data == CB_NO:
-            user_data.setdefault(uid, {})[key] = "Нет"
+            # поля акта пропускаются веткой act_make=Нет в BRANCHES
+            sessions.set(uid, field["key"], "Нет")
+            await update.callback_query.edit_message_text("🚫 Акт приёма-передачи не оформляется.")
+            await advance(update, context, step)
 
-            act_fields = ["act_date", "act_condition", "act_keys", "act_electricity", "act_hot_water", "act_cold_water"]
-            for act_field in act_fields:
-                user_data.setdefault(uid, {})[act_field] = ""
 
-            context.user_data[CTX_STEP] = len(FIELDS)
-            context.user_data[CTX_SKIP_INLINE_SENT] = False
-            await update.callback_query.edit_message_text("🚫 Акт приёма-передачи не оформляется.")
-            if not context.user_data.get(CTX_MAIN_SENT):
-                context.user_data[CTX_MAIN_SENT] = True
-                await send_preview(update, context)
+class AddressField(InlineField, abc.ABC):
+    # адрес по частям: фаза и введённые части лежат в context.user_data
+    phases: tuple[str, ...] = ()
+    prompts: dict[str, str] = {}
+    errors: dict[str, str] = {}
 
-            return ASK_FIELD
+    def __init__(self, name: str, suffix: str = ""):
+        super().__init__(name, [[InlineKeyboardButton("Пропустить адрес", callback_data=CB_SKIP_ADDR)]], suffix)
 
-        return ASK_FIELD
+    def session_keys(self, key: str) -> tuple[str, ...]:
+        return (key,)
 
-    if formatter in ("multi_address_naim", "multi_address_ar"):
-        phase_key = f"{key}_phase"
-        temp_key = f"{key}_temp"
-        phase = context.user_data.get(phase_key, "city")
-        temp = context.user_data.setdefault(temp_key, {})
+    @abc.abstractmethod
+    def compose(self, key: str, temp: dict) -> dict:
+        ...
 
-        if is_cb and cb_data == CB_SKIP_ADDR:
-            user_data.setdefault(uid, {})[key] = ""
+    async def accept(self, update, context, uid, step, field, cb_data, text) -> None:
+        key = field["key"]
+        phase_key = PHASE_KEYS[key]
+        temp_key = TEMP_KEYS[key]
+        msg = update.effective_message
+
+        if cb_data == CB_SKIP_ADDR:
+            sessions.update(uid, dict.fromkeys(self.session_keys(key), ""))
             context.user_data.pop(phase_key, None)
             context.user_data.pop(temp_key, None)
-            context.user_data[CTX_STEP] = step + 1
-            context.user_data[CTX_SKIP_INLINE_SENT] = False
-            await update.callback_query.edit_message_text("Адрес пропущен.")
-            await ask_next_field(update, context)
-            return ASK_FIELD
+            await update.callback_query.edit_message_text(self.skipped_text)
+            await advance(update, context, step)
+            return
 
-        if is_cb:
-            return ASK_FIELD
+        if cb_data is not None:
+            return
 
         if not text:
             await msg.reply_text("Введите текст. Для пропуска используйте «-».")
-            return ASK_FIELD
-
-        if phase == "city":
-            temp["city"] = format_location(text)
-            if temp["city"] is None:
-                await msg.reply_text("Неверный формат города. Пример: Москва")
-                return ASK_FIELD
-            context.user_data[phase_key] = "street"
-            await msg.reply_text("Улица регистрации (пример: Барочная):")
-            return ASK_FIELD
-
-        if phase == "street":
-            temp["street"] = format_location(text)
-            if temp["street"] is None:
-                await msg.reply_text("Неверный формат улицы. Пример: Тверская")
-                return ASK_FIELD
-            context.user_data[phase_key] = "house"
-            await msg.reply_text("Дом (например: 10, 10А, 10/2):")
-            return ASK_FIELD
-
-        if phase == "house":
-            if text.strip() == "-":
-                temp["house"] = "-"
-                context.user_data[phase_key] = "building"
-                await msg.reply_text("Корпус (если нет — напишите «-»):")
-                return ASK_FIELD
-            ok = validate_street_and_house(temp["street"], text)
-            if not ok:
-                await msg.reply_text("Неверный дом. Пример: 10, 10к2, 10/2")
-                return ASK_FIELD
-            _, house_norm = ok
-            temp["house"] = house_norm
-            context.user_data[phase_key] = "building"
-            await msg.reply_text("Корпус (если нет — напишите «-»):")
-            return ASK_FIELD
-
-        if phase == "building":
-            temp["building"] = text.strip()
-            context.user_data[phase_key] = "flat"
-            await msg.reply_text("Квартира (Пример: 777):")
-            return ASK_FIELD
-
-        if phase == "flat":
-            temp["flat"] = text.strip()
-
-            parts = [f"г. {temp['city']}", f"ул. {temp['street']}", f"д. {temp['house']}"]
-            if temp.get("building") and temp["building"] != "-":
-                parts.append(f"к. {temp['building']}")
-            if temp.get("flat") and temp["flat"] != "-":
-                parts.append(f"кв. {temp['flat']}")
-            full_addr = ", ".join(parts) + ","
-
-            user_data.setdefault(uid, {})[key] = full_addr
-            context.user_data.pop(phase_key, None)
-            context.user_data.pop(temp_key, None)
-
-            context.user_data[CTX_STEP] = step + 1
-            context.user_data[CTX_SKIP_INLINE_SENT] = False
-            await ask_next_field(update, context)
-            return ASK_FIELD
-
-    if formatter == "multi_address_obj":
-        phase_key = f"{key}_phase"
-        temp_key = f"{key}_temp"
-
-        if is_cb and cb_data == CB_SKIP_ADDR:
-            ud = user_data.setdefault(uid, {})
-            ud["obj_address"] = ""
-            ud["obj_street"] = ""
-            ud["obj_house"] = ""
-            ud["obj_building"] = ""
-            ud["obj_flat"] = ""
-            context.user_data.pop(phase_key, None)
-            context.user_data.pop(temp_key, None)
-            context.user_data[CTX_STEP] = step + 1
-            context.user_data[CTX_SKIP_INLINE_SENT] = False
-            await update.callback_query.edit_message_text("Адрес объекта пропущен.")
-            await ask_next_field(update, context)
-            return ASK_FIELD
+            return
 
-        phase = context.user_data.get(phase_key, "street")
+        phase = context.user_data.get(phase_key, self.phases[0])
         temp = context.user_data.setdefault(temp_key, {})
 
-        if is_cb or not text:
-            await msg.reply_text("Введите текст. Для пропуска используйте «-».")
-            return ASK_FIELD
-
-        if phase == "street":
-            temp["street"] = format_location(text)
-            if temp["street"] is None:
-                await msg.reply_text("Неверная улица. Пример: Тверская")
-                return ASK_FIELD
-            context.user_data[phase_key] = "house"
-            await msg.reply_text("Дом (например: 10, 10к2, 10/2):")
-            return ASK_FIELD
-
-        if phase == "house":
+        if phase in ("city", "street"):
+            temp[phase] = format_location(text)
+            if temp[phase] is None:
+                await msg.reply_text(self.errors[phase])
+                return
+        elif phase == "house":
             if text.strip() == "-":
                 temp["house"] = "-"
             else:
                 ok = validate_street_and_house(temp["street"], text)
                 if not ok:
                     await msg.reply_text("Неверный дом. Пример: 10, 10к2, 10/2")
-                    return ASK_FIELD
+                    return
                 _, house_norm = ok
                 temp["house"] = house_norm
-            context.user_data[phase_key] = "building"
-            await msg.reply_text("Корпус (если нет — напишите «-»):")
-            return ASK_FIELD
-
-        if phase == "building":
+        elif phase == "building":
             temp["building"] = text.strip()
-            context.user_data[phase_key] = "flat"
-            await msg.reply_text("Квартира (число или «-»):")
-            return ASK_FIELD
-
-        if phase == "flat":
+        elif phase == "flat":
             temp["flat"] = text.strip()
+            sessions.update(uid, self.compose(key, temp))
+            context.user_data.pop(phase_key, None)
+            context.user_data.pop(temp_key, None)
+            await advance(update, context, step)
+            return
+        else:
+            return
 
-            parts = [
-                "г. Санкт-Петербург",
-                f"ул. {temp['street']}",
-            ]
-            if temp.get("house") and temp["house"] != "-":
-                parts.append(f"д. {temp['house']}")
-            if temp.get("building") and temp["building"] != "-":
-                parts.append(f"к. {temp['building']}")
-            if temp.get("flat") and temp["flat"] != "-":
-                parts.append(f"кв. {temp['flat']}")
-
-            full_addr = ", ".join(parts) + ","
-
-            ud = user_data.setdefault(uid, {})
-            ud["obj_address"] = full_addr
-            ud["obj_street"] = temp.get("street", "")
-            ud["obj_house"] = temp.get("house", "")
-            ud["obj_building"] = (temp.get("building") if temp.get("building") != "-" else "")
-            ud["obj_flat"] = (temp.get("flat") if temp.get("flat") != "-" else "")
+        await self.next_phase(context, msg, phase_key, phase)
+
+    async def next_phase(self, context, msg: Message, phase_key: str, phase: str) -> None:
+        next_phase = self.phases[self.phases.index(phase) + 1]
+        context.user_data[phase_key] = next_phase
+        await msg.reply_text(self.prompts[next_phase])
+
+    async def back(self, update, context, uid, step, field) -> None:
+        key = field["key"]
+        phase_key = PHASE_KEYS[key]
+        temp_key = TEMP_KEYS[key]
+        phase = context.user_data.get(phase_key)
+
+        if phase is None:
+            await go_back_to_previous_field(update, context, uid, step, key)
+            return
 
+        current_idx = self.phases.index(phase) if phase in self.phases else 0
+        if current_idx == 0:
             context.user_data.pop(phase_key, None)
             context.user_data.pop(temp_key, None)
+            sessions.discard(uid, *self.session_keys(key))
+            await go_back_to_previous_field(update, context, uid, step, key)
+            return
+
+        prev_phase = self.phases[current_idx - 1]
+        context.user_data[phase_key] = prev_phase
+        context.user_data.get(temp_key, {}).pop(phase, None)
+        await update.effective_message.reply_text(
+            self.prompts.get(prev_phase, "Введите данные:"),
+            reply_markup=DEFAULT_KEYBOARD
+        )
 
-            context.user_data[CTX_STEP] = step + 1
-            context.user_data[CTX_SKIP_INLINE_SENT] = False
-            await ask_next_field(update, context)
-            return ASK_FIELD
 
-    if formatter == "multi_conditions":
-        buf_key = f"{key}_buf"
+class RegistrationAddressField(AddressField):
+    phases = ("city", "street", "house", "building", "flat")
+    prompts = {
+        "city": "Город регистрации (пример: Москва):",
+        "street": "Улица регистрации (пример: Барочная):",
+        "house": "Дом (например: 10, 10А, 10/2):",
+        "building": "Корпус (если нет — напишите «-»):",
+        "flat": "Квартира (Пример: 777):",
+    }
+    errors = {
+        "city": "Неверный формат города. Пример: Москва",
+        "street": "Неверный формат улицы. Пример: Тверская",
+    }
+    skipped_text = "Адрес пропущен."
+
+    def compose(self, key: str, temp: dict) -> dict:
+        return {key: compose_registration_address(
+            temp["city"], temp["street"], temp["house"], temp.get("building"), temp.get("flat")
+        )}
+
+
+class ObjectAddressField(AddressField):
+    phases = ("street", "house", "building", "flat")
+    prompts = {
+        "street": "Улица (пример: Тверская):",
+        "house": "Дом (например: 10, 10к2, 10/2):",
+        "building": "Корпус (если нет — напишите «-»):",
+        "flat": "Квартира (число или «-»):",
+    }
+    errors = {
+        "street": "Неверная улица. Пример: Тверская",
+    }
+    skipped_text = "Адрес объекта пропущен."
+
+    def session_keys(self, key: str) -> tuple[str, ...]:
+        return "obj_address", "obj_street", "obj_house", "obj_building", "obj_flat"
+
+    async def accept(self, update, context, uid, step, field, cb_data, text) -> None:
+        key = field["key"]
+        phase_key = PHASE_KEYS[key]
+        if streets is None or context.user_data.get(phase_key, self.phases[0]) != "street":
+            await super().accept(update, context, uid, step, field, cb_data, text)
+            return
+        if cb_data is not None and cb_data.startswith(CB_STREET):
+            await self.pick_street(update, context, key, cb_data)
+            return
+        if cb_data is not None or not text or text == "-":
+            await super().accept(update, context, uid, step, field, cb_data, text)
+            return
+
+        # улица из списка — сразу в каноническом написании, иначе предлагаем похожие кнопками
+        name = streets.exact(text)
+        if name is not None:
+            context.user_data.setdefault(TEMP_KEYS[key], {})["street"] = name
+            await self.next_phase(context, update.effective_message, phase_key, "street")
+            return
+        matches = streets.lookup(text)
+        if not matches:
+            await super().accept(update, context, uid, step, field, cb_data, text)
+            return
+        context.user_data.setdefault(TEMP_KEYS[key], {})["street_typed"] = text
+        rows = [[InlineKeyboardButton(name, callback_data=f"{CB_STREET}{i}")] for i, name in matches]
+        rows.append([InlineKeyboardButton(f"✏️ Оставить «{format_location(text)}»", callback_data=CB_STREET_KEEP)])
+        rows.append([InlineKeyboardButton("↩️ Назад", callback_data=CB_GO_BACK)])
+        await update.effective_message.reply_text(
+            "🔎 Выберите улицу из списка или оставьте как ввели:",
+            reply_markup=InlineKeyboardMarkup(rows),
+        )
+
+    async def pick_street(self, update, context, key: str, cb_data: str) -> None:
+        temp = context.user_data.setdefault(TEMP_KEYS[key], {})
+        if cb_data == CB_STREET_KEEP:
+            name = format_location(temp.get("street_typed", ""))
+        else:
+            name = streets.name(int(cb_data[len(CB_STREET):]))
+        if name is None:
+            return
+        temp.pop("street_typed", None)
+        temp["street"] = name
+        await update.callback_query.edit_message_text(f"✅ Улица: {name}")
+        await self.next_phase(context, update.effective_message, PHASE_KEYS[key], "street")
+
+    def compose(self, key: str, temp: dict) -> dict:
+        return compose_object_address(temp["street"], temp.get("house"), temp.get("building"), temp.get("flat"))
+
+
+class ListField(FieldHandler):
+    # несколько ответов подряд в буфер context.user_data, «-» завершает ввод
+    removed_text = ""
+
+    def session_key(self, key: str) -> str:
+        return key
+
+    async def back(self, update, context, uid, step, field) -> None:
+        key = field["key"]
+        buf_key = BUF_KEYS[key]
         buf = context.user_data.get(buf_key, [])
-        if not is_cb and text == "-":
-            if not buf:
-                user_data.setdefault(uid, {})[key] = ""
-            else:
-                numbered = "\n".join(f"{i + 1}. {line}" for i, line in enumerate(buf))
-                user_data.setdefault(uid, {})[key] = numbered
+
+        if not buf:
+            sessions.discard(uid, self.session_key(key))
             context.user_data.pop(buf_key, None)
-            context.user_data[CTX_STEP] = step + 1
-            context.user_data[CTX_SKIP_INLINE_SENT] = False
-            await ask_next_field(update, context)
-            return ASK_FIELD
-        if not is_cb and text:
+            await go_back_to_previous_field(update, context, uid, step, key)
+            return
+
+        buf.pop()
+        context.user_data[buf_key] = buf
+        await update.effective_message.reply_text(
+            self.removed_text.format(count=len(buf)),
+            reply_markup=DEFAULT_KEYBOARD
+        )
+
+
+class ConditionsField(ListField):
+    removed_text = "↩️ Последний пункт удалён. Осталось: {count}\nВведите следующий пункт или «-» для завершения."
+
+    async def accept(self, update, context, uid, step, field, cb_data, text) -> None:
+        if cb_data is not None:
+            return
+        key = field["key"]
+        buf_key = BUF_KEYS[key]
+        buf = context.user_data.get(buf_key, [])
+
+        if text == "-":
+            numbered = "\n".join(f"{i + 1}. {line}" for i, line in enumerate(buf))
+            sessions.set(uid, key, numbered)
+            context.user_data.pop(buf_key, None)
+            await advance(update, context, step)
+            return
+        if text:
             buf.append(text)
             context.user_data[buf_key] = buf
-            await msg.reply_text(
+            await update.effective_message.reply_text(
                 "Добавлено. Следующий пункт или «-» для завершения:",
                 reply_markup=DEFAULT_KEYBOARD
             )
-            return ASK_FIELD
-        return ASK_FIELD
 
-    if formatter == "multi_tenants":
-        buf_key = f"{key}_buf"
+
+class TenantsField(ListField):
+    removed_text = "↩️ Последнее ФИО удалено. Осталось: {count}\nВведите следующее ФИО или «-» для завершения."
+
+    def session_key(self, key: str) -> str:
+        return "obj_tenants_list"
+
+    async def accept(self, update, context, uid, step, field, cb_data, text) -> None:
+        if cb_data is not None:
+            return
+        key = field["key"]
+        buf_key = BUF_KEYS[key]
         buf = context.user_data.get(buf_key, [])
-        if is_cb:
-            return ASK_FIELD
+        msg = update.effective_message
 
         if text == "-":
-            user_data.setdefault(uid, {})["obj_tenants_list"] = buf if buf else []
+            sessions.set(uid, "obj_tenants_list", buf)
             context.user_data.pop(buf_key, None)
-            context.user_data[CTX_STEP] = step + 1
-            context.user_data[CTX_SKIP_INLINE_SENT] = False
-            await ask_next_field(update, context)
-            return ASK_FIELD
+            await advance(update, context, step)
+            return
 
         fio = format_fio(text)
         if fio is None:
@@ -1142,7 +1068,7 @@ async def on_user_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
                 "❌ Неверный формат ФИО. Пример: Иванов Иван Иванович",
                 reply_markup=DEFAULT_KEYBOARD
             )
-            return ASK_FIELD
+            return
 
         buf.append(fio)
         context.user_data[buf_key] = buf
@@ -1150,40 +1076,118 @@ async def on_user_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
             "Добавлено. Введите следующее ФИО или «-», если больше никого.",
             reply_markup=DEFAULT_KEYBOARD
         )
-        return ASK_FIELD
 
-    if not is_cb:
-        if text == "-":
-            user_data.setdefault(uid, {})[key] = ""
+
+TEXT_FIELD = TextField("text")
+FIELD_KINDS: dict[str, FieldHandler] = {
+    "inline_buttons": ChoiceField("inline_buttons", {CB_PAYER_TENANT: "Наниматель", CB_PAYER_LANDLORD: "Наймодатель"}),
+    "inline_yes_no": ChoiceField("inline_yes_no", {CB_YES: "Разрешено", CB_NO: "Запрещено"}),
+    "inline_default_condition": DefaultConditionField("inline_default_condition"),
+    "inline_doc_choice": DocChoiceField("inline_doc_choice"),
+    "inline_make_act": MakeActField("inline_make_act"),
+    "multi_address_naim": RegistrationAddressField("multi_address_naim", suffix=" (пример: Москва)"),
+    "multi_address_ar": RegistrationAddressField("multi_address_ar", suffix=" (пример: Москва)"),
+    "multi_address_obj": ObjectAddressField("multi_address_obj"),
+    "multi_conditions": ConditionsField("multi_conditions"),
+    "multi_tenants": TenantsField("multi_tenants"),
+}
+
+
+def compile_field_handlers(fields: list[dict]) -> list[FieldHandler]:
+    handlers = []
+    for field in fields:
+        formatter = field.get("formatter")
+        if formatter is None or callable(formatter):
+            handlers.append(TEXT_FIELD)
+        elif formatter in FIELD_KINDS:
+            handlers.append(FIELD_KINDS[formatter])
         else:
-            value = None
-            if callable(formatter):
-                try:
-                    value = formatter(text)
-                except Exception:
-                    value = None
-            elif formatter in (None,):
-                value = text
+            raise ValueError(f"Неизвестный тип поля {formatter!r} у {field['key']}")
+    return handlers
 
-            if value is None:
-                await msg.reply_text("❌ Неверный формат. Попробуйте снова.", reply_markup=DEFAULT_KEYBOARD)
-                return ASK_FIELD
 
-            user_data.setdefault(uid, {})[key] = value
+# обработчик для каждого шага FIELDS
+FIELD_HANDLERS = compile_field_handlers(FIELDS)
 
-        if key == "naim_name":
-            await msg.reply_text("📍 Теперь регистрация нанимателя.")
-        if key == "ar_name":
-            await msg.reply_text("📍 Теперь регистрация наймодателя.")
 
-        context.user_data[CTX_STEP] = step + 1
-        context.user_data[CTX_SKIP_INLINE_SENT] = False
-        await ask_next_field(update, context)
+def field_handler_stats() -> dict:
+    return {h.name: h.stats() for h in [TEXT_FIELD, *FIELD_KINDS.values()] if h.calls}
+
+
+async def ask_next_field(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    step = context.user_data.get(CTX_STEP, 0)
+    if step < len(FIELDS):
+        uid = uid_from(update)
+        variant = FORM_FLOW.variant(lambda switch: sessions.get(uid, switch))
+        landing, skipped = FORM_FLOW.resolve(variant, step)
+        if skipped:
+            sessions.update(uid, dict.fromkeys(skipped, ""))
+            context.user_data[CTX_STEP] = step = landing
+
+    if step >= len(FIELDS):
+        if context.user_data.get(CTX_MAIN_SENT):
+            return
+        context.user_data[CTX_MAIN_SENT] = True
+        await send_preview(update, context)
+        return
+
+    current = FIELDS[step]
+    show_reply = context.user_data.pop(CTX_SHOW_KEYBOARD_ONCE, False)
+    reply_kwargs = {"reply_markup": DEFAULT_KEYBOARD} if show_reply else {}
+    await FIELD_HANDLERS[step].ask(update, context, current, reply_kwargs)
+
+
+async def on_user_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    msg = update.effective_message
+    uid = uid_from(update)
+    step = context.user_data.get(CTX_STEP, 0)
+
+    if step is None:
+        await send_start_menu(msg)
+        return ASK_FIELD
+
+    if CTX_STEP in context.user_data and uid not in sessions:
+        # анкета вытеснена из хранилища по TTL или лимиту
+        reset_to_start(context, uid)
+        await msg.reply_text(EXPIRED_TEXT)
+        await send_start_menu(msg)
+        return ConversationHandler.END
+
+    is_cb = update.callback_query is not None
+
+    if is_cb and update.callback_query.data == CB_GO_BACK:
+        await update.callback_query.answer()
+        await go_back(update, context)
+        return ASK_FIELD
+
+    if msg and msg.text and msg.text.strip() == "↩️ Назад":
+        await go_back(update, context)
+        return ASK_FIELD
+
+    if msg and msg.text and msg.text.strip().lower() == "скачать файл":
+        await msg.reply_text("⏳ Формирую документ...")
+        await download_file(update, context)
+        reset_to_start(context, uid)
+        await send_start_menu(msg)
+        return ConversationHandler.END
+
+    if step >= len(FIELDS):
         return ASK_FIELD
 
+    cb_data = update.callback_query.data if is_cb else None
+    text = None if is_cb else (msg.text or "").strip()
+
+    handler = FIELD_HANDLERS[step]
+    t0 = time.perf_counter()
+    try:
+        await handler.accept(update, context, uid, step, FIELDS[step], cb_data, text)
+    finally:
+        handler.record(time.perf_counter() - t0)
+    return ASK_FIELD
+
 async def send_preview(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     uid = uid_from(update)
-    data = user_data.get(uid, {}) or {}
+    data = sessions.snapshot(uid)
     lines = ["📄 **Предпросмотр договора:**\n"]
 
     naim_name = data.get("naim_name")
@@ -1206,7 +1210,8 @@ async def send_preview(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     monthly_payment = data.get("monthly_payment")
     monthly_due_day = data.get("monthly_due_day")
     if monthly_payment and monthly_payment not in ("", "-"):
-        mc_num, _ = split_money_parts(monthly_payment)
+        # сумма цифрами уже посчитана в контексте шаблона сессии
+        mc_num = sessions.contract_context(uid)["mcnum"]
         payment_line = f"**Оплата:** {mc_num} руб/мес" if mc_num else f"**Оплата:** {monthly_payment} руб/мес"
         if monthly_due_day and monthly_due_day not in ("", "-"):
             payment_line += f" (до {monthly_due_day} числа)"
@@ -1224,176 +1229,139 @@ async def send_preview(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
     await update.effective_message.reply_text(text, parse_mode="Markdown")
     await update.effective_message.reply_text("⏳ Формирую документ...")
-    await download_file(update, context)
+    if await download_file(update, context) is DownloadResult.SESSION_DONE:
+        reset_to_start(context, uid)
+        await send_start_menu(update.effective_message)
 
 
-async def download_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def send_bundle(update: Update, data: dict, contract_ctx: dict, mode: str, with_pdf: bool = False) -> bool:
     uid = uid_from(update)
+    message = update.effective_message
+    commission_ctx = build_commission_context(data)
+    jobs = [
+        (contract_filename(data), contract_ctx, TEMPLATE_PATH),
+        (COMM_TENANT_FILENAME, commission_ctx, TEMPLATE_OKAZ_PATH),
+        (COMM_SOB_FILENAME, commission_ctx, TEMPLATE_SOB_PATH),
+    ]
 
-    try:
-        ensure_outdir()
-        data = user_data.get(uid, {}) or {}
-
-        ctx = {}
-        for k, v in data.items():
-            if v in (None, "", "-"):
-                ctx[k] = ""
-            else:
-                ctx[k] = v
+    notified = False
 
-        mc_num, mc_words = split_money_parts(data.get("monthly_payment"))
-        ctx["mcnum"] = mc_num or ""
-        ctx["monthly_payment"] = mc_words or ""
+    async def queued(position: int) -> None:
+        # одно сообщение на комплект: позиция первого документа, ушедшего в очередь
+        nonlocal notified
+        if not notified:
+            notified = True
+            await message.reply_text(f"⏳ Документы в очереди, позиция {position}. Подождите немного...")
 
-        dep_num, dep_words = split_money_parts(data.get("deposit_amount"))
-        ctx["deposum"] = dep_num or ""
-        ctx["deposit_amount"] = dep_words or ""
+    results = await asyncio.gather(
+        *(render_pool.render(ctx, path, on_queued=queued) for _, ctx, path in jobs),
+        return_exceptions=True,
+    )
 
-        act_text = (data.get("act_condition") or "").strip()
-        if act_text:
-            act_lines = wrap_to_lines(act_text, max_len=75, lines=5)
+    files: dict[str, bytes] = {}
+    busy = False
+    for (filename, _, _), result in zip(jobs, results):
+        if isinstance(result, RenderQueueFull):
+            busy = True
+        elif isinstance(result, Exception):
+            logging.error(f"Bundle render of {filename} failed for user {uid}", exc_info=result)
         else:
-            act_lines = [""] * 5
-        for i, line in enumerate(act_lines, start=1):
-            ctx[f"act{i}"] = line
-
-        raw_add = (data.get("additional_conditions") or "").strip()
-        items: list[str] = []
-        if raw_add and raw_add != "-":
-            for line in raw_add.splitlines():
-                s = re.sub(r"^\s*\d+\.\s*", "", line.strip())
-                if s and s != "-":
-                    items.append(s)
-        rows = wrap_conditions_to_rows(items, rows=10, budget_chars=80, with_numbers=True)
-        for i in range(10):
-            ctx[f"stroka{i + 1}"] = rows[i]
-
-        def pack_two_lines(names: list[str], max1: int = 80, max2: int = 80) -> tuple[str, str]:
-            if not names:
-                return "", ""
-            first, used = [], 0
-            cutoff = 0
-            for i, name in enumerate(names):
-                token = (", " if first else "") + name
-                if used + len(token) <= max1:
-                    first.append(name);
-                    used += len(token)
-                else:
-                    cutoff = i;
-                    break
+            files[filename] = result
+
+    if not files:
+        await message.reply_text(BUSY_TEXT if busy else "⚠️ Ошибка при формировании документов. Сообщите разработчику.")
+        return False
+
+    if with_pdf and pdf_service is not None:
+        names = list(files)
+        pdfs = await asyncio.gather(*(pdf_service.convert(files[n]) for n in names), return_exceptions=True)
+        for name, pdf in zip(names, pdfs):
+            if isinstance(pdf, Exception):
+                logging.warning(f"PDF conversion of {name} failed: {pdf}")
             else:
-                cutoff = len(names)
-            rest = names[cutoff:]
-            line1 = ", ".join(first)
-            if not rest:
-                return line1, ""
-            second, used2 = [], 0
-            for name in rest:
-                token = (", " if second else "") + name
-                if used2 + len(token) <= max2:
-                    second.append(name);
-                    used2 += len(token)
-                else:
-                    if second and (used2 + len(", и др.") <= max2):
-                        second.append("и др.")
-                    elif not second:
-                        second = [name[:max2 - 1] + "…"]
-                    break
-            return line1, ", ".join(second)
-
-        names = data.get("obj_tenants_list", []) or []
-        line1, line2 = pack_two_lines(names, max1=80, max2=80)
-        ctx["obj_tenants1"] = line1
-        ctx["obj_tenants2"] = line2
-
-        doc_choice = data.get("doc_choice")
-        if doc_choice == "egrn":
-            ctx["name_of_document"] = "Выписка из ЕГРН,"
-            ctx["document_value"] = ctx.get("obj_kadastr", "")
-        elif doc_choice == "cert":
-            ctx["name_of_document"] = "Свидетельство о государственной регистрации права,"
-            series = ctx.get("cert_series", "")
-            number = ctx.get("cert_number", "")
-            ctx["document_value"] = f"серия {series} № {number}".strip()
+                files[pdf_filename(name)] = pdf
+
+    try:
+        if mode == BUNDLE_ZIP:
+            zip_name = os.path.splitext(jobs[0][0])[0] + ".zip"
+            await message.reply_document(document=pack_documents_zip(files), filename=zip_name)
+        elif len(files) == 1:
+            [(filename, payload)] = files.items()
+            await message.reply_document(document=payload, filename=filename)
         else:
-            ctx["name_of_document"] = ""
-            ctx["document_value"] = ""
-
-        must_have = {
-            "act_date": "", "act_keys": "", "act_electricity": "", "act_hot_water": "", "act_cold_water": "",
-            **{f"act{i}": "" for i in range(1, 6)},
-            "obj_tenants1": "", "obj_tenants2": "",
-            "name_of_document": "", "document_value": "",
-            "mcnum": "", "monthly_payment": "", "deposum": "", "deposit_amount": "",
-            **{f"stroka{i}": "" for i in range(1, 11)},
-        }
-        for k, v in must_have.items():
-            ctx.setdefault(k, v)
-
-        def surname(fullname: str | None) -> str:
-            if not fullname or fullname.strip() in ("", "-"):
-                return "unknown"
-            return fullname.split()[0]
-
-        ar_surname = surname(data.get("ar_name"))
-        naim_surname = surname(data.get("naim_name"))
-        filename = f"договор_{ar_surname}_{naim_surname}.docx"
-        out_path = os.path.join(OUTPUT_DIR, filename)
+            await message.reply_media_group(
+                [InputMediaDocument(media=payload, filename=filename) for filename, payload in files.items()]
+            )
+        logging.info(f"Bundle of {len(files)} documents sent to user {uid}")
+    except Exception:
+        logging.error(f"Bundle send failed for user {uid}", exc_info=True)
+        await message.reply_text("⚠️ Ошибка при отправке файлов. Повторите команду «Скачать файл».")
+        return False
+
+    if len(files) < len(jobs):
+        await message.reply_text("⚠️ Часть документов не удалось сформировать.")
+    return True
+
+
+async def download_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> DownloadResult:
+    uid = uid_from(update)
+
+    try:
+        data = sessions.snapshot(uid)
+
+        ctx = sessions.contract_context(uid)
+        filename = contract_filename(data)
+
+        bundle_mode = context.user_data.get(CTX_BUNDLE_MODE)
+        if bundle_mode:
+            sent = await send_bundle(update, data, ctx, bundle_mode, with_pdf=bool(context.user_data.get(CTX_WANT_PDF)))
+            return DownloadResult.SESSION_DONE if sent else DownloadResult.SESSION_KEEP
 
         try:
-            fill_template(ctx, TEMPLATE_PATH, out_path)
+            doc_bytes = await render_document(update.effective_message, ctx, TEMPLATE_PATH)
             logging.info(f"Document generated successfully: {filename}")
-        except Exception as e:
+        except RenderQueueFull:
+            logging.warning(f"Render queue full, contract for user {uid} rejected")
+            await update.effective_message.reply_text(BUSY_TEXT)
+            return DownloadResult.SESSION_KEEP
+        except Exception:
             logging.error(f"fill_template failed for user {uid}", exc_info=True)
             await update.effective_message.reply_text(
                 "⚠️ Ошибка при формировании документа. Сообщите разработчику."
             )
-            return
-
-        if not os.path.exists(out_path):
-            logging.error(f"Generated file not found: {out_path}")
-            await update.effective_message.reply_text(
-                "⚠️ Не удалось создать файл договора. Сообщите разработчику."
-            )
-            return
+            return DownloadResult.SESSION_KEEP
 
         try:
-            with open(out_path, "rb") as fh:
-                await update.effective_message.reply_document(document=fh, filename=filename)
+            await update.effective_message.reply_document(document=doc_bytes, filename=filename)
             logging.info(f"Document sent successfully to user {uid}")
-        except Exception as e:
+            await send_pdf_copy(update.effective_message, context, doc_bytes, filename)
+        except Exception:
             logging.error(f"send_document failed for user {uid}", exc_info=True)
             await update.effective_message.reply_text(
                 "⚠️ Ошибка при отправке файла. Повторите команду «Скачать файл»."
             )
-            return
-        finally:
-            try:
-                if os.path.exists(out_path):
-                    os.remove(out_path)
-                    logging.debug(f"Temporary file removed: {out_path}")
-            except OSError as e:
-                logging.warning(f"Failed to remove temporary file {out_path}: {e}")
-
-        kb = InlineKeyboardMarkup([
-            [
-                InlineKeyboardButton("Комиссия наниматель", callback_data=CB_DOC_COMM_TENANT),
-                InlineKeyboardButton("Комиссия соб", callback_data=CB_DOC_COMM_SOB),
-            ],
-            [InlineKeyboardButton("Пропустить", callback_data=CB_SKIP_COMM)]
-        ])
-        await update.effective_message.reply_text(
-            "Заполнить ли данные в дополнительных договорах?",
-            reply_markup=kb
-        )
+            return DownloadResult.SESSION_KEEP
+
+        # договор отправлен, но анкета нужна для комиссий — выбор на следующем экране
+        await reply_screen(update.effective_message, "commissions")
+        return DownloadResult.SESSION_KEEP
 
-    except Exception as e:
+    except Exception:
         logging.error(f"Unexpected error in download_file for user {uid}", exc_info=True)
         await update.effective_message.reply_text(
             "⚠️ Произошла непредвиденная ошибка. Сообщите разработчику."
         )
+        return DownloadResult.SESSION_KEEP
+
+async def resume_session(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int | None:
+    # после перезапуска состояние диалога потеряно, а анкета восстановлена из базы
+    if context.user_data.get(CTX_STEP) is None:
+        return None
+    return await on_user_input(update, context)
+
 
 def build_conversation() -> ConversationHandler:
+    field_callbacks = f"^({CB_PAYER_TENANT}|{CB_PAYER_LANDLORD}|{CB_YES}|{CB_NO}|{CB_DEFAULT_CONDITION}|{CB_DOC_EGRN}|{CB_DOC_CERT}|{CB_SKIP_ADDR}|{CB_SKIP_DOC}|{CB_GO_BACK}|{CB_STREET_KEEP}|{CB_STREET}\\d+)$"
     return ConversationHandler(
         entry_points=[
             CommandHandler("start", start),
@@ -1401,29 +1369,71 @@ def build_conversation() -> ConversationHandler:
                 button_handler,
                 pattern=f"^({CB_HELP}|{CB_ABOUT}|{CB_BACK_TO_MENU}|{CB_INSTRUCTION}|{CB_START_RENT}|{CB_CONFIRM_RESTART}|{CB_CONTINUE}|{CB_DOC_COMM_TENANT}|{CB_DOC_COMM_SOB}|{CB_SKIP_COMM})$"
             ),
+            MessageHandler(filters.TEXT & ~filters.COMMAND, resume_session),
+            CallbackQueryHandler(resume_session, pattern=field_callbacks),
         ],
         states={
             ASK_FIELD: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, on_user_input),
-                CallbackQueryHandler(
-                    on_user_input,
-                    pattern=f"^({CB_PAYER_TENANT}|{CB_PAYER_LANDLORD}|{CB_YES}|{CB_NO}|{CB_DEFAULT_CONDITION}|{CB_DOC_EGRN}|{CB_DOC_CERT}|{CB_SKIP_ADDR}|{CB_SKIP_DOC}|{CB_GO_BACK})$"
-                ),
+                CallbackQueryHandler(on_user_input, pattern=field_callbacks),
             ]
         },
         fallbacks=[CommandHandler("start", start)],
         allow_reentry=True,
     )
 
-def main() -> None:
-    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
-    check_templates_on_startup()
-    ensure_outdir()
-    token = get_token()
-    app = Application.builder().token(token).build()
+async def restore_session(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if persistence is not None and update.effective_user is not None:
+        persistence.restore(update.effective_user.id, context.user_data)
+
+
+async def persist_session(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if persistence is not None and update.effective_user is not None:
+        try:
+            persistence.flush(update.effective_user.id, context.user_data)
+        except Exception:
+            logging.error(f"Failed to persist session of user {update.effective_user.id}", exc_info=True)
+
+
+async def on_startup(app: Application) -> None:
+    if persistence is not None:
+        persistence.purge()
+    if pdf_service is not None:
+        await pdf_service.start()
+
+
+async def on_shutdown(app: Application) -> None:
+    logging.info(f"Session store stats: {sessions.stats()}")
+    logging.info(f"Field handler timings: {field_handler_stats()}")
+    logging.info(f"Validator timings: {validator_stats()}")
+    if update_processor is not None:
+        logging.info(f"Update processor stats: {update_processor.stats()}")
+    if outbound is not None:
+        logging.info(f"Outbound scheduler stats: {outbound.stats()}")
+    if streets is not None:
+        logging.info(f"Street autocomplete stats: {streets.stats()}")
+    if persistence is not None:
+        logging.info(f"Session DB stats: {persistence.stats()}")
+        persistence.close()
+    render_pool.shutdown()
+    if pdf_service is not None:
+        logging.info(f"PDF service stats: {pdf_service.stats()}")
+        pdf_service.shutdown()
+
+
+def register_handlers(app: Application) -> None:
+    # до и после всех остальных групп: подтянуть анкету из базы и записать изменения
+    app.add_handler(TypeHandler(Update, restore_session), group=-1)
+    app.add_handler(TypeHandler(Update, persist_session), group=1)
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("help", help_command))
+    app.add_handler(CommandHandler("bundle", bundle_command))
+    app.add_handler(CommandHandler("pdf", pdf_command))
+    app.add_handler(CallbackQueryHandler(
+        bundle_button_handler,
+        pattern=f"^({CB_BUNDLE_OFF}|{CB_BUNDLE_GROUP}|{CB_BUNDLE_ZIP})$"
+    ))
 
     app.add_handler(CallbackQueryHandler(
         button_handler,
@@ -1433,7 +1443,35 @@ def main() -> None:
     conv = build_conversation()
     app.add_handler(conv)
 
-    app.run_polling(close_loop=False)
+
+def main() -> None:
+    global render_pool, pdf_service, sessions, persistence, update_processor, outbound, streets
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    check_templates_on_startup()
+    token = get_token()
+    sessions = build_session_store()
+    persistence = build_persistence(sessions)
+    render_pool = build_render_pool()
+    pdf_service = build_pdf_service()
+    webhook = build_webhook_config()
+    update_processor = build_update_processor()
+    outbound = build_outbound_scheduler()
+    streets = build_street_index()
+    app = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(update_processor)
+        .rate_limiter(outbound)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
+    register_handlers(app)
+
+    if webhook is not None:
+        asyncio.run(run_webhook(app, webhook, readiness))
+    else:
+        app.run_polling(close_loop=False)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,228 @@
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+from typing import Any, Callable, Coroutine
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+
+# лимиты Telegram: около 1 сообщения в секунду в один чат (короткие всплески допускаются)
+# и около 30 сообщений в секунду на бота в целом
+DEFAULT_CHAT_RATE = 1.0
+DEFAULT_CHAT_BURST = 3
+DEFAULT_GLOBAL_RATE = 30.0
+DEFAULT_MAX_RETRIES = 3
+
+PRIORITY_DOCUMENT = 0
+PRIORITY_MESSAGE = 1
+DOCUMENT_ENDPOINTS = frozenset({"sendDocument", "sendMediaGroup"})
+
+# сколько чатов держим в памяти, прежде чем выбросить полные (простаивающие) вёдра
+_PRUNE_CHATS = 1024
+
+
+def _limited(endpoint: str) -> bool:
+    # лимиты считаются на отправку и правку сообщений; ответы на кнопки, getMe и т.п. не ограничиваются
+    return endpoint.startswith(("send", "edit", "copy", "forward"))
+
+
+class _Bucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp", "paused_until")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+        self.paused_until = 0.0
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def delay(self, now: float) -> float:
+        # через сколько секунд можно будет отправить (0 — прямо сейчас)
+        self.refill(now)
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        return max(wait, self.paused_until - now)
+
+    def idle(self, now: float) -> bool:
+        self.refill(now)
+        return self.tokens >= self.burst and self.paused_until <= now
+
+
+class _Waiter:
+    __slots__ = ("key", "chat_id", "future")
+
+    def __init__(self, key: tuple[int, int], chat_id: int | str, future: asyncio.Future):
+        self.key = key
+        self.chat_id = chat_id
+        self.future = future
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return self.key < other.key
+
+
+class OutboundScheduler(BaseRateLimiter[int]):
+    # очередь исходящих запросов с лимитами на чат и на бота: запрос ждёт токен в обоих вёдрах,
+    # документы обслуживаются раньше информационных сообщений, на 429 — пауза и повтор
+    def __init__(
+            self,
+            chat_rate: float = DEFAULT_CHAT_RATE,
+            chat_burst: float = DEFAULT_CHAT_BURST,
+            global_rate: float = DEFAULT_GLOBAL_RATE,
+            max_retries: int = DEFAULT_MAX_RETRIES,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = max(chat_burst, 1)
+        self.max_retries = max(max_retries, 0)
+        self._clock = clock
+        self._global = _Bucket(global_rate, max(global_rate, 1), clock())
+        self._chats: dict[int | str, _Bucket] = {}
+        self._waiters: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self.sent = 0
+        self.delayed = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.retries = 0
+        self.flood_errors = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for waiter in self._waiters:
+            waiter.future.cancel()
+        self._waiters.clear()
+
+    def _chat(self, chat_id: int | str, now: float) -> _Bucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _PRUNE_CHATS:
+                waiting = {w.chat_id for w in self._waiters}
+                for key in [k for k, b in self._chats.items() if k not in waiting and b.idle(now)]:
+                    del self._chats[key]
+            bucket = self._chats[chat_id] = _Bucket(self.chat_rate, self.chat_burst, now)
+        return bucket
+
+    def _try_take(self, chat_id: int | str, now: float) -> float:
+        # 0 — токены взяты; иначе сколько ждать до ближайшей возможности
+        chat = self._chat(chat_id, now)
+        wait = max(chat.delay(now), self._global.delay(now))
+        if wait > 0:
+            return wait
+        chat.tokens -= 1
+        self._global.tokens -= 1
+        return 0.0
+
+    async def _acquire(self, chat_id: int | str, priority: int) -> None:
+        now = self._clock()
+        if not self._waiters and not self._try_take(chat_id, now):
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        bisect.insort(self._waiters, _Waiter((priority, next(self._seq)), chat_id, future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        else:
+            self._wakeup.set()
+        self.delayed += 1
+        try:
+            await future
+        finally:
+            waited = self._clock() - now
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            now = self._clock()
+            soonest = None
+            blocked_chats = set()
+            for waiter in list(self._waiters):
+                if waiter.future.done():
+                    self._waiters.remove(waiter)
+                    continue
+                # ожидающий с более высоким приоритетом в том же чате идёт первым
+                if waiter.chat_id in blocked_chats:
+                    continue
+                wait = self._try_take(waiter.chat_id, now)
+                if not wait:
+                    self._waiters.remove(waiter)
+                    waiter.future.set_result(None)
+                    continue
+                blocked_chats.add(waiter.chat_id)
+                soonest = wait if soonest is None else min(soonest, wait)
+                if self._global.delay(now) > 0:
+                    # общий лимит исчерпан — дальше по очереди смотреть бессмысленно
+                    break
+            if not self._waiters:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), soonest or self._global.delay(now) or 0.001)
+            except asyncio.TimeoutError:
+                pass
+
+    def _pause(self, chat_id: int | str | None, seconds: float) -> None:
+        until = self._clock() + seconds
+        bucket = self._global if chat_id is None else self._chat(chat_id, self._clock())
+        bucket.paused_until = max(bucket.paused_until, until)
+        bucket.tokens = min(bucket.tokens, 0)
+
+    async def process_request(
+            self,
+            callback: Callable[..., Coroutine[Any, Any, bool | dict | list[dict]]],
+            args: Any,
+            kwargs: dict[str, Any],
+            endpoint: str,
+            data: dict[str, Any],
+            rate_limit_args: int | None,
+    ) -> bool | dict | list[dict]:
+        chat_id = data.get("chat_id")
+        if chat_id is None or not _limited(endpoint):
+            return await callback(*args, **kwargs)
+
+        priority = PRIORITY_DOCUMENT if endpoint in DOCUMENT_ENDPOINTS else PRIORITY_MESSAGE
+        # отрицательное число повторов — как ноль: запрос всё равно уходит хотя бы раз
+        max_retries = self.max_retries if rate_limit_args is None else max(rate_limit_args, 0)
+        for attempt in range(max_retries + 1):
+            await self._acquire(chat_id, priority)
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.flood_errors += 1
+                if attempt == max_retries:
+                    logging.error(f"Flood limit for chat {chat_id} persists after {max_retries} retries")
+                    raise
+                # как в AIORateLimiter: публичный retry_after в PTB 22 выдаёт предупреждение о смене типа
+                seconds = e._retry_after.total_seconds() + 0.1
+                logging.info(f"Flood limit hit for chat {chat_id} on {endpoint}, retrying in {seconds:.1f}s")
+                self.retries += 1
+                self._pause(chat_id, seconds)
+                continue
+            self.sent += 1
+            return result
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "delayed": self.delayed,
+            "mean_wait_ms": (self.wait_time / self.delayed * 1e3) if self.delayed else 0.0,
+            "max_wait_ms": self.max_wait * 1e3,
+            "flood_errors": self.flood_errors,
+            "retries": self.retries,
+            "waiting": len(self._waiters),
+            "chats": len(self._chats),
+        }
@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from shutil import rmtree, which
+
+
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_JOBS = 200
+DEFAULT_BASE_PORT = 2002
+STARTUP_TIMEOUT = 30.0
+
+SOFFICE_CANDIDATES = [
+    "/usr/bin/soffice",
+    "/usr/lib/libreoffice/program/soffice",
+    "/opt/libreoffice/program/soffice",
+    "/snap/bin/libreoffice",
+    r"C:\Program Files\LibreOffice\program\soffice.com",
+    r"C:\Program Files (x86)\LibreOffice\program\soffice.com",
+]
+
+
+class PdfConversionError(RuntimeError):
+    pass
+
+
+def find_soffice() -> str | None:
+    for name in ("soffice", "libreoffice", "soffice.com"):
+        p = which(name)
+        if p:
+            return p
+    for c in SOFFICE_CANDIDATES:
+        if os.path.exists(c):
+            return c
+    versioned = sorted(Path("/opt").glob("libreoffice*/program/soffice"))
+    return str(versioned[-1]) if versioned else None
+
+
+def _import_uno(soffice: str | None):
+    try:
+        import uno
+        return uno
+    except ImportError:
+        pass
+    if not soffice:
+        return None
+    # pyuno лежит рядом с soffice, если питон совпадает по версии
+    program_dir = os.path.dirname(os.path.realpath(soffice))
+    if program_dir not in sys.path:
+        sys.path.append(program_dir)
+    try:
+        import uno
+        return uno
+    except ImportError:
+        return None
+
+
+class _SofficeWorker:
+    # долгоживущий soffice --headless со своим профилем; конвертация через UNO-сокет
+    def __init__(self, soffice: str, uno_module, port: int, profile_dir: str):
+        self.soffice = soffice
+        self.uno = uno_module
+        self.port = port
+        self.profile_dir = profile_dir
+        self.proc: subprocess.Popen | None = None
+        self.desktop = None
+        self.jobs = 0
+        self.restarts = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None and self.desktop is not None
+
+    def start(self) -> None:
+        accept = f"socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext"
+        self.proc = subprocess.Popen(
+            [
+                self.soffice, "--headless", "--invisible", "--nologo", "--norestore",
+                "--nodefault", "--nolockcheck",
+                f"-env:UserInstallation={Path(self.profile_dir).as_uri()}",
+                f"--accept={accept}",
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        local = self.uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            try:
+                ctx = resolver.resolve(f"uno:{accept}")
+                break
+            except Exception:
+                if self.proc.poll() is not None or time.monotonic() > deadline:
+                    self.kill()
+                    raise PdfConversionError(f"soffice на порту {self.port} не запустился")
+                time.sleep(0.25)
+        self.desktop = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+        self.jobs = 0
+
+    def _props(self, **kwargs) -> tuple:
+        from com.sun.star.beans import PropertyValue
+        props = []
+        for name, value in kwargs.items():
+            p = PropertyValue()
+            p.Name, p.Value = name, value
+            props.append(p)
+        return tuple(props)
+
+    def convert(self, src: str, dst: str) -> None:
+        if not self.alive:
+            self.start()
+        url = self.uno.systemPathToFileUrl
+        doc = self.desktop.loadComponentFromURL(url(src), "_blank", 0, self._props(Hidden=True))
+        try:
+            doc.storeToURL(url(dst), self._props(FilterName="writer_pdf_Export"))
+        finally:
+            doc.close(True)
+        self.jobs += 1
+
+    def kill(self) -> None:
+        self.desktop = None
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.kill()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+        self.proc = None
+
+    def restart(self) -> None:
+        self.kill()
+        self.restarts += 1
+        self.start()
+
+
+class _CliWorker:
+    # запасной вариант без pyuno: soffice --convert-to на каждый документ,
+    # но с постоянным профилем, чтобы не создавать его заново
+    def __init__(self, soffice: str, profile_dir: str, timeout: float):
+        self.soffice = soffice
+        self.profile_dir = profile_dir
+        self.timeout = timeout
+        self.jobs = 0
+        self.restarts = 0
+        self.alive = True
+
+    def start(self) -> None:
+        pass
+
+    def convert(self, src: str, dst: str) -> None:
+        outdir = os.path.dirname(dst)
+        subprocess.run(
+            [
+                self.soffice, "--headless", "--nologo", "--norestore", "--nolockcheck",
+                f"-env:UserInstallation={Path(self.profile_dir).as_uri()}",
+                "--convert-to", "pdf", "--outdir", outdir, src,
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=self.timeout,
+            check=True,
+        )
+        produced = os.path.join(outdir, Path(src).stem + ".pdf")
+        if produced != dst:
+            os.replace(produced, dst)
+        self.jobs += 1
+
+    def kill(self) -> None:
+        pass
+
+    def restart(self) -> None:
+        self.restarts += 1
+        self.jobs = 0
+
+
+class PdfService:
+    def __init__(
+            self,
+            workers: int = 2,
+            timeout: float = DEFAULT_TIMEOUT,
+            max_jobs_per_worker: int = DEFAULT_MAX_JOBS,
+            soffice: str | None = None,
+            base_port: int = DEFAULT_BASE_PORT,
+    ):
+        self.soffice = soffice or find_soffice()
+        if not self.soffice:
+            raise PdfConversionError("LibreOffice (soffice) не найден")
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.base_port = base_port
+        self.converted = 0
+        self.failed = 0
+        self._uno = _import_uno(self.soffice)
+        self._profiles = tempfile.TemporaryDirectory(prefix="bhbot_soffice_")
+        self._pool: list = []
+        self._idle: asyncio.Queue | None = None
+        # воркеры, чья конвертация не уложилась в таймаут: ждут завершения потока
+        self._retiring: set[asyncio.Task] = set()
+        if self._uno is None:
+            logging.warning("pyuno недоступен: PDF будет конвертироваться без постоянного soffice")
+
+    def _make_worker(self, i: int):
+        profile = os.path.join(self._profiles.name, f"worker{i}")
+        if self._uno is not None:
+            return _SofficeWorker(self.soffice, self._uno, self.base_port + i, profile)
+        return _CliWorker(self.soffice, profile, self.timeout)
+
+    async def start(self) -> None:
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        self._pool = [self._make_worker(i) for i in range(self.workers)]
+        for worker in self._pool:
+            try:
+                await asyncio.to_thread(worker.start)
+            except Exception:
+                logging.error("Failed to start soffice worker", exc_info=True)
+            self._idle.put_nowait(worker)
+        logging.info(f"PDF service started: {self.workers} soffice workers")
+
+    async def _recycle(self, worker) -> None:
+        try:
+            await asyncio.to_thread(worker.restart)
+        except Exception:
+            # воркер поднимется заново при следующей конвертации
+            logging.error("Failed to restart soffice worker", exc_info=True)
+
+    async def _retire(self, worker, job: asyncio.Future, tmp: str, restart: bool) -> None:
+        # слот возвращается в пул, только когда поток конвертации отпустил UNO-соединение воркера
+        try:
+            await asyncio.gather(job, return_exceptions=True)
+            if restart:
+                await self._recycle(worker)
+        finally:
+            rmtree(tmp, ignore_errors=True)
+            if self._idle is not None:
+                self._idle.put_nowait(worker)
+
+    def _retire_later(self, worker, job: asyncio.Future, tmp: str, restart: bool) -> None:
+        task = asyncio.get_running_loop().create_task(self._retire(worker, job, tmp, restart))
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
+
+    async def convert(self, docx_bytes: bytes) -> bytes:
+        await self.start()
+        worker = await self._idle.get()
+        tmp = tempfile.mkdtemp(prefix="bhbot_pdf_")
+        release = True
+        try:
+            src = os.path.join(tmp, "document.docx")
+            dst = os.path.join(tmp, "document.pdf")
+            with open(src, "wb") as fh:
+                fh.write(docx_bytes)
+            job = asyncio.ensure_future(asyncio.to_thread(worker.convert, src, dst))
+            try:
+                await asyncio.wait_for(asyncio.shield(job), self.timeout)
+                with open(dst, "rb") as fh:
+                    pdf = fh.read()
+            except asyncio.TimeoutError:
+                self.failed += 1
+                logging.warning("soffice conversion timed out, restarting worker")
+                # kill ждёт завершения процесса до 5 с — не в цикле событий; поток конвертации
+                # ещё работает с этим воркером, поэтому перезапуск и возврат в пул — после него
+                release = False
+                await asyncio.to_thread(worker.kill)
+                self._retire_later(worker, job, tmp, restart=True)
+                raise PdfConversionError(f"Конвертация в PDF не уложилась в {self.timeout:.0f} с")
+            except asyncio.CancelledError:
+                if not job.done():
+                    release = False
+                    self._retire_later(worker, job, tmp, restart=False)
+                raise
+            except Exception as e:
+                self.failed += 1
+                logging.error("soffice conversion failed, restarting worker", exc_info=True)
+                await self._recycle(worker)
+                raise PdfConversionError(f"Ошибка конвертации в PDF: {e}") from e
+
+            self.converted += 1
+            if worker.jobs >= self.max_jobs_per_worker:
+                await self._recycle(worker)
+            return pdf
+        finally:
+            if release:
+                rmtree(tmp, ignore_errors=True)
+                self._idle.put_nowait(worker)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "warm": self._uno is not None,
+            "converted": self.converted,
+            "failed": self.failed,
+            "restarts": sum(w.restarts for w in self._pool),
+            "retiring": len(self._retiring),
+        }
+
+    def shutdown(self) -> None:
+        for worker in self._pool:
+            worker.kill()
+        self._pool = []
+        self._idle = None
+        self._profiles.cleanup()
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable
+
+from form_logic import fill_template_to_buffer
+
+
+DEFAULT_QUEUE_SIZE = 32
+DEFAULT_CACHE_MB = 64
+
+
+class RenderQueueFull(RuntimeError):
+    pass
+
+
+def _render_bytes(context: dict, template_path: str) -> bytes:
+    return fill_template_to_buffer(context, template_path).getvalue()
+
+
+class RenderCache:
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @staticmethod
+    def make_key(context: dict, template_path: str) -> str:
+        # версия шаблона (путь + mtime + размер) и итоговый контекст
+        path = os.path.abspath(template_path)
+        st = os.stat(path)
+        payload = json.dumps(context, sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha256(f"{path}\0{st.st_mtime_ns}\0{st.st_size}\0".encode("utf-8"))
+        digest.update(payload.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> bytes | None:
+        payload = self._items.get(key)
+        if payload is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return payload
+
+    def put(self, key: str, payload: bytes) -> None:
+        if len(payload) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.size_bytes -= len(old)
+        self._items[key] = payload
+        self.size_bytes += len(payload)
+        while self.size_bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size_bytes -= len(evicted)
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.size_bytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._items),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+class RenderPool:
+    def __init__(
+            self,
+            workers: int | None = None,
+            max_queue: int = DEFAULT_QUEUE_SIZE,
+            cache: RenderCache | None = None,
+    ):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_queue = max(0, max_queue)
+        self.cache = cache
+        self._executor: ProcessPoolExecutor | None = None
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def queue_position(self) -> int:
+        # 0 — свободный воркер есть, иначе номер в очереди для следующей задачи
+        return max(0, self._in_flight - self.workers + 1)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: форк процесса с потоками event loop/httpx небезопасен
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def render(
+            self,
+            context: dict,
+            template_path: str,
+            on_queued: Callable[[int], Awaitable[None]] | None = None,
+    ) -> bytes:
+        # on_queued(позиция) — только если документ не из кэша и свободного воркера нет
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(context, template_path)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        if self._in_flight >= self.workers + self.max_queue:
+            raise RenderQueueFull(f"Очередь рендеринга заполнена ({self.max_queue})")
+        position = self.queue_position()
+        self._in_flight += 1
+        try:
+            if position and on_queued is not None:
+                await on_queued(position)
+            loop = asyncio.get_running_loop()
+            payload = await loop.run_in_executor(self._get_executor(), _render_bytes, context, template_path)
+        finally:
+            self._in_flight -= 1
+
+        if key is not None:
+            self.cache.put(key, payload)
+        return payload
+
+    def shutdown(self) -> None:
+        if self.cache is not None:
+            logging.info(f"Render cache stats: {self.cache.stats()}")
+        if self._executor is not None:
+            logging.info("Stopping render pool")
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
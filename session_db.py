@@ -0,0 +1,185 @@
+import json
+import logging
+import sqlite3
+import time
+
+from sessions import SessionStore
+
+
+SCOPE_FORM = "form"
+SCOPE_CTX = "ctx"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    uid INTEGER PRIMARY KEY,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated);
+CREATE TABLE IF NOT EXISTS session_fields (
+    uid INTEGER NOT NULL,
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (uid, scope, key)
+) WITHOUT ROWID;
+"""
+
+
+def _encode(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class SessionDB:
+    # одна строка на поле анкеты: на каждом шаге пишется только то, что изменилось
+    def __init__(self, path: str, ttl: float = 0):
+        self.path = path
+        self.ttl = ttl
+        self.writes = 0
+        self.write_time = 0.0
+        self.max_write_time = 0.0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # в WAL-режиме NORMAL не делает fsync на каждый коммит, но база не бьётся при падении процесса
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _deadline(self) -> float:
+        return time.time() - self.ttl if self.ttl > 0 else 0.0
+
+    def load(self, uid: int) -> tuple[dict, dict] | None:
+        row = self._conn.execute("SELECT updated FROM sessions WHERE uid = ?", (uid,)).fetchone()
+        if row is None:
+            return None
+        if row[0] < self._deadline():
+            self.drop(uid)
+            return None
+        scopes = {SCOPE_FORM: {}, SCOPE_CTX: {}}
+        for scope, key, value in self._conn.execute(
+                "SELECT scope, key, value FROM session_fields WHERE uid = ?", (uid,)):
+            scopes.setdefault(scope, {})[key] = json.loads(value)
+        return scopes[SCOPE_FORM], scopes[SCOPE_CTX]
+
+    def write(self, uid: int, upserts: list[tuple[str, str, str]], deletes: list[tuple[str, str]],
+              wipe: bool = False) -> None:
+        t0 = time.perf_counter()
+        with self._conn:
+            if wipe:
+                self._conn.execute("DELETE FROM session_fields WHERE uid = ?", (uid,))
+            if deletes:
+                self._conn.executemany(
+                    "DELETE FROM session_fields WHERE uid = ? AND scope = ? AND key = ?",
+                    [(uid, scope, key) for scope, key in deletes],
+                )
+            if upserts:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO session_fields (uid, scope, key, value) VALUES (?, ?, ?, ?)",
+                    [(uid, scope, key, value) for scope, key, value in upserts],
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (uid, updated) VALUES (?, ?)", (uid, time.time())
+            )
+        elapsed = time.perf_counter() - t0
+        self.writes += 1
+        self.write_time += elapsed
+        self.max_write_time = max(self.max_write_time, elapsed)
+
+    def drop(self, uid: int) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM session_fields WHERE uid = ?", (uid,))
+            self._conn.execute("DELETE FROM sessions WHERE uid = ?", (uid,))
+
+    def purge(self) -> int:
+        deadline = self._deadline()
+        if not deadline:
+            return 0
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM session_fields WHERE uid IN (SELECT uid FROM sessions WHERE updated < ?)",
+                (deadline,),
+            )
+            removed = self._conn.execute("DELETE FROM sessions WHERE updated < ?", (deadline,)).rowcount
+        if removed:
+            logging.info(f"Purged {removed} expired sessions from {self.path}")
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "writes": self.writes,
+            "mean_write_ms": (self.write_time / self.writes * 1e3) if self.writes else 0.0,
+            "max_write_ms": self.max_write_time * 1e3,
+        }
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class PersistentSessions:
+    # связывает SessionStore и context.user_data с SessionDB: ленивое восстановление
+    # на первом апдейте пользователя и запись изменений после каждого апдейта
+    def __init__(self, store: SessionStore, db: SessionDB):
+        self.store = store
+        self.db = db
+        self.restored = 0
+        # последнее записанное значение каждого ключа context.user_data (только для анкет в памяти)
+        self._ctx_written: dict[int, dict[str, str]] = {}
+        # изменения анкет отслеживаются, только пока есть куда их писать
+        store.track_changes = True
+        store.on_evict = self._forget
+
+    def _forget(self, uid: int) -> None:
+        # анкета ушла из памяти по TTL или вытеснена; в базе она остаётся, при возврате
+        # пользователя восстановится вместе со снимком context.user_data
+        self._ctx_written.pop(uid, None)
+
+    def restore(self, uid: int, user_data: dict) -> None:
+        if uid in self.store:
+            return
+        loaded = self.db.load(uid)
+        if loaded is None:
+            return
+        form, ctx = loaded
+        self.store.restore(uid, form)
+        if not user_data:
+            # процесс перезапускался: шаг, фазы адресов и буферы берём из базы
+            user_data.update(ctx)
+        self._ctx_written[uid] = {key: _encode(value) for key, value in ctx.items()}
+        self.restored += 1
+
+    def flush(self, uid: int, user_data: dict) -> None:
+        wiped, changed, removed = self.store.take_changes(uid)
+        if changed is None:
+            # анкета удалена (завершена или сброшена) — в базе её тоже не держим
+            if wiped:
+                self.db.drop(uid)
+                self._ctx_written.pop(uid, None)
+            return
+
+        if wiped:
+            self._ctx_written.pop(uid, None)
+        written = self._ctx_written.setdefault(uid, {})
+        upserts = [(SCOPE_FORM, key, _encode(value)) for key, value in changed.items()]
+        deletes = [(SCOPE_FORM, key) for key in removed]
+        for key, value in user_data.items():
+            encoded = _encode(value)
+            if written.get(key) != encoded:
+                written[key] = encoded
+                upserts.append((SCOPE_CTX, key, encoded))
+        for key in [k for k in written if k not in user_data]:
+            del written[key]
+            deletes.append((SCOPE_CTX, key))
+
+        if wiped or upserts or deletes:
+            self.db.write(uid, upserts, deletes, wipe=wiped)
+
+    def purge(self) -> int:
+        removed = self.db.purge()
+        for uid in [u for u in self._ctx_written if u not in self.store]:
+            del self._ctx_written[uid]
+        return removed
+
+    def stats(self) -> dict:
+        return {**self.db.stats(), "restored": self.restored}
+
+    def close(self) -> None:
+        self.db.close()
@@ -0,0 +1,265 @@
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from fields import FIELDS
+from form_logic import assemble_contract_context, build_contract_context, derive_contract_context
+
+
+DEFAULT_TTL_HOURS = 72
+DEFAULT_MAX_SESSIONS = 10_000
+
+# значения анкеты хранятся списком: позиция = номер шага в FIELDS,
+# дальше — производные поля адреса объекта и список жильцов
+EXTRA_FORM_KEYS = ("obj_street", "obj_house", "obj_building", "obj_flat", "obj_tenants_list")
+FORM_KEYS = tuple(sys.intern(f["key"]) for f in FIELDS) + tuple(sys.intern(k) for k in EXTRA_FORM_KEYS)
+KEY_INDEX = {key: i for i, key in enumerate(FORM_KEYS)}
+
+# имена вспомогательных ключей context.user_data, чтобы не собирать f-строки на каждом апдейте
+PHASE_KEYS = {f["key"]: sys.intern(f"{f['key']}_phase") for f in FIELDS}
+TEMP_KEYS = {f["key"]: sys.intern(f"{f['key']}_temp") for f in FIELDS}
+BUF_KEYS = {f["key"]: sys.intern(f"{f['key']}_buf") for f in FIELDS}
+
+_MISSING = object()
+
+
+def _value_size(value) -> int:
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(sys.getsizeof(item) for item in value)
+    elif isinstance(value, dict):
+        # ключи производного контекста — общие строки-константы, считаем только значения
+        size += sum(sys.getsizeof(item) for item in value.values())
+    return size
+
+
+class _Session:
+    __slots__ = ("values", "touched", "size", "dirty", "derived")
+
+    def __init__(self, now: float):
+        self.values = [_MISSING] * len(FORM_KEYS)
+        self.touched = now
+        self.size = sys.getsizeof(self.values)
+        # битовая маска позиций, изменённых с последнего take_changes (только при track_changes)
+        self.dirty = 0
+        # производные ключи шаблона договора (деньги прописью, act1..5, stroka1..10, ...):
+        # появляются при первом contract_context и дальше пересчитываются по изменённым полям (только при contexts)
+        self.derived: dict | None = None
+
+    def get(self, key: str, default=None):
+        # представление над слотами для производных ключей: без копии анкеты в словарь
+        idx = KEY_INDEX.get(key)
+        value = _MISSING if idx is None else self.values[idx]
+        return default if value is _MISSING else value
+
+    def as_dict(self) -> dict:
+        return {key: value for key, value in zip(FORM_KEYS, self.values) if value is not _MISSING}
+
+
+class SessionStore:
+    # данные формы по uid: LRU с ограничением по числу сессий и по времени простоя
+    def __init__(
+            self,
+            ttl: float = DEFAULT_TTL_HOURS * 3600,
+            max_sessions: int = DEFAULT_MAX_SESSIONS,
+            clock=time.monotonic,
+            track_changes: bool = False,
+            contexts: bool = False,
+    ):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.clock = clock
+        self.track_changes = track_changes
+        self.contexts = contexts
+        self.total_bytes = 0
+        self.expired = 0
+        self.evicted = 0
+        self._sessions: OrderedDict[int, _Session] = OrderedDict()
+        self._dropped: set[int] = set()
+        # вызывается с uid, когда анкета ушла из памяти по TTL или вытеснена (не при drop):
+        # чтобы связанные с uid структуры (например, PersistentSessions) не росли бесконечно
+        self.on_evict: Callable[[int], None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, uid: int) -> bool:
+        self._expire()
+        return uid in self._sessions
+
+    def _expire(self) -> None:
+        if self.ttl <= 0:
+            return
+        deadline = self.clock() - self.ttl
+        while self._sessions:
+            uid, session = next(iter(self._sessions.items()))
+            if session.touched > deadline:
+                break
+            self._remove(uid)
+            self.expired += 1
+            logging.debug(f"Session of user {uid} expired")
+            if self.on_evict is not None:
+                self.on_evict(uid)
+
+    def _remove(self, uid: int) -> _Session | None:
+        session = self._sessions.pop(uid, None)
+        if session is not None:
+            self.total_bytes -= session.size
+        return session
+
+    def _touch(self, uid: int, create: bool = False) -> _Session | None:
+        self._expire()
+        session = self._sessions.get(uid)
+        now = self.clock()
+        if session is None:
+            if not create:
+                return None
+            session = _Session(now)
+            if self.contexts:
+                # производные ключи заводятся вместе с анкетой, дальше их держат в актуальном виде set/discard
+                session.derived = derive_contract_context(session)
+                session.size += _value_size(session.derived)
+            self._sessions[uid] = session
+            self.total_bytes += session.size
+            while len(self._sessions) > self.max_sessions:
+                old_uid, _ = next(iter(self._sessions.items()))
+                self._remove(old_uid)
+                self.evicted += 1
+                logging.debug(f"Session of user {old_uid} evicted")
+                if self.on_evict is not None:
+                    self.on_evict(old_uid)
+        else:
+            session.touched = now
+            self._sessions.move_to_end(uid)
+        return session
+
+    def reset(self, uid: int) -> None:
+        self.drop(uid)
+        self._touch(uid, create=True)
+
+    def drop(self, uid: int) -> None:
+        self._remove(uid)
+        if self.track_changes:
+            self._dropped.add(uid)
+
+    def restore(self, uid: int, data: dict) -> None:
+        session = self._touch(uid, create=True)
+        restored = {}
+        for key, value in data.items():
+            idx = KEY_INDEX.get(key)
+            if idx is None:
+                # поле из старой версии FIELDS
+                logging.debug(f"Skipping unknown session key {key} of user {uid}")
+                continue
+            self._assign(session, idx, value)
+            restored[key] = value
+        self._rederive(session, restored)
+        session.dirty = 0
+
+    def get(self, uid: int, key: str, default=None):
+        session = self._touch(uid)
+        if session is None:
+            return default
+        value = session.values[KEY_INDEX[key]]
+        return default if value is _MISSING else value
+
+    def set(self, uid: int, key: str, value) -> None:
+        idx = KEY_INDEX[key]
+        session = self._touch(uid, create=True)
+        self._assign(session, idx, value)
+        self._rederive(session, (key,))
+        if self.track_changes:
+            session.dirty |= 1 << idx
+
+    def _assign(self, session: _Session, idx: int, value) -> None:
+        old = session.values[idx]
+        delta = _value_size(value)
+        if old is not _MISSING:
+            delta -= _value_size(old)
+        session.values[idx] = value
+        session.size += delta
+        self.total_bytes += delta
+
+    def _rederive(self, session: _Session, keys) -> None:
+        if session.derived is None:
+            return
+        changed = derive_contract_context(session, keys)
+        if not changed:
+            return
+        delta = -_value_size(session.derived)
+        session.derived.update(changed)
+        delta += _value_size(session.derived)
+        session.size += delta
+        self.total_bytes += delta
+
+    def update(self, uid: int, values: dict) -> None:
+        for key, value in values.items():
+            self.set(uid, key, value)
+
+    def discard(self, uid: int, *keys: str) -> None:
+        session = self._touch(uid)
+        if session is None:
+            return
+        for key in keys:
+            idx = KEY_INDEX[key]
+            old = session.values[idx]
+            if old is not _MISSING:
+                session.values[idx] = _MISSING
+                delta = _value_size(old)
+                session.size -= delta
+                self.total_bytes -= delta
+                if self.track_changes:
+                    session.dirty |= 1 << idx
+        self._rederive(session, keys)
+
+    def snapshot(self, uid: int) -> dict:
+        session = self._touch(uid)
+        return session.as_dict() if session is not None else {}
+
+    def contract_context(self, uid: int) -> dict:
+        # контекст шаблона договора; при contexts производные ключи уже посчитаны по мере ввода,
+        # и тяжёлые переносы строк не повторяются на каждом скачивании
+        session = self._touch(uid)
+        if session is None:
+            return build_contract_context({})
+        derived = session.derived if session.derived is not None else derive_contract_context(session)
+        return assemble_contract_context(session.as_dict(), derived)
+
+    def take_changes(self, uid: int) -> tuple[bool, dict | None, list[str]]:
+        # (была ли анкета сброшена, изменённые поля, удалённые поля);
+        # None вместо изменённых полей — анкеты больше нет
+        wiped = uid in self._dropped
+        self._dropped.discard(uid)
+        session = self._sessions.get(uid)
+        if session is None:
+            return wiped, None, []
+        changed, removed = {}, []
+        dirty = session.dirty
+        while dirty:
+            idx = (dirty & -dirty).bit_length() - 1
+            dirty &= dirty - 1
+            value = session.values[idx]
+            if value is _MISSING:
+                removed.append(FORM_KEYS[idx])
+            else:
+                changed[FORM_KEYS[idx]] = value
+        session.dirty = 0
+        return wiped, changed, removed
+
+    def clear(self) -> None:
+        self._sessions.clear()
+        self._dropped.clear()
+        self.total_bytes = 0
+
+    def stats(self) -> dict:
+        self._expire()
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self.total_bytes,
+            "max_sessions": self.max_sessions,
+            "ttl_s": self.ttl,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
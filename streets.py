@@ -0,0 +1,103 @@
+import array
+import bisect
+import re
+import time
+from typing import Iterable
+
+
+DEFAULT_STREETS_FILE = "streets.txt"
+DEFAULT_SUGGESTIONS = 6
+# короче двух букв подсказки бесполезны: под них попадает пол-города
+MIN_PREFIX = 2
+# при опечатке укорачиваем запрос, пока не найдётся хоть что-то, но не короче трёх букв
+TRIM_TO = 3
+# с типа улицы поиск не начинается: иначе «пр» подсказывало бы все проспекты подряд
+STREET_TYPES = frozenset({
+    "ул", "улица", "пр", "просп", "проспект", "пер", "переулок", "наб", "набережная",
+    "бул", "бульвар", "ш", "шоссе", "пл", "площадь", "линия", "аллея", "проезд", "тупик",
+})
+
+_SEPARATORS_RE = re.compile(r"[^0-9a-zа-я]+")
+_KEY_END = "\uffff"
+
+
+def normalize_street(raw: str) -> str:
+    # ключ поиска: без регистра, «ё» как «е», знаки препинания как пробел
+    return _SEPARATORS_RE.sub(" ", raw.casefold().replace("ё", "е")).strip()
+
+
+class StreetIndex:
+    # офлайн-подсказки улиц: отсортированный массив ключей и bisect по префиксу;
+    # ключ заводится на каждое слово названия (кроме типа улицы), чтобы «проспект Просвещения»
+    # находился по «просв»; порядок в списке — приоритет подсказки (частые улицы в начале файла)
+    def __init__(self, names: Iterable[str]):
+        self.names = list(dict.fromkeys(name.strip() for name in names if name.strip()))
+        entries = []
+        for i, name in enumerate(self.names):
+            key = normalize_street(name)
+            if not key:
+                continue
+            words = key.split()
+            entries.append((key, i))
+            entries.extend(
+                (" ".join(words[w:]), i)
+                for w in range(1, len(words))
+                if len(words[w]) > 1 and words[w] not in STREET_TYPES
+            )
+        entries.sort()
+        self._keys = [key for key, _ in entries]
+        self._ids = array.array("I", (i for _, i in entries))
+        self.lookups = 0
+        self.seconds = 0.0
+
+    @classmethod
+    def load(cls, path: str) -> "StreetIndex":
+        # одна улица на строку, пустые строки и «#комментарии» пропускаются
+        with open(path, encoding="utf-8-sig") as fh:
+            return cls(line for line in fh if not line.lstrip().startswith("#"))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def exact(self, raw: str) -> str | None:
+        # название из списка, если введено целиком (без учёта регистра и «ё»)
+        key = normalize_street(raw)
+        lo = bisect.bisect_left(self._keys, key)
+        while key and lo < len(self._keys) and self._keys[lo] == key:
+            i = self._ids[lo]
+            if normalize_street(self.names[i]) == key:
+                return self.names[i]
+            lo += 1
+        return None
+
+    def _range(self, prefix: str) -> tuple[int, int]:
+        lo = bisect.bisect_left(self._keys, prefix)
+        return lo, bisect.bisect_left(self._keys, prefix + _KEY_END, lo)
+
+    def lookup(self, raw: str, limit: int = DEFAULT_SUGGESTIONS) -> list[tuple[int, str]]:
+        # [(номер улицы, название)] для кнопок; пусто, если совпадений нет
+        t0 = time.perf_counter()
+        try:
+            prefix = normalize_street(raw)
+            floor = min(len(prefix), TRIM_TO)
+            while prefix and len(prefix) >= max(floor, MIN_PREFIX):
+                lo, hi = self._range(prefix)
+                if lo < hi:
+                    ids = sorted(set(self._ids[lo:hi]))[:limit]
+                    return [(i, self.names[i]) for i in ids]
+                prefix = prefix[:-1].rstrip()
+            return []
+        finally:
+            self.lookups += 1
+            self.seconds += time.perf_counter() - t0
+
+    def name(self, i: int) -> str | None:
+        return self.names[i] if 0 <= i < len(self.names) else None
+
+    def stats(self) -> dict:
+        return {
+            "streets": len(self.names),
+            "keys": len(self._keys),
+            "lookups": self.lookups,
+            "mean_us": (self.seconds / self.lookups * 1e6) if self.lookups else 0.0,
+        }
@@ -0,0 +1,20 @@
+from bench.synthetic import make_street_names
+from form_logic import compose_object_address, compose_registration_address
+from streets import StreetIndex
+
+
+def test_plain_street_gets_type_prefix():
+    assert compose_object_address("Барочная", "6")["obj_address"] == "г. Санкт-Петербург, ул. Барочная, д. 6,"
+
+
+def test_typed_street_from_index_is_not_prefixed_again():
+    index = StreetIndex(make_street_names())
+    for query in ("невский проспект", "наб реки фонтанки"):
+        street = index.exact(query)
+        address = compose_object_address(street, "1")["obj_address"]
+        assert "ул." not in address
+        assert street in address
+
+
+def test_registration_address_with_typed_street():
+    assert compose_registration_address("Москва", "Ленинский проспект", "10") == "г. Москва, Ленинский проспект, д. 10,"
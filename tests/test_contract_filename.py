@@ -0,0 +1,11 @@
+from form_logic import contract_filename
+
+
+def test_surnames_make_the_name():
+    assert contract_filename({"ar_name": "Петров Пётр", "naim_name": "Иванов Иван"}) == "договор_Петров_Иванов.docx"
+
+
+def test_path_separators_and_dots_are_replaced():
+    name = contract_filename({"ar_name": "Иванов/Петров Иван", "naim_name": "..\\..\\boot.ini"})
+    assert name == "договор_Иванов_Петров_boot.ini.docx"
+    assert contract_filename({"ar_name": "../..", "naim_name": "-"}) == "договор_unknown_unknown.docx"
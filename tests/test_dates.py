@@ -0,0 +1,32 @@
+from datetime import date
+
+import form_logic
+from form_logic import parse_date, check_dates, TWO_DIGIT_YEAR_AHEAD
+
+
+def test_two_digit_year_in_the_past_century():
+    assert parse_date("01.01.99") == date(1999, 1, 1)
+    assert parse_date("15.06.85") == date(1985, 6, 15)
+
+
+def test_two_digit_year_near_future_stays_in_this_century():
+    this_year = date.today().year
+    assert parse_date("01.01.25") == date(2025, 1, 1)
+    ahead = (this_year + TWO_DIGIT_YEAR_AHEAD) % 100
+    assert parse_date(f"01.01.{ahead:02d}") == date(this_year + TWO_DIGIT_YEAR_AHEAD, 1, 1)
+
+
+def test_nineties_passport_issue_date_is_not_in_the_future():
+    assert check_dates({"naim_passport_issued_date": "01.01.99"}, today=date(2025, 6, 1)) == []
+
+
+def test_non_ascii_digits_are_not_a_date():
+    assert parse_date("٠١.٠٢.٢٠٢٥") is None
+    assert parse_date("０１.０２.２０２５") is None
+
+
+def test_cached_dates_follow_the_century_pivot(monkeypatch):
+    monkeypatch.setattr(form_logic, "_two_digit_pivot", lambda: 40)
+    assert form_logic.date_value("01.01.40") == date(2040, 1, 1)
+    monkeypatch.setattr(form_logic, "_two_digit_pivot", lambda: 39)
+    assert form_logic.date_value("01.01.40") == date(1940, 1, 1)
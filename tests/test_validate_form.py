@@ -0,0 +1,35 @@
+from datetime import date
+
+from form_logic import validate_form, validate_forms
+
+
+TODAY = date(2025, 6, 1)
+
+
+def test_null_values_are_empty_answers():
+    form = {"act_condition": None, "obj_tenants": None, "additional_conditions": None, "nps": None, "doc_choice": None}
+    data, errors = validate_form(form, today=TODAY)
+    assert errors == []
+    assert data["nps"] == ""
+    assert data["obj_tenants_list"] == []
+    assert data["additional_conditions"] == ""
+    assert data["doc_choice"] == "skip"
+
+
+def test_non_string_values_are_normalized():
+    data, errors = validate_form({"nps": 4012, "monthly_due_day": 5.0, "rent_start": date(2025, 3, 20)}, today=TODAY)
+    assert errors == []
+    assert data["nps"] == "4012"
+    assert data["monthly_due_day"] == "5"
+
+
+def test_bad_value_reports_field_instead_of_failing_batch():
+    results = validate_forms([{"nps": ["40"]}, {"nps": "4012"}], today=TODAY)
+    assert [key for key, _ in results[0][1]] == ["nps"]
+    assert results[1][1] == []
+
+
+def test_surrounding_whitespace_is_ignored():
+    data, errors = validate_form({"nps": " 4012 ", "npn": "123456\n"}, today=TODAY)
+    assert errors == []
+    assert (data["nps"], data["npn"]) == ("4012", "123456")
@@ -0,0 +1,17 @@
+from validators import compile_validator
+
+
+def test_regex_and_digits_strip_input():
+    series = compile_validator({"digits": 4})
+    kadastr = compile_validator({"regex": r"\d{2}:\d{2}:\d{7}:\d{4}"})
+    assert series(" 1234 ") == "1234"
+    assert kadastr("\t78:11:1234567:1234\n") == "78:11:1234567:1234"
+    assert series(" 12 34 ") is None
+
+
+def test_int_range_and_enum_strip_input():
+    day = compile_validator({"int_range": (1, 31)})
+    choice = compile_validator({"enum": {"да": "Да"}})
+    assert day(" 5 ") == "5"
+    assert choice("  ДА ") == "Да"
+    assert day(None) is None
@@ -0,0 +1,97 @@
+import asyncio
+import time
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+DEFAULT_CONCURRENT_UPDATES = 64
+
+
+class _UserLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # сколько апдейтов держат или ждут замок; при нуле замок удаляется
+        self.users = 0
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    # апдейты разных пользователей обрабатываются параллельно (не больше max_concurrent_updates),
+    # апдейты одного пользователя — строго по очереди, чтобы шаг анкеты в user_data не гонялся
+    def __init__(self, max_concurrent_updates: int = DEFAULT_CONCURRENT_UPDATES):
+        super().__init__(max_concurrent_updates)
+        self._locks: dict[int, _UserLock] = {}
+        self.processed = 0
+        self.contended = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    @staticmethod
+    def _uid(update: object) -> int | None:
+        if isinstance(update, Update):
+            if update.effective_user is not None:
+                return update.effective_user.id
+            if update.effective_chat is not None:
+                return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        uid = self._uid(update)
+        if uid is None:
+            await coroutine
+            self.processed += 1
+            return
+
+        entry = self._locks.get(uid)
+        if entry is None:
+            entry = self._locks[uid] = _UserLock()
+        entry.users += 1
+        try:
+            try:
+                await self._acquire(entry.lock)
+            except BaseException:
+                # отмена во время ожидания: обработчик так и не запустится
+                coroutine.close()
+                raise
+            try:
+                await coroutine
+            finally:
+                entry.lock.release()
+        finally:
+            entry.users -= 1
+            if not entry.users:
+                del self._locks[uid]
+        self.processed += 1
+
+    async def _acquire(self, lock: asyncio.Lock) -> None:
+        if lock.locked():
+            # ждём, пока закончится предыдущий апдейт этого пользователя; слот в общем лимите
+            # при этом занят, но длинных очередей от одного человека в диалоге не бывает
+            self.contended += 1
+            t0 = time.perf_counter()
+            await lock.acquire()
+            waited = time.perf_counter() - t0
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+        else:
+            await lock.acquire()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent_updates,
+            "in_flight": self.current_concurrent_updates,
+            "processed": self.processed,
+            "contended": self.contended,
+            "mean_lock_wait_ms": (self.wait_time / self.contended * 1e3) if self.contended else 0.0,
+            "max_lock_wait_ms": self.max_wait * 1e3,
+            "locked_users": len(self._locks),
+        }
@@ -0,0 +1,113 @@
+import abc
+import re
+import time
+
+
+DEFAULT_MESSAGE = "Неверный формат."
+
+
+class Validator(abc.ABC):
+    # проверка ответа: возвращает значение для анкеты или None; считает вызовы и время
+    kind = "base"
+
+    def __init__(self, message: str | None = None):
+        self.message = message or DEFAULT_MESSAGE
+        self.calls = 0
+        self.seconds = 0.0
+
+    @abc.abstractmethod
+    def check(self, raw: str) -> str | None:
+        ...
+
+    def __call__(self, raw: str) -> str | None:
+        # общая точка входа для чата, bulk и validate_form: пробелы по краям не считаются ошибкой
+        t0 = time.perf_counter()
+        try:
+            return self.check(raw.strip() if isinstance(raw, str) else raw)
+        finally:
+            self.calls += 1
+            self.seconds += time.perf_counter() - t0
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "mean_us": (self.seconds / self.calls * 1e6) if self.calls else 0.0}
+
+
+class RegexValidator(Validator):
+    kind = "regex"
+
+    def __init__(self, pattern: str, message: str | None = None):
+        super().__init__(message)
+        self.fullmatch = re.compile(pattern).fullmatch
+
+    def check(self, raw: str) -> str | None:
+        return raw if raw is not None and self.fullmatch(raw) else None
+
+
+class DigitsValidator(RegexValidator):
+    # только ASCII-цифры: ровно length штук (или сколько угодно, если length не задан)
+    kind = "digits"
+
+    def __init__(self, length: int | None = None, message: str | None = None):
+        super().__init__(rf"[0-9]{{{length}}}" if length else r"[0-9]+", message)
+
+
+class IntRangeValidator(Validator):
+    kind = "int_range"
+
+    def __init__(self, low: int | None = None, high: int | None = None, message: str | None = None):
+        super().__init__(message)
+        self.fullmatch = re.compile(r"[0-9]+").fullmatch
+        self.low = low
+        self.high = high
+
+    def check(self, raw: str) -> str | None:
+        if raw is None or not self.fullmatch(raw):
+            return None
+        value = int(raw)
+        if self.low is not None and value < self.low:
+            return None
+        if self.high is not None and value > self.high:
+            return None
+        return raw
+
+
+class EnumValidator(Validator):
+    # допустимые варианты без учёта регистра -> значение для анкеты
+    kind = "enum"
+
+    def __init__(self, choices: dict[str, str] | tuple[str, ...], message: str | None = None):
+        super().__init__(message)
+        if not isinstance(choices, dict):
+            choices = {choice: choice for choice in choices}
+        self.choices = {name.strip().lower(): value for name, value in choices.items()}
+
+    def check(self, raw: str) -> str | None:
+        if raw is None:
+            return None
+        return self.choices.get(raw.strip().lower())
+
+
+_KINDS = {
+    "regex": lambda arg, message: RegexValidator(arg, message),
+    "digits": lambda arg, message: DigitsValidator(arg, message),
+    "int_range": lambda arg, message: IntRangeValidator(*arg, message=message),
+    "enum": lambda arg, message: EnumValidator(arg, message),
+}
+
+# все собранные валидаторы по ключу поля — для статистики
+VALIDATORS: dict[str, Validator] = {}
+
+
+def compile_validator(spec: dict, name: str | None = None) -> Validator:
+    # spec: {"digits": 4}, {"regex": r"..."}, {"int_range": (1, 31)}, {"enum": {...}} и необязательный "message"
+    kinds = [kind for kind in spec if kind in _KINDS]
+    if len(kinds) != 1:
+        raise ValueError(f"Нужен ровно один тип проверки из {sorted(_KINDS)}: {spec!r}")
+    validator = _KINDS[kinds[0]](spec[kinds[0]], spec.get("message"))
+    if name is not None:
+        VALIDATORS[name] = validator
+    return validator
+
+
+def validator_stats() -> dict:
+    return {name: {"kind": v.kind, **v.stats()} for name, v in VALIDATORS.items() if v.calls}
@@ -0,0 +1,247 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+import ssl
+from typing import Callable
+from urllib.parse import urlsplit
+
+from telegram import Update
+from telegram.ext import Application
+
+
+DEFAULT_LISTEN = "0.0.0.0"
+DEFAULT_PORT = 8080
+MAX_BODY_BYTES = 1024 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+READ_TIMEOUT = 30.0
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    501: "Not Implemented",
+    503: "Service Unavailable",
+}
+
+
+class WebhookConfig:
+    def __init__(
+            self,
+            url: str,
+            listen: str = DEFAULT_LISTEN,
+            port: int = DEFAULT_PORT,
+            path: str | None = None,
+            secret: str | None = None,
+            cert: str | None = None,
+            key: str | None = None,
+    ):
+        # url — публичный адрес, который видит Telegram (обычно https на прокси);
+        # path — путь, который приходит на наш сервер после прокси
+        self.url = url
+        self.listen = listen
+        self.port = port
+        self.path = path or urlsplit(url).path or "/"
+        self.secret = secret or None
+        self.cert = cert
+        self.key = key
+
+    def ssl_context(self) -> ssl.SSLContext | None:
+        if not self.cert:
+            return None
+        ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ctx.load_cert_chain(self.cert, self.key)
+        return ctx
+
+
+class WebhookServer:
+    # минимальный HTTP/1.1-сервер на asyncio: приём апдейтов от Telegram, /healthz и /readyz
+    def __init__(
+            self,
+            app: Application,
+            config: WebhookConfig,
+            readiness: Callable[[], tuple[bool, dict]] | None = None,
+    ):
+        self.app = app
+        self.config = config
+        self.readiness = readiness
+        self.accepted = 0
+        self.rejected = 0
+        self.webhook_set = False
+        self._server: asyncio.AbstractServer | None = None
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1] if self._server else self.config.port
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._serve, self.config.listen, self.config.port, ssl=self.config.ssl_context()
+        )
+        logging.info(f"Webhook server listening on {self.config.listen}:{self.port}{self.config.path}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def ready(self) -> tuple[bool, dict]:
+        details = {"app_running": self.app.running, "webhook_set": self.webhook_set}
+        ok = self.app.running and self.webhook_set
+        if self.readiness is not None:
+            extra_ok, extra = self.readiness()
+            ok = ok and extra_ok
+            details.update(extra)
+        return ok, details
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), READ_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, 413, close=True)
+                    break
+                if len(head) > MAX_HEADER_BYTES:
+                    await self._respond(writer, 413, close=True)
+                    break
+
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, close=True)
+                    break
+                headers = {}
+                lengths = set()
+                for line in header_lines:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        name = name.strip().lower()
+                        headers[name] = value.strip()
+                        if name == "content-length":
+                            lengths.update(part.strip() for part in value.split(","))
+
+                if "transfer-encoding" in headers:
+                    # chunked не поддерживаем: не зная, где кончается тело, следующий запрос не найти
+                    await self._respond(writer, 501, close=True)
+                    break
+                if len(lengths) > 1:
+                    # разные Content-Length — неизвестно, по какому читать тело
+                    await self._respond(writer, 400, close=True)
+                    break
+                raw_length = lengths.pop() if lengths else "0"
+                if not (raw_length.isascii() and raw_length.isdigit()):
+                    # не число или отрицательное — тело не прочитать, соединение дальше не разобрать
+                    await self._respond(writer, 400, close=True)
+                    break
+                # длину проверяем до int(): строка из тысяч цифр тоже «слишком большое тело»
+                length = int(raw_length) if len(raw_length) <= len(str(MAX_BODY_BYTES)) else MAX_BODY_BYTES + 1
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, close=True)
+                    break
+                try:
+                    body = await asyncio.wait_for(reader.readexactly(length), READ_TIMEOUT) if length else b""
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+
+                close = headers.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+                status, payload = await self._route(method, target.split("?", 1)[0], headers, body)
+                await self._respond(writer, status, payload, close=close)
+                if close:
+                    break
+        except Exception:
+            logging.error("Webhook connection failed", exc_info=True)
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, headers: dict, body: bytes) -> tuple[int, dict | None]:
+        if path == "/healthz":
+            return 200, {"status": "ok"}
+        if path == "/readyz":
+            ok, details = self.ready()
+            return (200 if ok else 503), {"status": "ok" if ok else "not ready", **details}
+        if path != self.config.path:
+            return 404, None
+        if method != "POST":
+            return 405, None
+
+        if self.config.secret and not hmac.compare_digest(
+                headers.get(SECRET_HEADER, "").encode(), self.config.secret.encode()):
+            self.rejected += 1
+            logging.warning(f"Webhook request with wrong secret token from {headers.get('x-forwarded-for', '?')}")
+            return 403, None
+        try:
+            update = Update.de_json(json.loads(body), self.app.bot)
+        except (ValueError, TypeError, KeyError):
+            self.rejected += 1
+            return 400, None
+
+        # отвечаем Telegram сразу, апдейт обработается очередью приложения
+        await self.app.update_queue.put(update)
+        self.accepted += 1
+        return 200, None
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: dict | None = None,
+                       close: bool = False) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+        head = [
+            f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}",
+            f"Content-Length: {len(body)}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Connection: {'close' if close else 'keep-alive'}",
+        ]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+async def run_webhook(
+        app: Application,
+        config: WebhookConfig,
+        readiness: Callable[[], tuple[bool, dict]] | None = None,
+        stop: asyncio.Event | None = None,
+) -> None:
+    # аналог app.run_polling() для режима вебхука, с тем же порядком post_init/post_shutdown
+    stop = stop or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: остановка через KeyboardInterrupt
+            pass
+
+    server = WebhookServer(app, config, readiness)
+    await app.initialize()
+    try:
+        if app.post_init:
+            await app.post_init(app)
+        await server.start()
+        await app.start()
+        await app.bot.set_webhook(
+            url=config.url,
+            secret_token=config.secret,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        server.webhook_set = True
+        logging.info(f"Webhook set to {config.url}")
+        await stop.wait()
+    finally:
+        server.webhook_set = False
+        await server.stop()
+        if app.running:
+            await app.stop()
+        if app.post_stop:
+            await app.post_stop(app)
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+        logging.info(f"Webhook server stopped: {server.accepted} updates accepted, {server.rejected} rejected")